@@ -3,6 +3,17 @@ cd ~/Thesis/code/database_pipeline/
 
 ## Note: This is very much a work in progress script
 
+## Every Python stage writes intermediate/metrics/<stage>.metrics.json (wall/CPU time,
+## peak RSS, files and bytes read/written per sub-step) via script/stage_metrics.py.
+## Set M2I_METRICS_DIR to collect the metrics of one database build elsewhere.
+## .gz reads/writes of the Python stages go through script/gzip_io.py (big buffers, threaded multi-member
+## writer, zlib-ng/isal when installed); M2I_GZIP_LEVEL / M2I_GZIP_THREADS set level and threads, the shell
+## steps use pigz instead of gzip when it is on PATH.
+## script/meta2insight.py runs the Python stages by command name (lazy: only the chosen stage's imports are loaded):
+# python script/meta2insight.py                              # list commands
+# python script/meta2insight.py qc-filter --sweep            # = python script/05_quality_filtering.py --sweep
+# python script/meta2insight.py best-genome both             # = 12_... + 13_choose_best_genome_*.py
+
 # 00_base_pipeline.sh
     # Calls scripts in correct order
     # work in progress
@@ -13,6 +24,14 @@ cd ~/Thesis/code/database_pipeline/
     # Compresses all genomes to gzipped .fna.gz and stores them in a clean output directory
     # Creates a mapping file linking original filenames to new MAG IDs for downstream tracking
 bash script/01_a_formating_genomes.sh
+    # Adding MAGs to an existing build: 01_b keeps all existing IDs (content-hash matching), assigns new IDs
+    # only to new genomes and writes MAGs_formatted/delta_manifest.tsv + delta_ids.txt for the later steps
+# python script/01_b_onboard_genomes.py
+
+# genome_store.py (optional)
+    # Packs all formatted MAGs once into intermediate/genome_store (2 bits/base, N runs and contig index kept separately)
+    # Later steps can fetch regions (e.g. 16S loci from barrnap GFF/BED) from the memory map instead of gunzipping whole genomes
+# python script/genome_store.py build
 
 
 # 02_taxonomy.sh
@@ -29,6 +48,8 @@ J1=$(sbatch --parsable script/02_a_infer_taxonomy.sh)
     # Uses GTDB-Tk summary files to assign each formatted MAG to Bacteria or Archaea based on its GTDB classification
     # Maps original MAG names to their new formatted IDs, moves the corresponding genome files into domain-specific folders, and writes updated bacteria/archaea ID lists
     # Produces a domain_map.tsv plus bacteria.txt and archaea.txt that define the genome sets used in the subsequent 16S gene prediction (barrnap) step
+    # Lineages are parsed once by script/taxonomy.py into domain..species columns and cached as GTDB-Tk/gtdbtk.taxonomy.npz (rebuilt when a summary changes)
+    # Same module for the notebooks' QIIME taxonomy: load_taxonomy("tax_complete_qiime.txt", "qiime"), name_map(tax, "genus"), collapse(...)
 source ~/.bashrc
 conda activate pyenv
 python3 script/12_choose_best_genome.py \
@@ -54,6 +75,9 @@ J2=$(sbatch --parsable script/04_a_quality_control.sh)
 source ~/.bashrc
 conda activate pyenv
 python script/05_a_quality_filtering.py
+    # Threshold sweep instead of editing COMPLETENESS_MIN/CONTAMINATION_MAX and rerunning: parses CheckM once, counts surviving
+    # bacteria/archaea (and distinct GTDB phyla..species) for every pair via a 2D histogram -> intermediate/qc/sweep/ (nothing is placed)
+# python script/05_quality_filtering.py --sweep --completeness 50 60 70 80 90 95 --contamination 0 2 5 10 15
 
 # 06_predict_16S.sh
     ## Check paths once all is in place
@@ -69,11 +93,21 @@ J3=$(sbatch --parsable script/06_a_predict_16S.sh)
 J4=$(sbatch --parsable script/07_a_count_copies_per_genome.sh)
 
 
+# 07_c_stream_16S.py (alternative to 07_b + 08 + 09)
+    # Streams every genome through count -> (optional vsearch) -> longest -> {kingdom}_16S_genes.fasta
+    # with bounded concurrency and no per-genome intermediate files; step 10 can run right after
+# python script/07_c_stream_16S.py --jobs "${SLURM_CPUS_PER_TASK:-8}"
+    # --cluster --cluster-engine python clusters in-process (greedy_cluster.py) instead of calling vsearch
+
+
 # 08_cluster_multiple_copies.py
     # Check paths once all is in place
     # For each MAG in "*_16S_multiple/", it clusters the sequences within that file at --id 0.90 and writes centroids as <MAG>.fna into "*_16S_clustered/""
     # For "*_16S_single/", it just copies the single 16S FASTA into the same clustered folder
 J5=$(sbatch --parsable script/08_cluster_multiple_copies.sh)
+    # greedy_cluster.py: same output without one vsearch process per genome (greedy centroids, 8-mer prefilter,
+    # banded global-alignment identity, --jobs processes); --verify-against <old *_16S_clustered> compares with vsearch
+# python script/greedy_cluster.py --id 0.90 --jobs "${SLURM_CPUS_PER_TASK:-4}"
 
 
 # 09_single_16S_per_genome.py
@@ -86,6 +120,8 @@ python script/09_single_16S_per_genome.py
 # 10_cluster_single_16S_genes
     # Takes final per-MAG 16S seqs and removes exact duplicates
 J6=$(sbatch --parsable script/10_cluster_single_16S_genes.sh)
+    # In-process alternative (exact dereplication, same centroid FASTA + .uc, no Slurm job):
+# python script/10_dereplicate_16S_genes.py
 
 
 # 11_align_16S.sh
@@ -97,6 +133,7 @@ J7=$(sbatch --parsable script/11_align_16S.sh)
 # 12_choose_best_genome_arc.py
     # Selects best genome per cluster using CheckM completeness->contamination
     # Rewrites aligned centroid FASTA IDs to the chosen best
+    # Reads the alignment through alignment_store.py (uint8 matrix cached as *.matrix.npy / *.ids.npz next to the FASTA)
 source ~/.bashrc
 conda activate barrnap_env
 python script/12_choose_best_genome_arc.py
@@ -112,6 +149,9 @@ python script/13_choose_best_genome_bac.py
 # 14_raxmlng_check.s (INCOMPLETE)
 #--># Skip archaea for now - requires at least four genomes
     # Auto-detects alignment length, sequence problems, and drops duplicates, writing a cleaned PHYLIP alignment
+    # In-process alternative (same *.raxml.reduced.phy, raxml-style log + per-sequence check.tsv, no Slurm job);
+    # can also run inside 12/13 by setting RAXML_CHECK_PREFIX there
+# python script/alignment_check.py --msa <..._best.fna> --prefix intermediate/raxml/bacteria_raxml-check
 
 
 # 15_convert_archaea_alignment (MISSING)
@@ -127,6 +167,11 @@ python script/13_choose_best_genome_bac.py
 # 17_run_raxml
     # UNCOMMENT ARCHAEA PART LATER
 
+# tree_index.py (optional)
+    # Leave-one-out NSTI for every reference tip of the RAxML tree (coverage check before running PICRUSt2)
+    # With --reference, scores the non-reference tips of a placed tree (e.g. PICRUSt2 out.tre) instead
+# python script/tree_index.py
+
 
 # 18_convert_phylip_to_fasta.py
     # Archaea
@@ -142,22 +187,42 @@ python script/18_convert_phylip_to_fasta.py
 
 # 20_raxml_info_files.py
     # remember archaea later
+    # Batch mode: pass a directory/glob of *.raxml.log to convert every tree and write a summary table
+    # python script/20_raxml_info_files.py intermediate/raxml --jobs 8 --summary intermediate/raxml/raxml_summary.tsv
 
 
 # 21_formatting_raxml_info_files.sh
     # remember archaea later
 
 # 22_filter_16S_copies_bac.py
-    # remember archaea later
+    # Header-only scan of the reference FASTA + streaming copy-table filter
+    # Archaea / extra references in the same run: --domain bacteria --domain archaea --ref FASTA IN OUT
 
 # 23_annotation.sh
     # remember archaea later
+    # 23_batch_annotation.py: one emapper call per batch of genomes, demultiplexed back to
+    # <genome>.emapper.annotations (resumable; --stub for offline tests)
+# python script/23_batch_annotation.py --run-prodigal --batch-size 200 --cpu "${SLURM_CPUS_PER_TASK:-16}"
 
 # 24_build_kotable.py
 python 24_build_kotable.py \
   --bac-dir /home/student.aau.dk/yr42on/Thesis/code/database_pipeline/intermediate/eggnog_out \
   --bac-out /home/student.aau.dk/yr42on/Thesis/code/database_pipeline/intermediate/ko.txt.gz
 
+# genome_stats.py (optional, after 03)
+    # Length, N50, largest contig, GC and N count per formatted MAG (one streamed read per genome, --jobs processes)
+    # Cached in MAGs_formatted/genome_stats.tsv (rows reused while the file is unchanged); set GENOME_STATS in 12/13 to break CheckM ties by N50
+# python script/genome_stats.py --jobs "${SLURM_CPUS_PER_TASK:-16}"
+
+# merge_trait_tables.py (optional)
+    # Merges ko.txt.gz tables of several batches/domains: union of KO columns from the headers, rows streamed in genome order
+    # --on-duplicate error|first|last|sum|max for genomes present in more than one table
+# python script/merge_trait_tables.py --on-duplicate last --out merged/ko.txt.gz batch1/ko.txt.gz batch2/ko.txt.gz
+
+# predict_metagenome.py (optional)
+    # Re-scores samples against a rebuilt ko.txt.gz without a full PICRUSt2 run (sparse float32 products)
+    # Either PICRUSt2's per-ASV marker/KO predictions, or --asv-map ASV->genome with the 22 copy table and the 24 KO table
+# python script/predict_metagenome.py --seqtab seqtab_norm.tsv --marker marker_predicted_and_nsti.tsv.gz --traits KO_predicted.tsv.gz
 
 
 # This is what it should look like when also using archaea (adjust paths)
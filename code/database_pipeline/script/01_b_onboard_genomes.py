@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Incremental alternative to 01_formating_genomes.sh.
+
+01_formating_genomes.sh truncates id_map.tsv and renumbers every MAG from
+MAG0001, so adding one genome can shift every ID and invalidate CheckM,
+Barrnap, eggNOG and tree outputs keyed by them. This script keeps the existing
+IDs and only formats genomes that are actually new:
+
+  - existing id_map.tsv rows are kept as they are (same columns, same order)
+  - every input is identified by the SHA-256 of its (decompressed) content,
+    stored in genome_hashes.tsv next to id_map.tsv; hashes of genomes
+    formatted by the shell script are back-filled from MAGs_formatted once
+  - same content under a new file name -> existing ID (alias row added)
+  - known file name with different content -> same ID, re-formatted, "changed"
+  - anything else -> next free ID (never re-used, even after deletions)
+
+Formatted genomes are looked up anywhere under MAGs_formatted, since 03 moves
+them into genomes_to_search_barrnap/{bacteria,archaea}/. A changed genome is
+rewritten where its old file is; new genomes are written to the top level of
+MAGs_formatted, where 03 picks them up (03 skips genomes it already placed).
+
+Each run writes delta_manifest.tsv (new_id, original_filename, status, sha256)
+and delta_ids.txt (one ID per line) listing only new/changed genomes, so later
+stages can process just those. Inputs that disappeared from SRC_DIR are
+reported but nothing is deleted.
+
+Usage:
+  python 01_b_onboard_genomes.py
+  python 01_b_onboard_genomes.py --dry-run
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import argparse
+
+from gzip_io import gz_open, compress_file
+from stage_metrics import Stage
+
+STAGE = Stage("01_b_onboard_genomes")
+
+# ============================= CONFIG ========================================
+SRC_DIR = os.path.expanduser("~/Thesis/code/database_pipeline/MAGs")
+DST_DIR = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/MAGs_formatted")
+OUT_PREFIX = "MAG"   # MAG0001, MAG0002, ...
+PAD = 4              # zero padding width (as in 01_formating_genomes.sh)
+EXTENSIONS = (".fa", ".fna", ".fa.gz", ".fna.gz")
+# ============================================================================
+
+
+def _open(path: str):
+    return gz_open(path, "rb")
+
+
+def content_hash(path: str) -> str:
+    """SHA-256 of the decompressed file, so foo.fa and foo.fa.gz hash the same."""
+    h = hashlib.sha256()
+    with _open(path) as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def list_inputs(src_dir: str) -> list:
+    return sorted((fn for fn in os.listdir(src_dir)
+                   if fn.lower().endswith(EXTENSIONS) and os.path.isfile(os.path.join(src_dir, fn))),
+                  key=lambda s: s.encode())  # LC_ALL=C sort, as in the shell script
+
+
+def read_tsv(path: str, header: list) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        rows = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+    if rows and rows[0][:len(header)] == header:
+        rows = rows[1:]
+    return rows
+
+
+def write_tsv(path: str, header: list, rows: list) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write("\t".join(header) + "\n")
+        for r in rows:
+            f.write("\t".join(r) + "\n")
+    os.replace(tmp, path)
+
+
+def format_genome(src: str, dst: str) -> None:
+    """Gzipped copy named <new_id>_genomic.fna.gz (same result as the shell script)."""
+    tmp = dst + ".tmp"
+    if src.endswith(".gz"):
+        shutil.copyfile(src, tmp)
+    else:
+        compress_file(src, tmp)
+    os.replace(tmp, dst)
+
+
+def find_formatted(dst_dir: str) -> dict:
+    """new_id -> path of every <new_id>_genomic.fna.gz under dst_dir (03 moves them into sub-directories)."""
+    suffix = "_genomic.fna.gz"
+    found = {}
+    for dirpath, _, files in sorted(os.walk(dst_dir)):
+        for fn in sorted(files):
+            if fn.endswith(suffix):
+                found.setdefault(fn[:-len(suffix)], os.path.join(dirpath, fn))
+    return found
+
+
+def id_number(new_id: str) -> int:
+    digits = new_id[len(OUT_PREFIX):]
+    return int(digits) if new_id.startswith(OUT_PREFIX) and digits.isdigit() else 0
+
+
+def onboard(src_dir: str, dst_dir: str, dry_run: bool = False) -> list:
+    map_path = os.path.join(dst_dir, "id_map.tsv")
+    hash_path = os.path.join(dst_dir, "genome_hashes.tsv")
+
+    id_rows = read_tsv(map_path, ["original_filename", "new_id"])
+    by_name = {r[0]: r[1] for r in id_rows if len(r) >= 2}
+    hashes = {r[0]: r[1] for r in read_tsv(hash_path, ["new_id", "sha256"]) if len(r) >= 2}
+
+    # back-fill hashes for genomes formatted before this script was used
+    formatted = find_formatted(dst_dir)
+    for new_id in sorted(set(by_name.values()) - set(hashes)):
+        if new_id in formatted:
+            hashes[new_id] = content_hash(formatted[new_id])
+    by_hash = {}
+    for new_id, h in hashes.items():
+        by_hash.setdefault(h, new_id)
+
+    next_num = max((id_number(i) for i in list(by_name.values()) + list(hashes)), default=0) + 1
+    inputs = list_inputs(src_dir)
+    delta, n_known = [], 0
+    for fn in inputs:
+        src = os.path.join(src_dir, fn)
+        h = content_hash(src)
+        STAGE.track_input(src)
+        if fn in by_name:
+            new_id = by_name[fn]
+            if hashes.get(new_id) == h:
+                n_known += 1
+                continue
+            status = "changed"
+        elif h in by_hash:
+            # same genome under a new file name: keep its ID, remember the alias
+            new_id = by_hash[h]
+            by_name[fn] = new_id
+            id_rows.append([fn, new_id])
+            n_known += 1
+            print(f"[INFO] {fn}: same content as {new_id}, recorded as alias")
+            continue
+        else:
+            new_id = f"{OUT_PREFIX}{next_num:0{PAD}d}"
+            next_num += 1
+            by_name[fn] = new_id
+            id_rows.append([fn, new_id])
+            status = "new"
+
+        hashes[new_id] = h
+        by_hash.setdefault(h, new_id)
+        delta.append([new_id, fn, status, h])
+        if not dry_run:
+            # changed genomes stay where 03 put them; new ones go to the top level for 03
+            dst = formatted.get(new_id) or os.path.join(dst_dir, f"{new_id}_genomic.fna.gz")
+            format_genome(src, dst)
+            STAGE.track_output(dst)
+
+    gone = sorted(set(by_name) - set(inputs))
+    for fn in gone:
+        print(f"[WARN] {fn} ({by_name[fn]}) is in id_map.tsv but no longer in {src_dir}; its outputs are kept")
+
+    print(f"[INFO] {len(inputs)} inputs: {n_known} unchanged, "
+          f"{sum(d[2] == 'new' for d in delta)} new, {sum(d[2] == 'changed' for d in delta)} changed")
+    if dry_run:
+        for d in delta:
+            print(f"[DRY-RUN] {d[2]:8s} {d[1]} -> {d[0]}")
+        return delta
+
+    write_tsv(map_path, ["original_filename", "new_id"], id_rows)
+    write_tsv(hash_path, ["new_id", "sha256"], sorted(hashes.items(), key=lambda kv: id_number(kv[0])))
+    write_tsv(os.path.join(dst_dir, "delta_manifest.tsv"), ["new_id", "original_filename", "status", "sha256"], delta)
+    with open(os.path.join(dst_dir, "delta_ids.txt"), "w") as f:
+        f.writelines(f"{d[0]}\n" for d in delta)
+    return delta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Add new MAGs without renumbering existing ones.")
+    parser.add_argument("--src-dir", default=SRC_DIR, help="Directory with the original MAG FASTA files.")
+    parser.add_argument("--dst-dir", default=DST_DIR, help="MAGs_formatted directory (id_map.tsv lives here).")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be added.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.src_dir):
+        print(f"[ERROR] Source directory not found: {args.src_dir}", file=sys.stderr)
+        raise SystemExit(1)
+    os.makedirs(args.dst_dir, exist_ok=True)
+
+    with STAGE.step("onboard"):
+        delta = onboard(args.src_dir, args.dst_dir, args.dry_run)
+
+    if not args.dry_run:
+        print(f"[OK] id_map.tsv updated; {len(delta)} genomes in {os.path.join(args.dst_dir, 'delta_manifest.tsv')}")
+    print("[DONE] Onboarding finished.")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,9 @@ SRC_DIR=~/Thesis/code/database_pipeline/MAGs
 DST_DIR=~/Thesis/code/database_pipeline/intermediate/MAGs_formatted
 OUT_PREFIX="MAG"          # will produce MAG0001, MAG0002, ...
 PAD=4                     # zero padding width
+GZIP_LEVEL=${M2I_GZIP_LEVEL:-6}
+# pigz (parallel gzip, same .gz format) when installed, plain gzip otherwise
+if command -v pigz >/dev/null 2>&1; then GZIP_CMD=(pigz -p "${M2I_GZIP_THREADS:-4}"); else GZIP_CMD=(gzip); fi
 
 mkdir -p "$DST_DIR"
 cd "$DST_DIR"
@@ -46,7 +49,7 @@ for base in "${FILES[@]}"; do
     *)
       # Input not gzipped: copy then gzip
       cp -f "$src" "${new_id}_genomic.fna"
-      gzip -f "${new_id}_genomic.fna"
+      "${GZIP_CMD[@]}" -f "-$GZIP_LEVEL" "${new_id}_genomic.fna"
       ;;
   esac
 
@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 import os, shutil, pandas as pd
+from stage_metrics import Stage
+from taxonomy import load_taxonomy, domain_of
+
+STAGE = Stage("03_domain_classification")
 
 # --- Resolve paths relative to this script ---
 BASE = os.path.dirname(os.path.abspath(__file__))          # .../code/database_pipeline/script
@@ -26,6 +30,7 @@ if not os.path.exists(RENAME_MAP_PATH):
                      "It must map raw user_genome IDs to formatted basenames (column names like original_filename/new_id).")
 
 rm = pd.read_csv(RENAME_MAP_PATH, sep="\t", dtype=str)
+STAGE.track_input(RENAME_MAP_PATH)
 rm.columns = [c.strip().lower() for c in rm.columns]
 old_candidates = [c for c in rm.columns if c in ("original_filename","original","raw_id","old_id","user_genome")]
 new_candidates = [c for c in rm.columns if c in ("new_id","formatted_id","mag_id")]
@@ -44,26 +49,14 @@ def stem_no_suffix(x: str) -> str:
 rename_map = {stem_no_suffix(rm.at[i, old_col]): str(rm.at[i, new_col]) for i in rm.index}
 
 # --- Read GTDB-Tk summaries and infer domain ---
-dfs = []
-for s in summaries:
-    if os.path.exists(s):
-        df = pd.read_csv(s, sep="\t")
-        if {"user_genome","classification"}.issubset(df.columns):
-            dfs.append(df[["user_genome","classification"]].copy())
-        else:
-            raise ValueError(f"{s} missing required columns: user_genome/classification")
-if not dfs:
+# parsed once into rank columns and cached next to the summaries (gtdbtk.taxonomy.npz)
+with STAGE.step("read_gtdbtk_summaries"):
+    tax = load_taxonomy(summaries)
+    STAGE.track_input(*(s for s in summaries if os.path.exists(s)))
+if tax.empty:
     raise SystemExit("No GTDB-Tk summary files found at expected paths.")
 
-md = pd.concat(dfs, ignore_index=True).drop_duplicates("user_genome")
-
-def infer_domain(cl):
-    if isinstance(cl, str):
-        if cl.startswith("d__Bacteria"): return "Bacteria"
-        if cl.startswith("d__Archaea"):  return "Archaea"
-    return "Unknown"
-
-md["domain"] = md["classification"].map(infer_domain)
+md = pd.DataFrame({"user_genome": tax["id"], "classification": tax["lineage"], "domain": domain_of(tax)})
 md = md[md["domain"] != "Unknown"].copy()
 
 # --- Write lists next to formatted genomes ---
@@ -74,6 +67,16 @@ md.query("domain=='Archaea'")["user_genome"].to_csv(os.path.join(GENOME_DIR, "ar
 # --- Move formatted files by domain (formatted-only, fail if missing) ---
 SUFFIXES = ["_genomic.fna.gz","_genomic.fna",".fa.gz",".fa",".fna.gz",".fna",".fasta.gz",".fasta"]
 
+def find_placed_path(user_genome: str):
+    # already moved by an earlier run (01_b re-runs only add new genomes at the top level)
+    base = rename_map.get(user_genome, user_genome)
+    for d in (BAC_DIR, ARC_DIR):
+        for suf in SUFFIXES:
+            p = os.path.join(d, base + suf)
+            if os.path.exists(p):
+                return p
+    return None
+
 def find_formatted_path(user_genome: str):
     # map to new_id if present, else assume user_genome is already the formatted basename
     bases = [rename_map.get(user_genome, user_genome)]
@@ -84,16 +87,21 @@ def find_formatted_path(user_genome: str):
                 return p
     return None
 
-moved, missing = 0, []
-for gid, dom in md[["user_genome","domain"]].itertuples(index=False):
-    src = find_formatted_path(gid)
-    if not src:
-        missing.append(gid); continue
-    dst_dir = BAC_DIR if dom == "Bacteria" else ARC_DIR
-    shutil.move(src, os.path.join(dst_dir, os.path.basename(src)))
-    moved += 1
-
-print(f"Moved {moved} genomes.")
+moved, placed, missing = 0, 0, []
+with STAGE.step("move_genomes"):
+    for gid, dom in md[["user_genome","domain"]].itertuples(index=False):
+        src = find_formatted_path(gid)
+        if not src:
+            if find_placed_path(gid):
+                placed += 1
+            else:
+                missing.append(gid)
+            continue
+        dst_dir = BAC_DIR if dom == "Bacteria" else ARC_DIR
+        shutil.move(src, os.path.join(dst_dir, os.path.basename(src)))
+        moved += 1
+
+print(f"Moved {moved} genomes ({placed} already placed by an earlier run).")
 if missing:
     raise SystemExit(
         f"{len(missing)} genomes were not found in the formatted directory. "
@@ -120,3 +128,5 @@ with open(os.path.join(GENOME_DIR, "archaea.txt"), "w") as f:
         if not fn.startswith("."):
             f.write(strip_suffix(fn) + "\n")
 
+STAGE.track_output(*(os.path.join(GENOME_DIR, fn) for fn in ("domain_map.tsv", "bacteria.txt", "archaea.txt")))
+
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
-import os, re, sys, glob, shutil
+import os, re, sys, glob, shutil, argparse
+import numpy as np
 import pandas as pd
-from datetime import datetime
 from typing import Optional
+from stage_metrics import Stage
+from taxonomy import load_taxonomy
 
 # ============================= CONFIG ========================================
 INFILE = "intermediate/CheckM/merged/checkm_results.min.tsv"
@@ -23,14 +25,32 @@ MAG_DIR_CANDIDATES = [
 EXTS = (".fa", ".fna", ".fasta")
 GZ = ("", ".gz")
 
+# --sweep: threshold grid and GTDB-Tk taxonomy for per-rank diversity (skipped if the files are missing)
+SWEEP_COMPLETENESS = [50, 55, 60, 65, 70, 75, 80, 85, 90, 95, 100]
+SWEEP_CONTAMINATION = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 12, 15, 20]
+SWEEP_RANKS = ["phylum", "class", "order", "family", "genus", "species"]
+GTDB_SUMMARIES = [
+    os.path.join("intermediate", "GTDB-Tk", "gtdbtk.bac120.summary.tsv"),
+    os.path.join("intermediate", "GTDB-Tk", "gtdbtk.ar53.summary.tsv"),
+]
+ID_MAP = os.path.join("intermediate", "MAGs_formatted", "id_map.tsv")
+
+# ============================= ARGUMENTS =====================================
+parser = argparse.ArgumentParser(description="Filter CheckM results, or sweep a grid of thresholds (--sweep).")
+parser.add_argument("--sweep", action="store_true",
+                    help="Only report surviving genomes/taxa for every threshold pair; nothing is filtered or placed.")
+parser.add_argument("--completeness", type=float, nargs="+", default=SWEEP_COMPLETENESS,
+                    help="Completeness minima for --sweep.")
+parser.add_argument("--contamination", type=float, nargs="+", default=SWEEP_CONTAMINATION,
+                    help="Contamination maxima for --sweep.")
+ARGS = parser.parse_args()
+
 # ============================= LOGGING =======================================
 os.makedirs(OUTDIR, exist_ok=True)
 LOGFILE = os.path.join(OUTDIR, "log.txt")
-def log(msg: str) -> None:
-    ts = datetime.now().strftime("[%H:%M:%S]")
-    print(f"{ts} {msg}")
-    with open(LOGFILE, "a") as lf:
-        lf.write(f"{ts} {msg}\n")
+# log.txt is opened once and buffered; metrics go to intermediate/metrics/
+STAGE = Stage("05_quality_filtering", log_path=LOGFILE)
+log = STAGE.log
 
 # ============================= PATH SETUP ====================================
 BASE = os.path.dirname(os.path.abspath(__file__))                 # .../code/database_pipeline/script
@@ -40,14 +60,14 @@ if not os.path.exists(abs_in):
     log(f"ERROR: INFILE not found: {abs_in}")
     sys.exit(1)
 
-# pick genomes dir
+# pick genomes dir (not needed for --sweep)
 GENOMES_DIR = None
 for rel in MAG_DIR_CANDIDATES:
     cand = os.path.join(ROOT, rel)
     if os.path.isdir(cand):
         GENOMES_DIR = cand
         break
-if GENOMES_DIR is None:
+if GENOMES_DIR is None and not ARGS.sweep:
     log("ERROR: Could not find genomes directory in any of:")
     for rel in MAG_DIR_CANDIDATES:
         log("  - " + os.path.join(ROOT, rel))
@@ -76,8 +96,67 @@ def maybe_add_genomic_suffix(gid: str) -> str:
         gid = f"{gid}_genomic"
     return gid
 
+def load_gtdb_ranks() -> pd.DataFrame:
+    """genome_id (formatted, no _genomic) + rank columns from the GTDB-Tk summaries (taxonomy.py)."""
+    paths = [os.path.join(ROOT, rel) for rel in GTDB_SUMMARIES]
+    tax = load_taxonomy(paths)
+    STAGE.track_input(*(p for p in paths if os.path.exists(p)))
+    # GTDB-Tk runs on the original file names; map them to formatted IDs like 03 does
+    id_map_path = os.path.join(ROOT, ID_MAP)
+    gid = tax["id"].astype(str).map(normalize_id)
+    if os.path.exists(id_map_path):
+        im = pd.read_csv(id_map_path, sep="\t", dtype=str)
+        im.columns = [c.strip().lower() for c in im.columns]
+        if {"original_filename", "new_id"}.issubset(im.columns):
+            rename = dict(zip(im["original_filename"].map(normalize_id), im["new_id"]))
+            gid = gid.map(lambda g: rename.get(g, g))
+    return tax.assign(genome_id=gid.str.replace(r"_genomic$", "", regex=True))
+
+def survival_grid(cpl: np.ndarray, cnt: np.ndarray, cpl_grid: np.ndarray, cnt_grid: np.ndarray,
+                  groups: np.ndarray = None) -> np.ndarray:
+    """
+    Genomes passing completeness >= c and contamination <= k for every grid pair,
+    via a 2D histogram of threshold indices and cumulative sums (no per-pair filtering).
+    With `groups` (int codes, -1 = none) it returns how many distinct groups survive.
+    """
+    ci = np.searchsorted(cpl_grid, cpl, side="right")    # passes cpl_grid[j] for j < ci
+    ki = np.searchsorted(cnt_grid, cnt, side="left")     # passes cnt_grid[l] for l >= ki
+    nc, nk = len(cpl_grid), len(cnt_grid)
+    if groups is None:
+        hist = np.zeros((nc + 1, nk + 1), dtype=np.int64)
+        np.add.at(hist, (ci, ki), 1)
+        return hist[::-1].cumsum(0)[::-1][1:].cumsum(1)[:, :nk]
+    ok = groups >= 0
+    hist = np.zeros((int(groups.max(initial=-1)) + 1, nc + 1, nk + 1), dtype=np.int32)
+    np.add.at(hist, (groups[ok], ci[ok], ki[ok]), 1)
+    alive = hist[:, ::-1].cumsum(1)[:, ::-1][:, 1:].cumsum(2)[:, :, :nk] > 0
+    return alive.sum(axis=0)
+
+def qc_sweep(df: pd.DataFrame, cpl_grid, cnt_grid, ranks=()) -> pd.DataFrame:
+    """Long table: domain, completeness_min, contamination_max, n_genomes, n_<rank>..."""
+    cpl_grid = np.sort(np.asarray(cpl_grid, dtype=float))
+    cnt_grid = np.sort(np.asarray(cnt_grid, dtype=float))
+    frames = []
+    for dom in ("all", "Bacteria", "Archaea"):
+        sub = df if dom == "all" else df[df["domain"] == dom]
+        cpl = sub["checkm_completeness"].to_numpy(dtype=float)
+        cnt = sub["checkm_contamination"].to_numpy(dtype=float)
+        res = pd.DataFrame({
+            "domain": dom,
+            "completeness_min": np.repeat(cpl_grid, len(cnt_grid)),
+            "contamination_max": np.tile(cnt_grid, len(cpl_grid)),
+            "n_genomes": survival_grid(cpl, cnt, cpl_grid, cnt_grid).ravel(),
+        })
+        for rank in ranks:
+            codes, _ = pd.factorize(sub[rank])
+            res[f"n_{rank}"] = survival_grid(cpl, cnt, cpl_grid, cnt_grid, codes).ravel()
+        frames.append(res)
+    return pd.concat(frames, ignore_index=True)
+
 # ============================= PARSE CHECKM ==================================
 # Pass 1: try minimal 3-column block (genome_id, completeness, contamination)
+STAGE.track_input(abs_in)
+STAGE.begin("parse_checkm")
 min_rows = []
 with open(abs_in, "r", encoding="utf-8", errors="ignore") as fh:
     for line in fh:
@@ -146,8 +225,45 @@ keep = df[
 ].copy()
 
 log(f"Kept {len(keep)} genomes ≥{COMPLETENESS_MIN}% completeness and ≤{CONTAMINATION_MAX}% contamination")
+STAGE.end()
+
+# ============================= THRESHOLD SWEEP ================================
+if ARGS.sweep:
+    STAGE.begin("threshold_sweep")
+    tax = load_gtdb_ranks()
+    ranks = []
+    if not tax.empty:
+        key = tax.rename(columns={"genome_id": "_key", "domain": "_gtdb_domain"})
+        key = key[["_key", "_gtdb_domain"] + SWEEP_RANKS].drop_duplicates("_key")
+        df = df.assign(_key=df["genome_id"].str.replace(r"_genomic$", "", regex=True)) \
+               .merge(key, on="_key", how="left").drop(columns="_key")
+        # GTDB domain wins; the marker-lineage guess only covers genomes without a GTDB-Tk row
+        gtdb_domain = df.pop("_gtdb_domain").astype(object)
+        has_gtdb = gtdb_domain.isin(["Bacteria", "Archaea"])
+        df["domain"] = gtdb_domain.where(has_gtdb, df["domain"])
+        ranks = SWEEP_RANKS
+        log(f"GTDB taxonomy joined for {has_gtdb.sum()} of {len(df)} genomes "
+            f"({(df['domain'] == 'Bacteria').sum()} Bacteria, {(df['domain'] == 'Archaea').sum()} Archaea)")
+    else:
+        log("No GTDB-Tk summaries found; sweeping genome counts only")
+    sweep = qc_sweep(df, ARGS.completeness, ARGS.contamination, ranks)
+
+    sweep_dir = os.path.join(OUTDIR, "sweep")
+    os.makedirs(sweep_dir, exist_ok=True)
+    out_paths = [os.path.join(sweep_dir, "qc_sweep.tsv")]
+    sweep.to_csv(out_paths[0], sep="\t", index=False)
+    # heatmap data: completeness (rows) x contamination (columns) per domain
+    for dom, part in sweep.groupby("domain", sort=False):
+        path = os.path.join(sweep_dir, f"qc_sweep_heatmap_{dom.lower()}.tsv")
+        part.pivot(index="completeness_min", columns="contamination_max", values="n_genomes").to_csv(path, sep="\t")
+        out_paths.append(path)
+    STAGE.track_output(*out_paths)
+    STAGE.end()
+    log(f"Swept {len(ARGS.completeness)} x {len(ARGS.contamination)} thresholds -> {out_paths[0]}")
+    sys.exit(0)
 
 # ============================= WRITE TABLES/LISTS =============================
+STAGE.begin("write_tables")
 df.to_csv(os.path.join(OUTDIR, "checkm_clean_all.tsv"), sep="\t", index=False)
 keep.to_csv(os.path.join(OUTDIR, "checkm_filtered.tsv"), sep="\t", index=False)
 
@@ -158,6 +274,9 @@ with open(os.path.join(OUTDIR, "bacteria.txt"), "w") as f:
     f.write("\n".join(bac_ids) + ("\n" if bac_ids else ""))
 with open(os.path.join(OUTDIR, "archaea.txt"), "w") as f:
     f.write("\n".join(arc_ids) + ("\n" if arc_ids else ""))
+STAGE.track_output(*(os.path.join(OUTDIR, fn) for fn in
+                     ("checkm_clean_all.tsv", "checkm_filtered.tsv", "bacteria.txt", "archaea.txt")))
+STAGE.end()
 
 log(f"Wrote {len(bac_ids)} bacteria and {len(arc_ids)} archaea genome IDs")
 log("Done.")
@@ -251,8 +370,9 @@ def place_ids(id_list, dst_dir) -> int:
         placed += 1
     return placed
 
-placed_bac = place_ids(bac_ids, dst_bac)
-placed_arc = place_ids(arc_ids, dst_arc)
+with STAGE.step("place_genomes"):
+    placed_bac = place_ids(bac_ids, dst_bac)
+    placed_arc = place_ids(arc_ids, dst_arc)
 
 log(f"Placed {placed_bac} bacterial MAGs into {dst_bac} ({PLACE_MODE})")
 log(f"Placed {placed_arc} archaeal MAGs into {dst_arc} ({PLACE_MODE})")
@@ -22,6 +22,9 @@ GFF_DIR=/home/student.aau.dk/yr42on/Thesis/code/database_pipeline/intermediate/b
 OUT=/home/student.aau.dk/yr42on/Thesis/code/database_pipeline/intermediate/count_copies_per_genome
 mkdir -p "$OUT"/{bacteria,archaea}
 
+# pigz decompresses with separate read/write/CRC threads; plain gzip otherwise
+if command -v pigz >/dev/null 2>&1; then GUNZIP=(pigz -dc -p "${SLURM_CPUS_PER_TASK:-4}"); else GUNZIP=(gzip -dc); fi
+
 find_genome() {
   # $1 = domain (bacteria/archaea), $2 = bare MAG id (e.g. MAG0052)
   local dom="$1"; local id="$2"
@@ -67,7 +70,7 @@ for dom in bacteria archaea; do
 
     # real temp FASTA to avoid /dev/fd index warnings
     case "$genome" in
-      *.gz) gzip -cd "$genome" > "$tmpfa" ;;
+      *.gz) "${GUNZIP[@]}" "$genome" > "$tmpfa" ;;
       *)     cp "$genome"     "$tmpfa" ;;
     esac
     rm -f "$tmpfa.fai"
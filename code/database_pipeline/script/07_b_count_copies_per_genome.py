@@ -3,8 +3,11 @@ from Bio import SeqIO
 import os, sys
 import pandas as pd
 import numpy as np
+from stage_metrics import Stage
 
-ROOT = "/home/student.aau.dk/yr42on/Thesis/code/database_pipeline/intermediate/count_copies_per_genome"
+STAGE = Stage("07_b_count_copies_per_genome")
+
+ROOT = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/count_copies_per_genome")
 DOMAINS = ["bacteria","archaea"]
 
 def list_files(d):
@@ -32,22 +35,27 @@ for kingdom in DOMAINS:
         continue
 
     copies = []
-    for fn in files:
-        gid = fn.replace("_16S.fna","").replace("_16S.fa","").replace("_genomic.fna","")
-        path = os.path.join(indir, fn)
-        seqs = list(SeqIO.parse(path, "fasta"))
-        n = len(seqs)
-        copies.append([gid, n])
-        if n == 1:
-            SeqIO.write(seqs, os.path.join(out_single, f"{gid}.fna"), "fasta")
-        elif n > 1:
-            SeqIO.write(seqs, os.path.join(out_multiple, f"{gid}.fna"), "fasta")
+    with STAGE.step(f"{kingdom}_split_copies"):
+        for fn in files:
+            gid = fn.replace("_16S.fna","").replace("_16S.fa","").replace("_genomic.fna","")
+            path = os.path.join(indir, fn)
+            STAGE.track_input(path)
+            seqs = list(SeqIO.parse(path, "fasta"))
+            n = len(seqs)
+            copies.append([gid, n])
+            if n == 1:
+                SeqIO.write(seqs, os.path.join(out_single, f"{gid}.fna"), "fasta")
+                STAGE.track_output(os.path.join(out_single, f"{gid}.fna"))
+            elif n > 1:
+                SeqIO.write(seqs, os.path.join(out_multiple, f"{gid}.fna"), "fasta")
+                STAGE.track_output(os.path.join(out_multiple, f"{gid}.fna"))
 
     # write summary and print stats
     tsv = os.path.join(ROOT, f"{kingdom}_16S_copies.txt")
     with open(tsv, "w") as fh:
         for gid, n in copies:
             fh.write(f"{gid}\t{n}\n")
+    STAGE.track_output(tsv)
 
     df = pd.DataFrame(copies, columns=["genome","copies"]).set_index("genome")
     pos = df[df["copies"] > 0]
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Streaming replacement for steps 07_b -> 08 -> 09 (16S copy counting,
+within-genome clustering and longest-copy selection).
+
+Each genome's *_16S.fna (from 07_a) flows through
+
+    count copies -> [optional per-genome vsearch --cluster_fast] -> pick longest
+                 -> append to {kingdom}_16S_genes.fasta
+
+as soon as it is ready, with at most --jobs genomes in flight. No
+*_16S_single / *_16S_multiple / *_16S_clustered files are written.
+Records are appended in sorted genome order (a small reorder buffer holds
+genomes that finish early), so the FASTA is identical to what 09 produces
+and step 10 can start right away.
+
+vsearch --cluster_fast sorts by decreasing length, so the longest copy is
+always a centroid and clustering does not change which copy is picked; it
+is off by default and can be switched on with --cluster (or exercised
+offline with --fake-vsearch).
+
+Outputs (per domain, in ROOT):
+  - {kingdom}_16S_copies.txt     genome<TAB>copies (same as 07_b)
+  - {kingdom}_16S_genes.fasta    one longest 16S per genome (same as 09)
+  - {kingdom}_16S_genes.map.tsv  genome_id<TAB>source (single|clustered)
+
+Usage:
+  python 07_c_stream_16S.py
+  python 07_c_stream_16S.py --domain bacteria --jobs 16 --cluster --id 0.90
+  python 07_c_stream_16S.py --cluster --cluster-engine python
+"""
+
+import os
+import asyncio
+import argparse
+import tempfile
+
+from fasta_utils import iter_fasta, format_fasta
+from greedy_cluster import cluster_greedy
+from stage_metrics import Stage
+
+STAGE = Stage("07_c_stream_16S")
+
+# ============================= CONFIG ========================================
+ROOT = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/count_copies_per_genome")
+DOMAINS = ["bacteria", "archaea"]
+
+# --- OPTIONAL: enforce CheckM allow-list (same as 09) ---
+USE_CHECKM_FILTER = False
+CHECKM_TSV = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/qc/checkm_filtered.tsv")
+# ============================================================================
+
+
+def norm_gid(fn: str) -> str:
+    # same normalisation as 07_b: MAG0001_16S.fna / MAG0001_genomic.fna_16S.fna -> MAG0001
+    return fn.replace("_16S.fna", "").replace("_16S.fa", "").replace("_genomic.fna", "")
+
+
+def list_files(d):
+    try:
+        return sorted(f for f in os.listdir(d) if f.endswith("_16S.fna") or f.endswith("_16S.fa"))
+    except FileNotFoundError:
+        return []
+
+
+def load_allow_list(path: str) -> set:
+    allow = set()
+    with open(path) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        col = header.index("genome_id")
+        for line in f:
+            gid = line.rstrip("\n").split("\t")[col]
+            allow.add(gid[:-len("_genomic")] if gid.endswith("_genomic") else gid)
+    return allow
+
+
+def pick_longest(records):
+    # first of the longest, like 09's stable sort on length
+    return max(records, key=lambda r: len(r[1])) if records else None
+
+
+# ============================= CLUSTERERS ====================================
+
+def vsearch_clusterer(exe: str, identity: float, threads: int, tmpdir: str):
+    """Per-genome `vsearch --cluster_fast` (as in 08) run as an async subprocess."""
+    async def cluster(gid: str, records: list) -> list:
+        src = os.path.join(tmpdir, f"{gid}.in.fna")
+        dst = os.path.join(tmpdir, f"{gid}.centroids.fna")
+        with open(src, "w") as f:
+            f.writelines(format_fasta(rid, seq) for rid, seq in records)
+        proc = await asyncio.create_subprocess_exec(
+            exe, "--cluster_fast", src, "--id", str(identity), "--centroids", dst,
+            "--threads", str(threads), "--quiet",
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        _, err = await proc.communicate()
+        try:
+            if proc.returncode != 0:
+                raise RuntimeError(f"vsearch failed for {gid}: {err.decode().strip()}")
+            return list(iter_fasta(dst))
+        finally:
+            for p in (src, dst):
+                if os.path.exists(p):
+                    os.remove(p)
+    return cluster
+
+
+def python_clusterer(identity: float):
+    """In-process greedy centroid clustering (greedy_cluster.py), no vsearch processes."""
+    async def cluster(gid: str, records: list) -> list:
+        centroids, _ = await asyncio.to_thread(cluster_greedy, records, identity)
+        return centroids
+    return cluster
+
+
+async def fake_vsearch(gid: str, records: list) -> list:
+    """Offline stand-in: every copy is its own centroid, in cluster_fast's length order."""
+    await asyncio.sleep(0)
+    return sorted(records, key=lambda r: len(r[1]), reverse=True)
+
+
+# ============================= DRIVER ========================================
+
+async def process_genome(path: str, clusterer):
+    """-> (n_copies, picked (id, seq) or None, source)"""
+    records = await asyncio.to_thread(lambda: list(iter_fasta(path)))
+    n = len(records)
+    if n > 1 and clusterer is not None:
+        gid = norm_gid(os.path.basename(path))
+        records = await clusterer(gid, records)
+    return n, pick_longest(records), ("single" if n == 1 else "clustered")
+
+
+async def run_domain(kingdom: str, root: str, jobs: int, clusterer=None, allow: set = None) -> int:
+    indir = os.path.join(root, kingdom)
+    files = list_files(indir)
+    print(f"[INFO] {kingdom}: found {len(files)} *_16S.(fa|fna) files in {indir}")
+    if not files:
+        return 0
+
+    out_fa = os.path.join(root, f"{kingdom}_16S_genes.fasta")
+    out_map = os.path.join(root, f"{kingdom}_16S_genes.map.tsv")
+    out_copies = os.path.join(root, f"{kingdom}_16S_copies.txt")
+
+    # genomes in sorted-ID order (09 sorts by ID; 07_b lists by filename)
+    work = sorted(((norm_gid(fn), os.path.join(indir, fn)) for fn in files))
+    inq = asyncio.Queue(maxsize=jobs * 2)
+    outq = asyncio.Queue(maxsize=jobs * 2)
+
+    async def producer():
+        for item in enumerate(work):
+            await inq.put(item)
+        for _ in range(jobs):
+            await inq.put(None)
+
+    async def worker():
+        while True:
+            item = await inq.get()
+            if item is None:
+                return
+            idx, (gid, path) = item
+            try:
+                res = await process_genome(path, clusterer)
+            except Exception as e:  # surfaced by the writer
+                res = e
+            await outq.put((idx, gid, res))
+
+    async def writer():
+        pending, nxt, written = {}, 0, 0
+        with open(out_fa, "w") as fa, open(out_map, "w") as fm, open(out_copies, "w") as fc:
+            fm.write("genome_id\tsource\n")
+            while nxt < len(work):
+                idx, gid, res = await outq.get()
+                if isinstance(res, Exception):
+                    raise RuntimeError(f"{kingdom}: failed on {gid}: {res}") from res
+                pending[idx] = (gid, res)
+                # flush everything that is now contiguous
+                while nxt in pending:
+                    g, (n, picked, source) = pending.pop(nxt)
+                    nxt += 1
+                    fc.write(f"{g}\t{n}\n")
+                    if picked is None or (allow is not None and g not in allow):
+                        continue
+                    fa.write(format_fasta(g, picked[1]))
+                    fm.write(f"{g}\t{source}\n")
+                    written += 1
+        return written
+
+    with STAGE.step(f"{kingdom}_stream_16S"):
+        workers = [asyncio.create_task(worker()) for _ in range(jobs)]
+        prod = asyncio.create_task(producer())
+        written = await writer()
+        await asyncio.gather(prod, *workers)
+        STAGE.track_input(*(p for _, p in work))
+        STAGE.track_output(out_fa, out_map, out_copies)
+
+    print(f"{kingdom}: wrote {written} sequences → {out_fa}")
+    print(f"[OK] {kingdom}: copy table → {out_copies}")
+    return written
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Stream 16S copy counting, optional clustering and longest-copy selection (07_b+08+09)."
+    )
+    parser.add_argument("--root", default=ROOT, help="count_copies_per_genome directory.")
+    parser.add_argument("--domain", action="append", choices=DOMAINS,
+                        help="Domain(s) to process (repeatable; default: both).")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 4,
+                        help="Genomes processed concurrently.")
+    parser.add_argument("--cluster", action="store_true",
+                        help="Run vsearch --cluster_fast per multi-copy genome (as in 08).")
+    parser.add_argument("--fake-vsearch", action="store_true",
+                        help="Use the in-process vsearch stand-in (testing without the binary).")
+    parser.add_argument("--cluster-engine", choices=["vsearch", "python"], default="vsearch",
+                        help="--cluster with vsearch subprocesses or in-process (greedy_cluster.py).")
+    parser.add_argument("--vsearch", default="vsearch", help="vsearch executable.")
+    parser.add_argument("--id", type=float, default=0.90, help="Clustering identity (default: 0.90).")
+    parser.add_argument("--threads", type=int, default=1, help="Threads per vsearch call.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    allow = load_allow_list(CHECKM_TSV) if USE_CHECKM_FILTER else None
+    jobs = max(1, args.jobs)
+
+    with tempfile.TemporaryDirectory(prefix="m2i_16S_") as tmpdir:
+        if args.fake_vsearch:
+            clusterer = fake_vsearch
+        elif args.cluster and args.cluster_engine == "python":
+            clusterer = python_clusterer(args.id)
+        elif args.cluster:
+            clusterer = vsearch_clusterer(args.vsearch, args.id, args.threads, tmpdir)
+        else:
+            clusterer = None
+
+        for kingdom in args.domain or DOMAINS:
+            asyncio.run(run_domain(kingdom, args.root, jobs, clusterer, allow))
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
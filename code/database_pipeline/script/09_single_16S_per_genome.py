@@ -2,13 +2,16 @@
 from Bio import SeqIO
 from Bio.SeqRecord import SeqRecord
 import os, pandas as pd
+from stage_metrics import Stage
 
-ROOT = "/home/student.aau.dk/yr42on/Thesis/code/database_pipeline/intermediate/count_copies_per_genome"
+STAGE = Stage("09_single_16S_per_genome")
+
+ROOT = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/count_copies_per_genome")
 DOMAINS = ["bacteria","archaea"]
 
 # --- OPTIONAL: enforce CheckM allow-list (set to True to enable) ---
 USE_CHECKM_FILTER = False
-CHECKM_TSV = "/home/student.aau.dk/yr42on/Thesis/code/database_pipeline/intermediate/qc/checkm_filtered.tsv"
+CHECKM_TSV = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/qc/checkm_filtered.tsv")
 
 def norm_gid(fn: str) -> str:
     # normalize filenames to bare MAG id, e.g. MAG0001[...].(fa|fna) -> MAG0001
@@ -36,12 +39,14 @@ for kingdom in DOMAINS:
     os.makedirs(clustered, exist_ok=True); os.makedirs(singles, exist_ok=True)
 
     picked, source = {}, {}
+    STAGE.begin(f"{kingdom}_pick_longest")
 
     # 1) clustered: one file per MAG, may contain >1 centroid → pick longest
     for fn in sorted(os.listdir(clustered)):
         if not (fn.endswith(".fna") or fn.endswith(".fa")): continue
         gid = norm_gid(fn)
         if allow is not None and gid not in allow: continue
+        STAGE.track_input(os.path.join(clustered, fn))
         recs = list(SeqIO.parse(os.path.join(clustered, fn), "fasta"))
         if recs:
             rec = pick_longest(recs)
@@ -54,6 +59,7 @@ for kingdom in DOMAINS:
         gid = norm_gid(fn)
         if allow is not None and gid not in allow: continue
         if gid in picked: continue
+        STAGE.track_input(os.path.join(singles, fn))
         recs = list(SeqIO.parse(os.path.join(singles, fn), "fasta"))
         if recs:
             rec = pick_longest(recs)
@@ -66,5 +72,7 @@ for kingdom in DOMAINS:
         fh.write("genome_id\tsource\n")
         for k in sorted(picked):
             fh.write(f"{k}\t{source[k]}\n")
+    STAGE.track_output(out_fa, out_map)
+    STAGE.end()
 
     print(f"{kingdom}: wrote {len(picked)} sequences → {out_fa}")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+In-process replacement for 10_cluster_single_16S_genes.sh
+(vsearch --cluster_fast --id 1.0): collapse identical 16S sequences.
+
+Every sequence is normalised (uppercase, U -> T), hashed with BLAKE2b and
+grouped by digest in one linear pass; no external binary or Slurm job is
+needed. Clusters are then numbered the way vsearch does it (decreasing
+length, ties in input order, the first member becomes the centroid).
+
+Outputs (per domain, same names as step 10):
+  - {kingdom}_16S_centroids.fasta   centroid sequences (80-column FASTA like vsearch)
+  - {kingdom}_16S_clusters.uc       vsearch-style S/H/C records, read by 12/13
+
+Note: vsearch's identity ignores terminal gaps, so at --id 1.0 it can also
+merge a sequence that is an exact prefix/substring of a longer one. This
+script only merges exact duplicates, which is what step 10 is meant to do.
+
+Usage:
+  python 10_dereplicate_16S_genes.py
+  python 10_dereplicate_16S_genes.py --domain bacteria
+"""
+
+import os
+import hashlib
+import argparse
+
+from fasta_utils import iter_fasta, format_fasta
+from stage_metrics import Stage
+
+STAGE = Stage("10_dereplicate_16S_genes")
+
+# ============================= CONFIG ========================================
+ROOT = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/count_copies_per_genome")
+DOMAINS = ["archaea", "bacteria"]
+FASTA_WIDTH = 80  # vsearch --fasta_width default
+# ============================================================================
+
+_NORMALISE = bytes.maketrans(b"acgtunU", b"ACGTTNT")
+
+
+def seq_digest(seq: str) -> bytes:
+    return hashlib.blake2b(seq.encode().translate(_NORMALISE), digest_size=16).digest()
+
+
+def dereplicate(records):
+    """
+    records: iterable of (id, seq).
+    Returns a list of clusters [(centroid_id, centroid_seq, [member_ids...]), ...]
+    in vsearch cluster order; member_ids excludes the centroid.
+    """
+    groups = {}   # digest -> [first input index, centroid id, seq, members]
+    for i, (rid, seq) in enumerate(records):
+        d = seq_digest(seq)
+        g = groups.get(d)
+        if g is None:
+            groups[d] = [i, rid, seq, []]
+        else:
+            g[3].append(rid)
+    ordered = sorted(groups.values(), key=lambda g: (-len(g[2]), g[0]))
+    return [(rid, seq, members) for _, rid, seq, members in ordered]
+
+
+def write_outputs(clusters, out_cent: str, out_uc: str) -> None:
+    with open(out_cent, "w") as fc:
+        for rid, seq, _ in clusters:
+            fc.write(format_fasta(rid, seq, FASTA_WIDTH))
+    with open(out_uc, "w") as uc:
+        for k, (rid, seq, members) in enumerate(clusters):
+            n = len(seq)
+            uc.write(f"S\t{k}\t{n}\t*\t*\t*\t*\t*\t{rid}\t*\n")
+            for m in members:
+                uc.write(f"H\t{k}\t{n}\t100.0\t+\t0\t0\t=\t{m}\t{rid}\n")
+        for k, (rid, _, members) in enumerate(clusters):
+            uc.write(f"C\t{k}\t{len(members) + 1}\t*\t*\t*\t*\t*\t{rid}\t*\n")
+
+
+def dereplicate_domain(kingdom: str, root: str) -> None:
+    in_fa = os.path.join(root, f"{kingdom}_16S_genes.fasta")
+    out_cent = os.path.join(root, f"{kingdom}_16S_centroids.fasta")
+    out_uc = os.path.join(root, f"{kingdom}_16S_clusters.uc")
+    if not os.path.exists(in_fa):
+        print(f"[WARN] {kingdom}: input not found, skipping: {in_fa}")
+        return
+
+    print(f"[INFO] Dereplicating {kingdom} at 100% identity")
+    with STAGE.step(f"{kingdom}_dereplicate"):
+        clusters = dereplicate(iter_fasta(in_fa))
+        write_outputs(clusters, out_cent, out_uc)
+        STAGE.track_input(in_fa)
+        STAGE.track_output(out_cent, out_uc)
+
+    n_seqs = sum(len(m) + 1 for _, _, m in clusters)
+    print(f"[OK] {kingdom}: {n_seqs} sequences -> {len(clusters)} centroids")
+    print(f"[OK] Wrote: {out_cent}")
+    print(f"[OK] Wrote: {out_uc}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Collapse identical 16S sequences (replaces vsearch --cluster_fast --id 1.0)."
+    )
+    parser.add_argument("--root", default=ROOT, help="count_copies_per_genome directory.")
+    parser.add_argument("--domain", action="append", choices=DOMAINS,
+                        help="Domain(s) to process (repeatable; default: both).")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    for kingdom in args.domain or DOMAINS:
+        dereplicate_domain(kingdom, args.root)
+    print("[DONE] Wrote *_16S_centroids.fasta and *_16S_clusters.uc")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,12 @@ import sys
 import csv
 from collections import defaultdict
 import pandas as pd
-from Bio import SeqIO
+from stage_metrics import Stage
+from alignment_store import open_alignment
+from alignment_check import check_and_write
+from genome_stats import load_stats
+
+STAGE = Stage("12_choose_best_genome_arc")
 
 # ==========================
 # CONFIG — EDIT THESE PATHS
@@ -22,6 +27,12 @@ ALIGNED_FASTA= os.path.expanduser('~/Thesis/code/database_pipeline/intermediate/
 METADATA     = os.path.expanduser('~/Thesis/code/database_pipeline/intermediate/qc/checkm_filtered.tsv')
 ID_MAP       = os.path.expanduser('~/Thesis/code/database_pipeline/intermediate/MAGs_formatted/id_map.tsv')
 OUTDIR       = os.path.expanduser('~/Thesis/code/database_pipeline/intermediate/choose_best_genome/')
+# Set to e.g. os.path.expanduser('~/Thesis/code/database_pipeline/intermediate/raxml/archaea_raxml-check')
+# to run the raxml-ng --check equivalent in-process on the *_best.fna (replaces 14_raxmlng_check.sh)
+RAXML_CHECK_PREFIX = None
+# genome_stats.tsv from genome_stats.py; when set, ties in completeness/contamination
+# go to the genome with the larger N50 (then fewer contigs) instead of cluster order
+GENOME_STATS = None
 
 # ==========================
 
@@ -36,6 +47,7 @@ def read_id_map(path: str) -> dict:
             mp[row[of]] = row[ni]
     return mp
 
+@STAGE.timed()
 def parse_clusters(path: str, genes_in_alignment: set) -> dict:
     clusters = defaultdict(list)
     with open(path, 'r') as f:
@@ -71,7 +83,7 @@ def parse_clusters(path: str, genes_in_alignment: set) -> dict:
         clusters.setdefault(gid, [])
     return clusters
 
-def choose_best(md: pd.DataFrame, candidates: list) -> str:
+def choose_best(md: pd.DataFrame, candidates: list, stats: pd.DataFrame = None) -> str:
     avail = [g for g in candidates if g in md.index]
     if not avail:
         return sorted(candidates)[0]
@@ -80,7 +92,12 @@ def choose_best(md: pd.DataFrame, candidates: list) -> str:
     cont = pd.to_numeric(sub['checkm_contamination'], errors='coerce')
     sub['_comp'] = comp.fillna(float('-inf'))
     sub['_cont'] = cont.fillna(float('inf'))
-    sub = sub.sort_values(by=['_comp','_cont'], ascending=[False, True])
+    keys, ascending = ['_comp', '_cont'], [False, True]
+    if stats is not None:
+        sub['_n50'] = stats['n50'].reindex(sub.index).fillna(-1).values
+        sub['_contigs'] = stats['contigs'].reindex(sub.index).fillna(float('inf')).values
+        keys, ascending = keys + ['_n50', '_contigs'], ascending + [False, True]
+    sub = sub.sort_values(by=keys, ascending=ascending)
     return sub.index[0]
 
 def main():
@@ -88,6 +105,7 @@ def main():
     os.makedirs(outdir, exist_ok=True)
 
     md = pd.read_csv(METADATA, sep='\t', header=0, index_col=0)
+    STAGE.track_input(METADATA)
 
     # Filter metadata to domain if column exists
     if 'domain' in md.columns:
@@ -101,14 +119,20 @@ def main():
     # Harmonise IDs
     md.index = [i.replace('_genomic', '') for i in md.index]
 
-    records = list(SeqIO.parse(ALIGNED_FASTA, 'fasta'))
-    for r in records:
-        if r.id.endswith('_genomic'):
-            r.id = r.id[:-8]
-    genes_16S = [r.id for r in records]
+    with STAGE.step("read_alignment"):
+        aln = open_alignment(ALIGNED_FASTA)
+        STAGE.track_input(ALIGNED_FASTA)
+    aln = aln.rename(lambda i: i[:-8] if i.endswith('_genomic') else i)
+    genes_16S = aln.ids.tolist()
     genes_set = set(genes_16S)
 
+    stats = None
+    if GENOME_STATS:
+        stats = load_stats(GENOME_STATS)
+        STAGE.track_input(GENOME_STATS)
+
     clmap = parse_clusters(CLUSTERS, genes_set)
+    STAGE.track_input(CLUSTERS)
 
     best_map = {}
     processed_rows = []
@@ -118,20 +142,18 @@ def main():
         for c in candidates:
             if c not in ordered:
                 ordered.append(c)
-        best = choose_best(md, ordered)
+        best = choose_best(md, ordered, stats)
         best_map[centroid] = best
         processed_rows.append((centroid, best, ','.join(ordered)))
 
     out_fa = os.path.splitext(ALIGNED_FASTA)[0] + '_best.fna'
-    new_records = []
-    out_ids = []
-    for r in records:
-        new_id = best_map.get(r.id, r.id)
-        r.id = new_id
-        r.description = ''
-        new_records.append(r)
-        out_ids.append(new_id)
-    SeqIO.write(new_records, out_fa, 'fasta')
+    best_aln = aln.rename(best_map)
+    out_ids = best_aln.ids.tolist()
+    best_aln.write_fasta(out_fa)
+    STAGE.track_output(out_fa)
+    if RAXML_CHECK_PREFIX:
+        with STAGE.step("alignment_check"):
+            check_and_write(best_aln, RAXML_CHECK_PREFIX, out_fa)
 
     proc_path = os.path.join(outdir, f"{DOMAIN}_16S_clusters_processed.txt")
     with open(proc_path, 'w') as f:
@@ -142,6 +164,7 @@ def main():
     md_reduced = md.reindex(sorted(set(out_ids)))
     md_out = os.path.join(outdir, f"{DOMAIN}_metadata_clusters_ssu_align_centroids.csv")
     md_reduced.to_csv(md_out)
+    STAGE.track_output(proc_path, md_out)
 
     print(f"[OK] Wrote: {out_fa}")
     print(f"[OK] Wrote: {proc_path}")
@@ -8,6 +8,9 @@ from Bio import AlignIO
 from Bio.Align import MultipleSeqAlignment
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
+from stage_metrics import Stage
+
+STAGE = Stage("18_convert_phylip_to_fasta")
 
 # ====== CONFIG ======
 BAC_PHYLIP = os.path.expanduser('~/Thesis/code/database_pipeline/intermediate/raxml/bacteria_raxml-check.raxml.reduced.phy')
@@ -17,6 +20,7 @@ BAC_FASTA  = os.path.expanduser('~/Thesis/code/database_pipeline/intermediate/ra
 # ARC_FASTA  = os.path.expanduser('~/Thesis/code/database_pipeline/intermediate/raxml/archaea_raxml-check.raxml.reduced.fna')
 # ==========================================
 
+@STAGE.timed()
 def phylip_relaxed_to_fasta(phylip_path: str, fasta_path: str) -> None:
     seq_records = []
     with open(phylip_path, 'r') as f:
@@ -35,6 +39,8 @@ def phylip_relaxed_to_fasta(phylip_path: str, fasta_path: str) -> None:
             seq_records.append(SeqRecord(Seq(seq), id=name, description=''))
     msa = MultipleSeqAlignment(seq_records)
     AlignIO.write(msa, fasta_path, 'fasta')
+    STAGE.track_input(phylip_path)
+    STAGE.track_output(fasta_path)
     print(f"[OK] Wrote FASTA: {fasta_path}  (seqs: {len(seq_records)})")
 
 def main():
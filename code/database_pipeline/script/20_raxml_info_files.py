@@ -2,16 +2,32 @@
 """
 Create a RAxML_info-style file for PICRUSt2/SEPP from a RAxML-NG --evaluate log.
 
-Domain: bacteria only (archaea block is commented out for future use).
+Without arguments the hard-coded bacterial log below is converted. Pass one or
+more directories, globs or log files to convert many trees (per-batch,
+per-domain) in one go:
 
-Inputs (hard-coded):
-  - bacteria_raxml.raxml.log   (from raxml-ng --evaluate)
+  python 20_raxml_info_files.py intermediate/raxml
+  python 20_raxml_info_files.py 'intermediate/raxml/*_raxml.raxml.log' \
+      --jobs 8 --summary intermediate/raxml/raxml_summary.tsv
+
+Inputs:
+  - <prefix>.raxml.log   (from raxml-ng --evaluate)
 Outputs:
-  - bacteria_raxml.raxml_info  (RAxML 7.x-style info file)
+  - <prefix>.raxml_info  (RAxML 7.x-style info file, next to each log)
+  - optional summary TSV (prefix, patterns, log-likelihood, elapsed time)
+    for tracking tree statistics between database builds
 """
 
 import os
 import re
+import sys
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from stage_metrics import Stage
+
+STAGE = Stage("20_raxml_info_files")
 
 # ======================
 # CONFIG — EDIT IF NEEDED
@@ -28,8 +44,15 @@ BAC_INFO    = BAC_PREFIX + '.raxml_info'
 # ======================
 
 
+# Precompiled once; each log line is tested against at most one of these after
+# a cheap substring/prefix check, so a log is parsed in a single streaming pass.
+RE_PATTERNS = re.compile(r"Alignment comprises\s+(\d+)\s+partitions\s+and\s+(\d+)\s+patterns")
+RE_FINAL_LL = re.compile(r"Final LogLikelihood:\s+(-?[0-9.eE+-]+)")
+RE_ELAPSED  = re.compile(r"Elapsed time:\s+([0-9.eE+-]+)\s+seconds")
+
+
 def parse_raxml_ng_log(log_path: str):
-    """Parse key values out of a RAxML-NG --evaluate log."""
+    """Parse key values out of a RAxML-NG --evaluate log in one streaming pass."""
     patterns = None
     base_freqs = None
     subs_rates = None
@@ -37,55 +60,55 @@ def parse_raxml_ng_log(log_path: str):
     elapsed = None
     called_line = None
     cmd_line = None
+    want_cmd = False
 
     with open(log_path, 'r') as f:
-        lines = f.readlines()
+        for line in f:
+            line_stripped = line.strip()
 
-    # Find "RAxML-NG was called at ..." and the next non-empty line (the command)
-    for i, line in enumerate(lines):
-        if "RAxML-NG was called at" in line:
-            called_line = line.rstrip("\n")
+            # "RAxML-NG was called at ..." is followed by the command on the
             # next non-empty line
-            for j in range(i + 1, len(lines)):
-                cmd = lines[j].strip()
-                if cmd:
-                    cmd_line = cmd
-                    break
-            break
-
-    for line in lines:
-        line_stripped = line.strip()
-
-        # Alignment patterns
-        m = re.search(r"Alignment comprises\s+(\d+)\s+partitions\s+and\s+(\d+)\s+patterns", line_stripped)
-        if m:
-            patterns = int(m.group(2))
-            continue
-
-        # Base frequencies
-        if line_stripped.startswith("Base frequencies (ML):"):
-            # after colon: four floats
-            parts = line_stripped.split(":", 1)[1].strip().split()
-            base_freqs = parts  # ['0.241626', '0.217110', '0.322555', '0.218709']
-            continue
-
-        # Substitution rates
-        if line_stripped.startswith("Substitution rates (ML):"):
-            parts = line_stripped.split(":", 1)[1].strip().split()
-            subs_rates = parts  # six floats
-            continue
-
-        # Final log-likelihood
-        m2 = re.search(r"Final LogLikelihood:\s+(-?[0-9.eE+-]+)", line_stripped)
-        if m2:
-            final_ll = m2.group(1)
-            continue
-
-        # Elapsed time
-        m3 = re.search(r"Elapsed time:\s+([0-9.eE+-]+)\s+seconds", line_stripped)
-        if m3:
-            elapsed = m3.group(1)
-            continue
+            if want_cmd:
+                if line_stripped:
+                    cmd_line = line_stripped
+                    want_cmd = False
+                continue
+            if called_line is None and "RAxML-NG was called at" in line:
+                called_line = line.rstrip("\n")
+                want_cmd = True
+                continue
+
+            # Alignment patterns
+            if "Alignment comprises" in line_stripped:
+                m = RE_PATTERNS.search(line_stripped)
+                if m:
+                    patterns = int(m.group(2))
+                continue
+
+            # Base frequencies
+            if line_stripped.startswith("Base frequencies (ML):"):
+                # after colon: four floats
+                base_freqs = line_stripped.split(":", 1)[1].split()
+                continue
+
+            # Substitution rates
+            if line_stripped.startswith("Substitution rates (ML):"):
+                subs_rates = line_stripped.split(":", 1)[1].split()  # six floats
+                continue
+
+            # Final log-likelihood
+            if line_stripped.startswith("Final LogLikelihood:"):
+                m = RE_FINAL_LL.search(line_stripped)
+                if m:
+                    final_ll = m.group(1)
+                continue
+
+            # Elapsed time
+            if line_stripped.startswith("Elapsed time:"):
+                m = RE_ELAPSED.search(line_stripped)
+                if m:
+                    elapsed = m.group(1)
+                continue
 
     if patterns is None:
         raise RuntimeError(f"Could not parse alignment patterns from {log_path}")
@@ -112,8 +135,8 @@ def parse_raxml_ng_log(log_path: str):
     }
 
 
-def make_raxml_info(log_path: str, info_path: str):
-    """Build the RAxML_info-style file from a RAxML-NG log."""
+def make_raxml_info(log_path: str, info_path: str) -> dict:
+    """Build the RAxML_info-style file from a RAxML-NG log; returns the parsed values."""
     parsed = parse_raxml_ng_log(log_path)
 
     patterns   = parsed["patterns"]
@@ -159,15 +182,120 @@ def make_raxml_info(log_path: str, info_path: str):
 
     with open(info_path, "w") as out:
         out.write("\n".join(txt))
+    STAGE.track_input(log_path)
+    STAGE.track_output(info_path)
 
     print(f"[OK] Wrote RAxML_info: {info_path}")
+    return parsed
+
+
+def info_path_for(log_path: str) -> str:
+    """bacteria_raxml.raxml.log -> bacteria_raxml.raxml_info"""
+    if log_path.endswith('.raxml.log'):
+        return log_path[:-len('.raxml.log')] + '.raxml_info'
+    return os.path.splitext(log_path)[0] + '.raxml_info'
+
+
+def collect_logs(inputs: list) -> list:
+    """Expand directories (-> *.raxml.log inside), globs and plain paths; dedupe, keep order."""
+    logs = []
+    for item in inputs:
+        item = os.path.expanduser(item)
+        if os.path.isdir(item):
+            logs.extend(sorted(glob.glob(os.path.join(item, '*.raxml.log'))))
+        elif glob.has_magic(item):
+            logs.extend(sorted(glob.glob(item)))
+        elif os.path.exists(item):
+            logs.append(item)
+        else:
+            print(f"[WARN] No such log, directory or pattern: {item}", file=sys.stderr)
+    return list(dict.fromkeys(logs))
+
+
+def _convert_one(log_path: str):
+    """Worker: returns (log_path, parsed-or-None, error-or-None)."""
+    try:
+        return log_path, make_raxml_info(log_path, info_path_for(log_path)), None
+    except (OSError, RuntimeError) as e:
+        return log_path, None, str(e)
+
+
+def write_summary(rows: list, out_path: str) -> None:
+    with open(out_path, 'w') as f:
+        f.write('prefix\tpatterns\tfinal_loglik\telapsed_s\tlog\n')
+        for log_path, parsed in rows:
+            prefix = os.path.basename(log_path)
+            if prefix.endswith('.raxml.log'):
+                prefix = prefix[:-len('.raxml.log')]
+            f.write(f"{prefix}\t{parsed['patterns']}\t{parsed['final_ll']}\t"
+                    f"{parsed['elapsed']}\t{log_path}\n")
+    print(f"[OK] Wrote summary: {out_path}  (trees: {len(rows)})")
+
+
+def run_batch(inputs: list, jobs: int, summary: str = None) -> int:
+    logs = collect_logs(inputs)
+    if not logs:
+        raise SystemExit("[ERROR] No *.raxml.log files found")
+    print(f"[INFO] Converting {len(logs)} RAxML-NG logs with {jobs} worker(s)")
+
+    with STAGE.step("convert_logs"):
+        if jobs > 1 and len(logs) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as ex:
+                results = list(ex.map(_convert_one, logs))
+            # workers account their own files; record the totals here
+            for log_path, _, err in results:
+                if err is None:
+                    STAGE.track_input(log_path)
+                    STAGE.track_output(info_path_for(log_path))
+        else:
+            results = [_convert_one(p) for p in logs]
+
+    rows, failed = [], []
+    for log_path, parsed, err in results:
+        if err is None:
+            rows.append((log_path, parsed))
+        else:
+            failed.append(log_path)
+            print(f"[WARN] {err}", file=sys.stderr)
+
+    if summary:
+        write_summary(rows, summary)
+    if failed:
+        print(f"[WARN] {len(failed)} log(s) could not be parsed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Create RAxML_info files from one or many RAxML-NG --evaluate logs."
+    )
+    parser.add_argument(
+        "inputs", nargs="*",
+        help="Directories (scanned for *.raxml.log), glob patterns or log files. "
+             "Default: the hard-coded bacterial log."
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1,
+        help="Number of logs converted in parallel (default: 1)."
+    )
+    parser.add_argument(
+        "--summary",
+        help="Write a TSV of patterns, final log-likelihood and elapsed time per tree."
+    )
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+    if args.inputs:
+        sys.exit(run_batch(args.inputs, max(1, args.jobs), args.summary))
+
     # Bacteria
     if not os.path.exists(BAC_LOG):
         raise SystemExit(f"[ERROR] Log file not found: {BAC_LOG}")
-    make_raxml_info(BAC_LOG, BAC_INFO)
+    parsed = make_raxml_info(BAC_LOG, BAC_INFO)
+    if args.summary:
+        write_summary([(BAC_LOG, parsed)], args.summary)
 
     # Archaea (enable later)
     # if os.path.exists(ARC_LOG):
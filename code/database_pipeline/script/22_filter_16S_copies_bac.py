@@ -1,8 +1,26 @@
 #!/usr/bin/env python3
+"""
+Filter the 16S copy-number tables down to the genomes kept in the final
+PICRUSt2 reference FASTA and cap counts at 10.
+
+Reference IDs are collected with a header-only scan (fasta_utils) and the copy
+table is filtered line by line, so this step runs at disk speed even on the
+alignment-width bac_ref.fna.
+
+Usage:
+  python 22_filter_16S_copies_bac.py                       # bacteria (default)
+  python 22_filter_16S_copies_bac.py --domain bacteria --domain archaea
+  python 22_filter_16S_copies_bac.py --domain bacteria \
+      --ref extra_ref.fna extra_16S_copies.txt extra_ref/extra_16S_copies.txt
+"""
 
-from Bio import SeqIO
-import pandas as pd
 import os
+import argparse
+
+from fasta_utils import read_fasta_ids
+from stage_metrics import Stage
+
+STAGE = Stage("22_filter_16S_copies")
 
 # =======================
 # CONFIG (hard-coded paths)
@@ -10,53 +28,80 @@ import os
 
 BASE = os.path.expanduser('~/Thesis/code/database_pipeline/intermediate')
 
-# Input
-BAC_COPIES_IN = os.path.join(BASE, 'count_copies_per_genome/bacteria_16S_copies.txt')
-BAC_FASTA     = os.path.join(BASE, 'gtdb_r220_picrust_ref/bac_ref/bac_ref.fna')
-
-# Output
-BAC_COPIES_OUT = os.path.join(BASE, 'gtdb_r220_picrust_ref/bac_ref/bacteria_16S_copies.txt')
-
-# For later:
-# ARC_COPIES_IN  = os.path.join(BASE, 'count_copies_per_genome/archaea_16S_copies.txt')
-# ARC_FASTA      = os.path.join(BASE, 'gtdb_r220_picrust_ref/arc_ref/arc_ref.fna')
-# ARC_COPIES_OUT = os.path.join(BASE, 'gtdb_r220_picrust_ref/arc_ref/archaea_16S_copies.txt')
+MAX_COPIES = 10
+
+# domain -> (reference FASTA, copy table in, copy table out)
+DOMAINS = {
+    'bacteria': (
+        os.path.join(BASE, 'gtdb_r220_picrust_ref/bac_ref/bac_ref.fna'),
+        os.path.join(BASE, 'count_copies_per_genome/bacteria_16S_copies.txt'),
+        os.path.join(BASE, 'gtdb_r220_picrust_ref/bac_ref/bacteria_16S_copies.txt'),
+    ),
+    'archaea': (
+        os.path.join(BASE, 'gtdb_r220_picrust_ref/arc_ref/arc_ref.fna'),
+        os.path.join(BASE, 'count_copies_per_genome/archaea_16S_copies.txt'),
+        os.path.join(BASE, 'gtdb_r220_picrust_ref/arc_ref/archaea_16S_copies.txt'),
+    ),
+}
 # =======================
 
 def filter_copy_table(fasta, copy_file, out_file):
     print(f"[INFO] Filtering: {copy_file}")
     print(f"[INFO] Using genomes from: {fasta}")
 
-    # 1. Collect genome IDs from the final reference FASTA
-    included = [rec.id for rec in SeqIO.parse(fasta, 'fasta')]
-    included_set = set(included)
+    # 1. Collect genome IDs from the final reference FASTA (headers only)
+    with STAGE.step("scan_reference_ids"):
+        included_set = read_fasta_ids(fasta)
+        STAGE.track_input(fasta)
     print(f"[INFO] Genomes in reference: {len(included_set)}")
 
-    # 2. Load table of copy numbers
-    df = pd.read_csv(copy_file, index_col=0, header=None, sep="\t")
-    print(f"[INFO] Input copy table entries: {df.shape[0]}")
-
-    # 3. Filter to only genomes in bac_ref.fna
-    df = df.loc[df.index.intersection(included_set), :]
-
-    # 4. Reset index and name columns
-    df = df.reset_index()
-    df.columns = ['assembly', '16S_rRNA_Count']
-
-    # 5. Cap counts above 10
-    df.loc[df['16S_rRNA_Count'] > 10, '16S_rRNA_Count'] = 10
-
-    # 6. Write output
-    df.to_csv(out_file, index=False, sep="\t")
+    # 2. Stream the copy table (genome<TAB>copies, no header), keep only
+    #    genomes in the reference and cap counts above MAX_COPIES
+    n_in = n_out = 0
+    with STAGE.step("filter_copy_table"):
+        with open(copy_file) as fin, open(out_file, 'w') as fout:
+            fout.write('assembly\t16S_rRNA_Count\n')
+            for line in fin:
+                if not line.strip():
+                    continue
+                n_in += 1
+                gid, count = line.rstrip('\n').split('\t')[:2]
+                if gid not in included_set:
+                    continue
+                fout.write(f"{gid}\t{min(int(count), MAX_COPIES)}\n")
+                n_out += 1
+        STAGE.track_input(copy_file)
+        STAGE.track_output(out_file)
+
+    print(f"[INFO] Input copy table entries: {n_in}")
     print(f"[OK] Wrote filtered table: {out_file}")
-    print(f"[INFO] Final rows: {df.shape[0]}")
+    print(f"[INFO] Final rows: {n_out}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Filter 16S copy tables to the genomes in the PICRUSt2 reference FASTA."
+    )
+    parser.add_argument(
+        "--domain", action="append", choices=sorted(DOMAINS),
+        help="Domain(s) to filter with the hard-coded paths (repeatable; default: bacteria)."
+    )
+    parser.add_argument(
+        "--ref", action="append", nargs=3, metavar=("FASTA", "COPIES_IN", "COPIES_OUT"),
+        help="Extra reference to filter in the same run (repeatable)."
+    )
+    args = parser.parse_args()
+    if not args.domain and not args.ref:
+        args.domain = ['bacteria']
+    return args
 
 def main():
-    # Bacteria
-    filter_copy_table(BAC_FASTA, BAC_COPIES_IN, BAC_COPIES_OUT)
+    args = parse_args()
+    jobs = [DOMAINS[d] for d in dict.fromkeys(args.domain or [])]
+    jobs += [tuple(r) for r in (args.ref or [])]
 
-    # Archaea (enable later)
-    # filter_copy_table(ARC_FASTA, ARC_COPIES_IN, ARC_COPIES_OUT)
+    for fasta, copy_file, out_file in jobs:
+        os.makedirs(os.path.dirname(os.path.abspath(out_file)), exist_ok=True)
+        filter_copy_table(fasta, copy_file, out_file)
 
 if __name__ == "__main__":
     main()
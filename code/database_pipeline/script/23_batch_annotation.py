@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Batched eggNOG-mapper annotation (alternative to the per-MAG loop in
+23_annotation.sh).
+
+emapper.py reloads the DIAMOND database and taxonomy on every call, so running
+it once per MAG spends most of the time on start-up. Here proteins from many
+genomes are concatenated into one FASTA (headers prefixed with
+"<genome>|"), annotated with a single emapper call per batch, and the
+resulting .emapper.annotations file is stream-split back into one
+<genome>.emapper.annotations per genome, in the layout parse_eggnog_dir in
+24_build_kotable.py expects (same '#' header lines, original protein IDs).
+
+- Genomes that already have <genome>.emapper.annotations in OUTDIR are
+  skipped, so an interrupted run can simply be restarted.
+- Per-genome files are written under a hidden temporary name and renamed
+  when the batch is complete.
+- --stub replaces emapper with a deterministic offline annotator that writes
+  the same file format (for testing the batching/demultiplexing).
+- --run-prodigal predicts proteins (as in 23_annotation.sh) for genomes that
+  have no <genome>.faa in PROT_DIR yet.
+
+Usage:
+  python 23_batch_annotation.py --batch-size 200 --cpu 32
+  python 23_batch_annotation.py --stub --prot-dir /tmp/faa --outdir /tmp/eggnog_out
+"""
+
+import os
+import sys
+import glob
+import shutil
+import hashlib
+import argparse
+import subprocess
+import tempfile
+
+from eggnog_format import emapper_header, emapper_row
+from fasta_utils import iter_fasta, format_fasta
+from stage_metrics import Stage
+
+STAGE = Stage("23_batch_annotation")
+
+# ============================= CONFIG ========================================
+ENV_NAME = "eggnog_legacy"  # env with emapper.py, prodigal
+DATA_DIR = "/databases/eggnog/eggnog_2020-03-31"
+GENOME_DIR = os.path.expanduser("~/Thesis/code/database_pipeline/MAGs")
+PROT_DIR = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/eggnog_proteins")
+OUTDIR = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/eggnog_out")
+ID_MAP = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/MAGs_formatted/id_map.tsv")
+
+SEP = "|"             # <genome>|<protein id> in batch FASTAs
+SUFFIX = ".emapper.annotations"
+# ============================================================================
+
+
+def read_id_map(path: str) -> dict:
+    """original_filename -> new_id (same file 23_annotation.sh reads)."""
+    mp = {}
+    if not os.path.exists(path):
+        return mp
+    with open(path) as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 2 or parts[0] == "original_filename" or not parts[0]:
+                continue
+            mp[parts[0]] = parts[1]
+    return mp
+
+
+def run_prodigal(genome_dir: str, prot_dir: str, id_map: dict) -> None:
+    """Predict proteins for MAGs without a .faa yet (mirrors 23_annotation.sh)."""
+    for f in sorted(glob.glob(os.path.join(genome_dir, "*.fa"))):
+        base = os.path.basename(f)
+        sample = id_map.get(base)
+        if sample is None:
+            sample = base[:-len(".fa")]
+            print(f"[WARN] No mapping for {base} in {ID_MAP}, using {sample}", file=sys.stderr)
+        faa = os.path.join(prot_dir, f"{sample}.faa")
+        if os.path.exists(faa):
+            continue
+        print(f"[INFO] Predicting proteins for {base} -> {faa}")
+        subprocess.run(["conda", "run", "-n", ENV_NAME, "prodigal",
+                        "-i", f, "-a", faa, "-p", "single"],
+                       check=True, stdout=subprocess.DEVNULL)
+
+
+def pending_genomes(prot_dir: str, outdir: str) -> list:
+    """(genome, faa) for every protein file whose annotation does not exist yet."""
+    todo = []
+    for faa in sorted(glob.glob(os.path.join(prot_dir, "*.faa"))):
+        genome = os.path.basename(faa)[:-len(".faa")]
+        if SEP in genome:
+            raise SystemExit(f"[ERROR] Genome ID contains the batch separator '{SEP}': {genome}")
+        if not os.path.exists(os.path.join(outdir, genome + SUFFIX)):
+            todo.append((genome, faa))
+    return todo
+
+
+def write_batch_fasta(batch: list, path: str) -> int:
+    n = 0
+    with open(path, "w", buffering=1 << 20) as out:
+        for genome, faa in batch:
+            for rid, seq in iter_fasta(faa):
+                # prodigal marks stop codons with '*'; DIAMOND/emapper drop them anyway
+                out.write(format_fasta(f"{genome}{SEP}{rid}", seq.rstrip("*")))
+                n += 1
+    return n
+
+
+# ============================= ANNOTATORS ====================================
+
+def emapper_annotate(faa: str, name: str, workdir: str, cpu: int) -> str:
+    subprocess.run(["conda", "run", "-n", ENV_NAME, "emapper.py",
+                    "-m", "diamond", "--data_dir", DATA_DIR,
+                    "-i", faa, "-o", name, "--output_dir", workdir,
+                    "--cpu", str(cpu)], check=True)
+    return os.path.join(workdir, name + SUFFIX)
+
+
+def stub_annotate(faa: str, name: str, workdir: str, cpu: int) -> str:
+    """Offline stand-in for emapper: deterministic KO per protein sequence."""
+    out_path = os.path.join(workdir, name + SUFFIX)
+    with open(out_path, "w") as out:
+        out.write("## emapper-stub\n## command: 23_batch_annotation.py --stub\n")
+        out.write(emapper_header())
+        for rid, seq in iter_fasta(faa):
+            h = int.from_bytes(hashlib.blake2b(seq.encode(), digest_size=4).digest(), "big")
+            if h % 3 == 0:
+                continue  # unannotated protein
+            ko = f"ko:K{h % 25000:05d}"
+            out.write(emapper_row({"query": rid, "evalue": "1e-50", "score": "100.0",
+                                   "Description": "stub", "KEGG_ko": ko}))
+        out.write("## stub finished\n")
+    return out_path
+
+
+# ============================= DEMULTIPLEX ===================================
+
+def demultiplex(ann_path: str, genomes: list, outdir: str) -> None:
+    """
+    Stream-split a batch .emapper.annotations into <genome>.emapper.annotations.
+    Leading '#' lines (version, command, column header) are copied to every
+    genome file; trailing '#' lines are copied too. Genomes without any hit
+    still get a header-only file, so resume skips them.
+    """
+    tmp = {g: os.path.join(outdir, f".{g}{SUFFIX}.partial") for g in genomes}
+    handles = {g: open(p, "w") for g, p in tmp.items()}
+    try:
+        with open(ann_path) as f:
+            for line in f:
+                if line.startswith("#"):
+                    for h in handles.values():
+                        h.write(line)
+                    continue
+                query, rest = line.split("\t", 1)
+                genome, _, rid = query.partition(SEP)
+                h = handles.get(genome)
+                if h is None:
+                    raise RuntimeError(f"Unexpected query '{query}' in {ann_path}")
+                h.write(f"{rid}\t{rest}")
+    finally:
+        for h in handles.values():
+            h.close()
+    for g, p in tmp.items():
+        os.replace(p, os.path.join(outdir, g + SUFFIX))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batched eggNOG-mapper annotation with per-genome demultiplexing.")
+    parser.add_argument("--prot-dir", default=PROT_DIR, help="Directory with <genome>.faa files.")
+    parser.add_argument("--outdir", default=OUTDIR, help="Directory for <genome>.emapper.annotations.")
+    parser.add_argument("--batch-size", type=int, default=200, help="Genomes per emapper call (default: 200).")
+    parser.add_argument("--cpu", type=int, default=int(os.environ.get("SLURM_CPUS_PER_TASK", 16)))
+    parser.add_argument("--run-prodigal", action="store_true",
+                        help="Predict proteins for MAGs in GENOME_DIR that have no .faa yet.")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub annotator instead of emapper.")
+    parser.add_argument("--keep-batches", action="store_true", help="Keep batch FASTA/annotation files.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.outdir, exist_ok=True)
+    os.makedirs(args.prot_dir, exist_ok=True)
+
+    if args.run_prodigal:
+        with STAGE.step("prodigal"):
+            run_prodigal(GENOME_DIR, args.prot_dir, read_id_map(ID_MAP))
+
+    todo = pending_genomes(args.prot_dir, args.outdir)
+    n_batches = (len(todo) + args.batch_size - 1) // args.batch_size
+    print(f"[INFO] {len(todo)} genomes to annotate in {n_batches} batch(es) of <= {args.batch_size}")
+    annotate = stub_annotate if args.stub else emapper_annotate
+
+    workdir = tempfile.mkdtemp(prefix="emapper_batches_", dir=args.outdir)
+    try:
+        for b in range(n_batches):
+            batch = todo[b * args.batch_size:(b + 1) * args.batch_size]
+            name = f"batch_{b:04d}"
+            with STAGE.step(name):
+                faa = os.path.join(workdir, name + ".faa")
+                n_prot = write_batch_fasta(batch, faa)
+                STAGE.track_input(*(p for _, p in batch))
+                print(f"[INFO] {name}: {len(batch)} genomes, {n_prot} proteins")
+                ann = annotate(faa, name, workdir, args.cpu)
+                demultiplex(ann, [g for g, _ in batch], args.outdir)
+                STAGE.track_output(*(os.path.join(args.outdir, g + SUFFIX) for g, _ in batch))
+            print(f"[OK] {name}: wrote {len(batch)} annotation files to {args.outdir}")
+    finally:
+        if args.keep_batches:
+            print(f"[INFO] Batch files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print("[DONE] All pending genomes annotated.")
+
+
+if __name__ == "__main__":
+    main()
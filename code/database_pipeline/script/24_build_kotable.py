@@ -19,6 +19,13 @@ Usage examples:
       --arc-dir /path/to/archaea_annotations \
       --arc-out default_files/archaea/ko.txt.gz
 
+  # KO + EC + pathway + COG tables from one read of the annotations
+  python 24_build_kotable.py \
+      --bac-dir /path/to/bacteria_annotations \
+      --bac-out default_files/bacteria/ko.txt.gz \
+      --traits KEGG_ko EC KEGG_Pathway COG_category
+      # -> default_files/bacteria/{ko,ec,kegg_pathway,cog_category}.txt.gz
+
 Assumptions:
   - Each genome has one eggNOG file named like:
         GENOME_ID.emapper.annotations
@@ -44,10 +51,14 @@ Output format (per domain):
 import sys
 import os
 import glob
-import gzip
 import argparse
 from collections import Counter, defaultdict
 
+from gzip_io import gz_open
+from stage_metrics import Stage
+
+STAGE = Stage("24_build_kotable")
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -69,6 +80,12 @@ def parse_args():
         "--arc-out", required=False,
         help="Output path for archaeal ko.txt.gz (optional; required if --arc-dir is used)."
     )
+    parser.add_argument(
+        "--traits", nargs="+", default=["KEGG_ko"],
+        help="eggNOG columns to extract in the same pass (default: KEGG_ko). "
+             "E.g. --traits KEGG_ko EC KEGG_Pathway COG_category; every column other than "
+             "KEGG_ko is written next to the ko.txt.gz (ec.txt.gz, kegg_pathway.txt.gz, ...)."
+    )
 
     args = parser.parse_args()
 
@@ -106,13 +123,87 @@ def extract_genome_id_from_filename(filename: str) -> str:
         return base.split(".")[0]
 
 
-def parse_eggnog_dir(ann_dir: str) -> dict:
+# ---------------------------------------------------------------------------
+# Trait columns: eggNOG column -> (output file name, column prefix, tokenizer)
+# ---------------------------------------------------------------------------
+
+def _split_field(kfield: str) -> list:
+    # Try both comma and pipe as separators for multiple entries
+    if "," in kfield:
+        return kfield.split(",")
+    if "|" in kfield:
+        return kfield.split("|")
+    return [kfield]
+
+
+def _ko_tokens(kfield: str) -> list:
+    out = []
+    for ko in _split_field(kfield):
+        ko = ko.strip()
+        if ko.startswith("ko:"):
+            ko = ko[3:]
+        # Keep only canonical KEGG KO IDs like K01623
+        if ko.startswith("K") and len(ko) == 6 and ko[1:].isdigit():
+            out.append(ko)
+    return out
+
+
+def _ec_tokens(field: str) -> list:
+    # complete EC numbers only (1.1.1.1, not 1.1.1.- )
+    out = []
+    for ec in _split_field(field):
+        ec = ec.strip()
+        parts = ec.split(".")
+        if len(parts) == 4 and all(x.isdigit() for x in parts):
+            out.append(ec)
+    return out
+
+
+def _pathway_tokens(field: str) -> list:
+    # eggNOG lists every pathway twice (ko00010,map00010); keep the ko form
+    return [t.strip() for t in _split_field(field) if t.strip().startswith("ko")]
+
+
+def _cog_tokens(field: str) -> list:
+    # one letter per functional category, e.g. "EG"
+    return [c for c in field.strip() if c.isalpha()]
+
+
+def _generic_tokens(field: str) -> list:
+    return [t.strip() for t in _split_field(field) if t.strip() and t.strip() != "-"]
+
+
+TRAITS = {
+    "KEGG_ko":      ("ko.txt.gz", "ko:", _ko_tokens),
+    "EC":           ("ec.txt.gz", "EC:", _ec_tokens),
+    "KEGG_Pathway": ("kegg_pathway.txt.gz", "", _pathway_tokens),
+    "COG_category": ("cog_category.txt.gz", "COG:", _cog_tokens),
+}
+
+
+def trait_spec(column: str):
+    """(output file name, column prefix, tokenizer) for an eggNOG column."""
+    return TRAITS.get(column, (f"{column.lower()}.txt.gz", "", _generic_tokens))
+
+
+def trait_out_path(column: str, ko_out: str) -> str:
+    """KEGG_ko keeps the --bac-out/--arc-out path; other traits go next to it."""
+    if column == "KEGG_ko":
+        return ko_out
+    return os.path.join(os.path.dirname(os.path.abspath(ko_out)), trait_spec(column)[0])
+
+
+@STAGE.timed()
+def parse_eggnog_dir(ann_dir: str, traits=("KEGG_ko",)) -> dict:
     """
-    Parse all *.emapper.annotations* files in ann_dir, and return:
+    Parse all *.emapper.annotations* files in ann_dir once and return:
 
-        genome_id -> Counter(KO -> copy_number)
+        trait column -> genome_id -> Counter(token -> copy_number)
 
-    i.e. for each genome (file) and each KO, how many times it appears.
+    i.e. for each requested column (KEGG_ko, EC, ...), each genome (file) and
+    each KO/EC/..., how many proteins carry it. Raw field values repeat a lot
+    across proteins and genomes, so each column keeps a cache from field
+    string to its (interned) tokens.
     """
     pattern = os.path.join(ann_dir, "*.emapper.annotations*")
     ann_files = sorted(glob.glob(pattern))
@@ -120,71 +211,66 @@ def parse_eggnog_dir(ann_dir: str) -> dict:
     if not ann_files:
         sys.stderr.write(f"Warning: no *.emapper.annotations files found in {ann_dir}\n")
 
-    ko_counts = defaultdict(Counter)
+    traits = list(traits)
+    tokenizers = [trait_spec(t)[2] for t in traits]
+    caches = [{} for _ in traits]
+    counts = {t: defaultdict(Counter) for t in traits}
 
     for ann in ann_files:
         genome_id = extract_genome_id_from_filename(ann)
         sys.stderr.write(f"Processing {ann} -> genome_id {genome_id}\n")
+        STAGE.track_input(ann)
+        genome_counts = [counts[t][genome_id] for t in traits]
 
         with open(ann) as f:
-            ko_idx = None
-            header_found = False
+            idxs = None
 
             for line in f:
                 if line.startswith("#"):
                     # Comment or header line. We only treat it as the header
-                    # if it actually contains the 'KEGG_ko' column.
-                    text = line[1:].rstrip("\n")
-                    cols = text.split("\t")
-                    if "KEGG_ko" in cols:
-                        ko_idx = cols.index("KEGG_ko")
-                        header_found = True
+                    # if it actually contains the requested columns.
+                    cols = line[1:].rstrip("\n").split("\t")
+                    if traits[0] in cols or "query" in cols:
+                        missing = [t for t in traits if t not in cols]
+                        if missing:
+                            sys.stderr.write(f"Error: columns {missing} not found in header of {ann}\n")
+                            sys.exit(1)
+                        idxs = [cols.index(t) for t in traits]
                     # Else: just another comment line (version, command, time, etc.)
                     continue
 
                 # From here on we are in data lines.
-                if not header_found or ko_idx is None:
+                if idxs is None:
                     sys.stderr.write(
-                        f"Error: no header line containing 'KEGG_ko' found in {ann}\n"
+                        f"Error: no header line containing {traits[0]!r} found in {ann}\n"
                     )
                     sys.exit(1)
 
                 cols = line.rstrip("\n").split("\t")
-                if len(cols) <= ko_idx:
-                    # malformed line
-                    continue
-
-                kfield = cols[ko_idx].strip()
-                if not kfield or kfield == "-" or kfield.upper() == "NA":
-                    continue
-
-                # Try both comma and pipe as separators for multiple KOs
-                if "," in kfield:
-                    raw_kos = kfield.split(",")
-                elif "|" in kfield:
-                    raw_kos = kfield.split("|")
-                else:
-                    raw_kos = [kfield]
-
-                for ko in raw_kos:
-                    ko = ko.strip()
-                    if not ko or ko == "-" or ko.upper() == "NA":
-                        continue
-                    if ko.startswith("ko:"):
-                        ko = ko[3:]
-
-                    # Keep only canonical KEGG KO IDs like K01623
-                    if not (ko.startswith("K") and len(ko) == 6 and ko[1:].isdigit()):
+                for idx, tokenize, cache, counter in zip(idxs, tokenizers, caches, genome_counts):
+                    if len(cols) <= idx:
+                        # malformed line
                         continue
-
-                    ko_counts[genome_id][ko] += 1
-
-    return ko_counts
-
-
-def write_ko_table(ko_counts: dict, out_path: str):
+                    field = cols[idx]
+                    tokens = cache.get(field)
+                    if tokens is None:
+                        value = field.strip()
+                        if not value or value == "-" or value.upper() == "NA":
+                            tokens = ()
+                        else:
+                            tokens = tuple(sys.intern(t) for t in tokenize(value))
+                        cache[field] = tokens
+                    for tok in tokens:
+                        counter[tok] += 1
+
+    # genomes without a single hit in a column get no row in that table (as before --traits)
+    return {t: {g: c for g, c in per_genome.items() if c} for t, per_genome in counts.items()}
+
+
+@STAGE.timed()
+def write_trait_table(trait_counts: dict, out_path: str, prefix: str = "ko:", label: str = "KO"):
     """
-    Write a PICRUSt2-style wide KO table (gzipped) with format:
+    Write a PICRUSt2-style wide trait table (gzipped) with format:
 
         assembly    ko:K00003    ko:K00008    ...
         MAG0001     1            3            ...
@@ -192,51 +278,65 @@ def write_ko_table(ko_counts: dict, out_path: str):
 
     where:
       - rows = genomes (assembly IDs),
-      - columns = KOs prefixed with 'ko:',
+      - columns = traits with their prefix ('ko:', 'EC:', ...),
       - entries = copy numbers (int).
     """
     out_dir = os.path.dirname(os.path.abspath(out_path))
     if out_dir and not os.path.isdir(out_dir):
         os.makedirs(out_dir, exist_ok=True)
 
-    # Collect the full KO universe across all genomes
-    all_kos = set()
-    for counter in ko_counts.values():
-        all_kos.update(counter.keys())
-    all_kos = sorted(all_kos)
+    # Collect the full trait universe across all genomes
+    all_traits = set()
+    for counter in trait_counts.values():
+        all_traits.update(counter.keys())
+    all_traits = sorted(all_traits)
 
-    with gzip.open(out_path, "wt") as out:
-        # Header: 'assembly' + all KOs (with 'ko:' prefix)
-        header = ["assembly"] + [f"ko:{ko}" for ko in all_kos]
+    with gz_open(out_path, "wt", gzipped=True) as out:
+        # Header: 'assembly' + all traits (with prefix)
+        header = ["assembly"] + [f"{prefix}{t}" for t in all_traits]
         out.write("\t".join(header) + "\n")
 
-        # Rows: one per genome, with counts in the same KO order
-        for genome_id in sorted(ko_counts.keys()):
-            counter = ko_counts[genome_id]
+        # Rows: one per genome, with counts in the same trait order
+        for genome_id in sorted(trait_counts.keys()):
+            counter = trait_counts[genome_id]
             row = [genome_id]
-            for ko in all_kos:
-                n = counter.get(ko, 0)
+            for t in all_traits:
+                n = counter.get(t, 0)
                 row.append(str(n))
             out.write("\t".join(row) + "\n")
 
+    STAGE.track_output(out_path)
+    unit = "KOs" if label == "KO" else "traits"
     sys.stderr.write(
-        f"Wrote KO matrix with {len(ko_counts)} genomes and {len(all_kos)} KOs to {out_path}\n"
+        f"Wrote {label} matrix with {len(trait_counts)} genomes and {len(all_traits)} {unit} to {out_path}\n"
     )
 
 
+def write_ko_table(ko_counts: dict, out_path: str):
+    write_trait_table(ko_counts, out_path, "ko:", "KO")
+
+
+def write_trait_tables(counts: dict, ko_out: str):
+    """One matrix per parsed column; KEGG_ko goes to ko_out, the others next to it."""
+    for column, per_genome in counts.items():
+        _, prefix, _ = trait_spec(column)
+        label = "KO" if column == "KEGG_ko" else column
+        write_trait_table(per_genome, trait_out_path(column, ko_out), prefix, label)
+
+
 def main():
     args = parse_args()
 
     # Bacteria (always)
     sys.stderr.write(f"=== Bacteria: parsing {args.bac_dir} ===\n")
-    bac_counts = parse_eggnog_dir(args.bac_dir)
-    write_ko_table(bac_counts, args.bac_out)
+    bac_counts = parse_eggnog_dir(args.bac_dir, args.traits)
+    write_trait_tables(bac_counts, args.bac_out)
 
     # Archaea (optional)
     if args.arc_dir:
         sys.stderr.write(f"=== Archaea: parsing {args.arc_dir} ===\n")
-        arc_counts = parse_eggnog_dir(args.arc_dir)
-        write_ko_table(arc_counts, args.arc_out)
+        arc_counts = parse_eggnog_dir(args.arc_dir, args.traits)
+        write_trait_tables(arc_counts, args.arc_out)
     else:
         sys.stderr.write("No --arc-dir provided, skipping archaeal KO table.\n")
 
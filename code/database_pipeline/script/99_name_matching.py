@@ -1,6 +1,9 @@
 #!/usr/bin/env barrnap_env
 import sys
-import gzip
+from gzip_io import gz_open
+from stage_metrics import Stage
+
+STAGE = Stage("99_name_matching")
 
 if len(sys.argv) != 4:
     print(f"Usage: {sys.argv[0]} <ko_txt_gz_in> <id_map.tsv> <ko_txt_gz_out>")
@@ -21,7 +24,8 @@ with open(id_map_file) as f:
         id_map[orig_no_ext] = new
 
 # Rewrite KO table
-with gzip.open(ko_in, "rt") as fin, gzip.open(ko_out, "wt") as fout:
+STAGE.begin("rewrite_ids")
+with gz_open(ko_in, "rt", gzipped=True) as fin, gz_open(ko_out, "wt", gzipped=True) as fout:
     header = next(fin).rstrip("\n")
     fout.write(header + "\n")
 
@@ -36,5 +40,8 @@ with gzip.open(ko_in, "rt") as fin, gzip.open(ko_out, "wt") as fout:
 
         new_id = id_map[genome_id]
         fout.write(f"{new_id}\t{ko}\t{count}\n")
+STAGE.track_input(ko_in, id_map_file)
+STAGE.track_output(ko_out)
+STAGE.end()
 
 print(f"Corrected KO table written to: {ko_out}")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+In-process replacement for 14_raxmlng_check.sh (raxml-ng --check).
+
+Works on the alignment matrix from alignment_store.py:
+  - per-column and per-row fractions of undetermined characters (- . N ? X O)
+  - fully undetermined columns and sequences are dropped
+  - exact duplicate sequences (case-insensitive) are found by hashing rows;
+    the first occurrence is kept, like raxml-ng
+  - duplicate sequence names are an error
+
+Outputs (same names raxml-ng uses, so 18/19 do not change):
+  - <prefix>.raxml.reduced.phy   relaxed PHYLIP, only written when something was
+                                 removed (as raxml-ng does) unless --always-write
+  - <prefix>.raxml.log           WARNING/NOTE lines in raxml-ng's wording
+  - <prefix>.check.tsv           per sequence: undetermined fraction and status
+
+12/13 can call check_and_write() right after best-genome selection
+(see RAXML_CHECK_PREFIX there), so no separate Slurm job is needed.
+
+Usage:
+  python alignment_check.py
+  python alignment_check.py --msa bacteria_16S_centroids_ssu_align_best.fna --prefix raxml/bacteria_raxml-check
+"""
+
+import os
+import sys
+import hashlib
+import argparse
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+from alignment_store import AlignmentMatrix, open_alignment
+from stage_metrics import Stage
+
+# ============================= CONFIG ========================================
+BAC_MSA = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/ssu_align/bacteria_16S_centroids_ssu_align_best.fna")
+BAC_PREFIX = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/raxml/bacteria_raxml-check")
+# ============================================================================
+
+_UNDETERMINED = np.zeros(256, dtype=bool)
+_UNDETERMINED[np.frombuffer(b"-.?NnXxOo", dtype=np.uint8)] = True
+_UPPER = np.arange(256, dtype=np.uint8)
+_UPPER[ord("a"):ord("z") + 1] -= 32
+
+
+class CheckResult:
+    def __init__(self, aln: AlignmentMatrix):
+        self.aln = aln
+        undet = _UNDETERMINED[aln.seqs]
+        n, width = aln.shape
+        self.col_undetermined = undet.mean(axis=0) if n else np.zeros(width)
+        self.row_undetermined = undet.mean(axis=1) if width else np.ones(n)
+        self.empty_columns = self.col_undetermined == 1.0
+        self.empty_rows = self.row_undetermined == 1.0
+        self.duplicate_names = sorted(i for i, c in Counter(aln.ids.tolist()).items() if c > 1)
+
+        # duplicates among the remaining rows: row index -> index of the kept copy
+        self.duplicate_of = {}
+        first = {}
+        for i in np.flatnonzero(~self.empty_rows):
+            d = hashlib.blake2b(_UPPER[aln.seqs[i]].tobytes(), digest_size=16).digest()
+            if d in first:
+                self.duplicate_of[int(i)] = first[d]
+            else:
+                first[d] = int(i)
+
+    @property
+    def keep_rows(self) -> np.ndarray:
+        keep = ~self.empty_rows
+        keep[list(self.duplicate_of)] = False
+        return keep
+
+    @property
+    def reduced(self) -> bool:
+        return bool(self.empty_columns.any() or self.empty_rows.any() or self.duplicate_of)
+
+    def reduced_alignment(self) -> AlignmentMatrix:
+        return self.aln.subset(self.keep_rows).select_columns(~self.empty_columns)
+
+    def log_lines(self, msa: str, phy: str = None) -> list:
+        ids = self.aln.ids.tolist()
+        n, width = self.aln.shape
+        lines = [f"Alignment check (raxml-ng --check equivalent), {datetime.now():%Y-%m-%d %H:%M:%S}", "",
+                 f"Reading alignment from file: {msa}",
+                 f"Loaded alignment with {n} taxa and {width} sites", ""]
+        for i, k in sorted(self.duplicate_of.items()):
+            lines.append(f"WARNING: Sequences {ids[k]} and {ids[i]} are exactly identical!")
+        if self.duplicate_of:
+            lines += [f"WARNING: Duplicate sequences found: {len(self.duplicate_of)}", ""]
+        for i in np.flatnonzero(self.empty_rows):
+            lines.append(f"WARNING: Sequence #{i + 1} ({ids[i]}) contains only gaps!")
+        if self.empty_rows.any():
+            lines += [f"WARNING: Fully undetermined sequences found: {int(self.empty_rows.sum())}", ""]
+        if self.empty_columns.any():
+            lines += [f"WARNING: Fully undetermined columns found: {int(self.empty_columns.sum())}", ""]
+        if width:
+            lines += [f"Undetermined characters per column: mean {self.col_undetermined.mean():.3f}, "
+                      f"columns >= 50%: {int((self.col_undetermined >= 0.5).sum())}", ""]
+        if phy:
+            lines += ["NOTE: Reduced alignment (with duplicates and gap-only sites/taxa removed) ",
+                      f"NOTE: was saved to: {phy}", ""]
+        kept = int(self.keep_rows.sum())
+        lines += [f"Alignment comprises {kept} taxa and {int((~self.empty_columns).sum())} sites", "",
+                  "Alignment can be successfully read by RAxML-NG.", ""]
+        return lines
+
+    def write_table(self, path: str) -> None:
+        ids = self.aln.ids.tolist()
+        with open(path, "w") as out:
+            out.write("sequence\tundetermined_fraction\tstatus\n")
+            for i, rid in enumerate(ids):
+                if self.empty_rows[i]:
+                    status = "undetermined"
+                elif i in self.duplicate_of:
+                    status = f"duplicate_of:{ids[self.duplicate_of[i]]}"
+                else:
+                    status = "kept"
+                out.write(f"{rid}\t{self.row_undetermined[i]:.4f}\t{status}\n")
+
+
+def check_and_write(aln: AlignmentMatrix, prefix: str, msa: str, always_write: bool = False) -> CheckResult:
+    res = CheckResult(aln)
+    if res.duplicate_names:
+        raise SystemExit(f"[ERROR] Duplicate sequence names in {msa}: {', '.join(res.duplicate_names[:10])}")
+    os.makedirs(os.path.dirname(os.path.abspath(prefix)), exist_ok=True)
+
+    phy = None
+    if res.reduced or always_write:
+        phy = prefix + ".raxml.reduced.phy"
+        res.reduced_alignment().write_phylip(phy)
+    with open(prefix + ".raxml.log", "w") as f:
+        f.write("\n".join(res.log_lines(msa, phy)))
+    res.write_table(prefix + ".check.tsv")
+
+    print(f"[OK] {msa}: {len(res.duplicate_of)} duplicates, {int(res.empty_rows.sum())} undetermined sequences, "
+          f"{int(res.empty_columns.sum())} undetermined columns")
+    if phy:
+        print(f"[OK] Wrote: {phy}")
+    else:
+        print("[INFO] Nothing to remove; no reduced alignment written (as raxml-ng --check)")
+    return res
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Alignment sanity check and dedup (replaces raxml-ng --check).")
+    parser.add_argument("--msa", default=BAC_MSA, help="Aligned FASTA.")
+    parser.add_argument("--prefix", default=BAC_PREFIX, help="Output prefix (as raxml-ng --prefix).")
+    parser.add_argument("--always-write", action="store_true",
+                        help="Write <prefix>.raxml.reduced.phy even if nothing was removed.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.msa):
+        print(f"[ERROR] Alignment not found: {args.msa}", file=sys.stderr)
+        raise SystemExit(1)
+    stage = Stage("14_alignment_check")
+    with stage.step("check_alignment"):
+        aln = open_alignment(args.msa)
+        check_and_write(aln, args.prefix, args.msa, args.always_write)
+        stage.track_input(args.msa)
+    print("[DONE] Alignment check finished.")
+
+
+if __name__ == "__main__":
+    main()
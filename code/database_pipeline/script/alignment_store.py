@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+NumPy-backed store for the aligned 16S FASTAs from 11_align_16S.sh.
+
+*_16S_centroids_ssu_align.fna is parsed once into a uint8 matrix (one row
+per sequence, one column per alignment position) plus an ID array, and saved
+next to the FASTA as
+  <stem>.matrix.npy   the N x L matrix (opened with mmap_mode='r')
+  <stem>.ids.npz      sequence IDs + size/mtime of the source FASTA
+so 12/13, the alignment check, 18 and the HMM prep can share one memory map
+instead of re-parsing the text. Renaming, row subsets and column masks are
+array operations; FASTA and relaxed PHYLIP are only written at the end.
+
+Usage:
+  python alignment_store.py convert ../intermediate/ssu_align/bacteria_16S_centroids_ssu_align.fna
+  python alignment_store.py export bacteria_16S_centroids_ssu_align.fna --phylip out.phy --drop-gap-columns
+
+From Python:
+  aln = open_alignment(ALIGNED_FASTA)        # converts on first use, mmap afterwards
+  aln.rename(best_map).write_fasta(out_fa)
+"""
+
+import os
+import argparse
+
+import numpy as np
+
+GAP_CHARS = b"-."
+FASTA_WIDTH = 60  # Bio.SeqIO / AlignIO default
+
+
+class AlignmentMatrix:
+    """ids: 1-D str array (N), seqs: uint8 array (N x L) of ASCII residues."""
+
+    def __init__(self, ids, seqs: np.ndarray):
+        self.ids = np.asarray(ids, dtype=str)
+        self.seqs = seqs
+        if self.seqs.ndim != 2 or len(self.ids) != self.seqs.shape[0]:
+            raise ValueError(f"{len(self.ids)} IDs for a matrix of shape {self.seqs.shape}")
+
+    def __len__(self):
+        return self.seqs.shape[0]
+
+    @property
+    def shape(self):
+        return self.seqs.shape
+
+    # ----------------------------- readers -----------------------------------
+
+    @classmethod
+    def from_records(cls, records, source: str = "alignment"):
+        ids, rows = [], []
+        for rid, seq in records:
+            ids.append(rid)
+            rows.append(seq if isinstance(seq, bytes) else seq.encode())
+        lengths = {len(r) for r in rows}
+        if len(lengths) > 1:
+            raise ValueError(f"{source}: sequences have different lengths {sorted(lengths)[:5]}")
+        width = lengths.pop() if lengths else 0
+        seqs = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), width)
+        return cls(ids, seqs)
+
+    @classmethod
+    def from_fasta(cls, path: str):
+        def records():
+            with open(path, "rb") as f:
+                rid, chunks = None, []
+                for line in f:
+                    if line.startswith(b">"):
+                        if rid is not None:
+                            yield rid, b"".join(chunks)
+                        parts = line[1:].split(None, 1)
+                        rid, chunks = (parts[0].decode() if parts else ""), []
+                    else:
+                        chunks.append(line.strip())
+                if rid is not None:
+                    yield rid, b"".join(chunks)
+        return cls.from_records(records(), path)
+
+    @classmethod
+    def from_phylip(cls, path: str):
+        """Relaxed sequential PHYLIP as written by raxml-ng ("name sequence" per line)."""
+        def records():
+            with open(path, "rb") as f:
+                f.readline()  # "N L"
+                for line in f:
+                    parts = line.strip().split(None, 1)
+                    if len(parts) == 2:
+                        yield parts[0].decode(), parts[1].replace(b" ", b"")
+        return cls.from_records(records(), path)
+
+    # ----------------------------- storage -----------------------------------
+
+    def save(self, stem: str, source: str = None) -> None:
+        st = os.stat(source) if source else None
+        np.save(stem + ".matrix.npy", np.ascontiguousarray(self.seqs))
+        np.savez(stem + ".ids.npz", ids=self.ids,
+                 source_size=st.st_size if st else -1,
+                 source_mtime_ns=st.st_mtime_ns if st else -1)
+
+    @classmethod
+    def load(cls, stem: str, mmap: bool = True):
+        with np.load(stem + ".ids.npz") as z:
+            ids = z["ids"]
+        seqs = np.load(stem + ".matrix.npy", mmap_mode="r" if mmap else None)
+        return cls(ids, seqs)
+
+    # ----------------------------- operations --------------------------------
+
+    def index(self, ids) -> np.ndarray:
+        pos = {rid: i for i, rid in enumerate(self.ids.tolist())}
+        try:
+            return np.fromiter((pos[r] for r in ids), dtype=np.intp)
+        except KeyError as e:
+            raise KeyError(f"ID not in alignment: {e.args[0]}") from None
+
+    def subset(self, rows):
+        """rows: boolean mask, integer indices or a list of IDs."""
+        rows = np.asarray(rows)
+        if rows.dtype.kind in "US":
+            rows = self.index(rows)
+        return AlignmentMatrix(self.ids[rows], self.seqs[rows])
+
+    def select_columns(self, mask):
+        return AlignmentMatrix(self.ids, self.seqs[:, np.asarray(mask)])
+
+    def rename(self, mapping):
+        """mapping: dict (unmapped IDs are kept) or callable old -> new."""
+        fn = mapping if callable(mapping) else (lambda i: mapping.get(i, i))
+        return AlignmentMatrix([fn(i) for i in self.ids.tolist()], self.seqs)
+
+    def gap_mask(self) -> np.ndarray:
+        return np.isin(self.seqs, np.frombuffer(GAP_CHARS, dtype=np.uint8))
+
+    def non_gap_columns(self) -> np.ndarray:
+        """Columns with at least one residue."""
+        return ~self.gap_mask().all(axis=0)
+
+    # ----------------------------- writers -----------------------------------
+
+    def iter_records(self):
+        for rid, row in zip(self.ids.tolist(), self.seqs):
+            yield rid, row.tobytes().decode()
+
+    def write_fasta(self, path: str, width: int = FASTA_WIDTH) -> None:
+        with open(path, "w") as out:
+            for rid, seq in self.iter_records():
+                out.write(f">{rid}\n")
+                for i in range(0, len(seq), width):
+                    out.write(seq[i:i + width] + "\n")
+
+    def write_phylip(self, path: str) -> None:
+        """Relaxed PHYLIP, one "name sequence" line per row (raxml-ng layout)."""
+        n, width = self.shape
+        pad = max((len(i) for i in self.ids.tolist()), default=0) + 1
+        with open(path, "w") as out:
+            out.write(f"{n} {width}\n")
+            for rid, seq in self.iter_records():
+                out.write(f"{rid:<{pad}}{seq}\n")
+
+
+def store_stem(fasta_path: str) -> str:
+    return os.path.splitext(fasta_path)[0]
+
+
+def open_alignment(fasta_path: str, cache: bool = True) -> AlignmentMatrix:
+    """Load the matrix store for an aligned FASTA, (re)building it when the FASTA changed."""
+    stem = store_stem(fasta_path)
+    if cache and os.path.exists(stem + ".matrix.npy") and os.path.exists(stem + ".ids.npz"):
+        st = os.stat(fasta_path)
+        with np.load(stem + ".ids.npz") as z:
+            fresh = (int(z["source_size"]) == st.st_size and
+                     int(z["source_mtime_ns"]) == st.st_mtime_ns)
+        if fresh:
+            return AlignmentMatrix.load(stem)
+    aln = AlignmentMatrix.from_fasta(fasta_path)
+    if cache:
+        aln.save(stem, source=fasta_path)
+    return aln
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert aligned FASTA to a NumPy matrix store and export subsets.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    c = sub.add_parser("convert", help="Build <stem>.matrix.npy / <stem>.ids.npz next to each FASTA.")
+    c.add_argument("fasta", nargs="+")
+
+    e = sub.add_parser("export", help="Write (part of) an alignment as FASTA and/or PHYLIP.")
+    e.add_argument("fasta", help="Aligned FASTA (its store is built if missing).")
+    e.add_argument("--ids", help="File with one ID per line to keep (in that order).")
+    e.add_argument("--rename", help="Two-column TSV old_id<TAB>new_id.")
+    e.add_argument("--drop-gap-columns", action="store_true", help="Remove all-gap columns.")
+    e.add_argument("--fasta-out")
+    e.add_argument("--phylip")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.cmd == "convert":
+        for path in args.fasta:
+            aln = open_alignment(path)
+            print(f"[OK] {path}: {aln.shape[0]} sequences x {aln.shape[1]} columns -> {store_stem(path)}.matrix.npy")
+        return
+
+    aln = open_alignment(args.fasta)
+    if args.ids:
+        with open(args.ids) as f:
+            aln = aln.subset([line.strip() for line in f if line.strip()])
+    if args.rename:
+        with open(args.rename) as f:
+            aln = aln.rename(dict(line.rstrip("\n").split("\t")[:2] for line in f if "\t" in line))
+    if args.drop_gap_columns:
+        aln = aln.select_columns(aln.non_gap_columns())
+    if args.fasta_out:
+        aln.write_fasta(args.fasta_out)
+        print(f"[OK] Wrote FASTA: {args.fasta_out}  (seqs: {len(aln)})")
+    if args.phylip:
+        aln.write_phylip(args.phylip)
+        print(f"[OK] Wrote PHYLIP: {args.phylip}  (seqs: {len(aln)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Synthetic-data benchmark for the Python stages of the MAG -> PICRUSt2
+database pipeline.
+
+For every requested size the script builds a throw-away copy of the pipeline
+tree in --workdir (HOME is pointed there, so the stages' hard-coded
+~/Thesis/... paths resolve into the sandbox), fills it with synthetic inputs
+that stand in for the external tools, runs each stage as a subprocess and
+records wall time, CPU time, peak RSS and throughput.
+
+Synthetic inputs (per size):
+  - gzipped genomes + id_map.tsv           (01 formatting)
+  - GTDB-Tk bac120/ar53 summaries           (02 GTDB-Tk)
+  - CheckM minimal table                    (04 CheckM)
+  - Barrnap GFFs + per-genome 16S FASTAs    (06 Barrnap / 07_a bedtools)
+  - clustered 16S per genome                (08 vsearch)
+  - vsearch .uc clusters                    (10 vsearch)
+  - aligned centroid FASTA                  (11 cmalign)
+  - reduced relaxed PHYLIP                  (14 raxml-ng --check)
+  - RAxML-NG --evaluate log                 (17 raxml-ng)
+  - reference FASTA + copy table            (21 / 07_b)
+  - eggNOG annotation files                 (23 eggnog-mapper)
+
+Stages timed: 03, 05, 07_b, 09, 12, 13, 18, 20, 22, 24.
+
+Usage:
+  python benchmark_pipeline.py --sizes 1000 10000 100000 \
+      --workdir /scratch/$USER/m2i_bench --out bench_results.tsv
+  python benchmark_pipeline.py --sizes 1000 --stages 22 24 --keep
+"""
+
+import os
+import sys
+import time
+import gzip
+import shutil
+import random
+import argparse
+import subprocess
+
+from eggnog_format import emapper_header, emapper_row
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# stage key -> (script, extra argv relative to the sandbox intermediate dir)
+STAGES = {
+    "03":   ("03_domain_classification.py", []),
+    "05":   ("05_quality_filtering.py", []),
+    "07_b": ("07_b_count_copies_per_genome.py", []),
+    "09":   ("09_single_16S_per_genome.py", []),
+    "12":   ("12_choose_best_genome_arc.py", []),
+    "13":   ("13_choose_best_genome_bac.py", []),
+    "18":   ("18_convert_pylip_to_fasta.py", []),
+    "20":   ("20_raxml_info_files.py", []),
+    "22":   ("22_filter_16S_copies_bac.py", []),
+    "24":   ("24_build_kotable.py", ["--bac-dir", "{I}/eggnog_out", "--bac-out", "{I}/ko/ko.txt.gz"]),
+}
+
+ARCHAEA_FRACTION = 0.1
+ALN_WIDTH = 1600
+PHYLA_BAC = ["Bacillota", "Pseudomonadota", "Bacteroidota", "Actinomycetota", "Chloroflexota"]
+PHYLA_ARC = ["Halobacteriota", "Methanobacteriota", "Thermoproteota"]
+
+
+# ============================= SYNTHETIC DATA =================================
+
+class Synth:
+    """Deterministic generator of pipeline inputs for n genomes."""
+
+    def __init__(self, n: int, seed: int, genome_len: int, contigs: int, genes: int, kos: int):
+        self.n = n
+        self.rng = random.Random(seed)
+        self.genome_len = genome_len
+        self.contigs = contigs
+        self.genes = genes
+        self.kos = [f"K{k:05d}" for k in self.rng.sample(range(1, 26000), kos)]
+        self.width = max(4, len(str(n)))
+        self.ids = [f"MAG{i:0{self.width}d}" for i in range(1, n + 1)]
+        self.domain = {g: ("archaea" if self.rng.random() < ARCHAEA_FRACTION else "bacteria")
+                       for g in self.ids}
+        # one large random pool; genomes and 16S genes are slices of it
+        self.pool = "".join(self.rng.choices("ACGT", k=1 << 20))
+        # 16S "types": genomes sharing a type are exact duplicates after picking
+        n_types = max(1, int(n * 0.7))
+        self.type_seq = [self._slice(self.rng.randint(1400, 1550)) for _ in range(n_types)]
+        self.copies, self.gtype = {}, {}
+        for g in self.ids:
+            r = self.rng.random()
+            self.copies[g] = 0 if r < 0.05 else (1 if r < 0.55 else self.rng.randint(2, 7))
+            self.gtype[g] = self.rng.randrange(n_types)
+
+    def _slice(self, length: int) -> str:
+        start = self.rng.randrange(0, len(self.pool) - length)
+        return self.pool[start:start + length]
+
+    def genome_fasta(self, gid: str) -> str:
+        step = self.genome_len // self.contigs
+        return "".join(f">{gid}_contig{c}\n{self._slice(step)}\n" for c in range(1, self.contigs + 1))
+
+    def copies_16S(self, gid: str) -> list:
+        base = self.type_seq[self.gtype[gid]]
+        # copy 1 is the full-length type sequence, others are truncated variants
+        return [base] + [base[:self.rng.randint(1200, len(base))] for _ in range(self.copies[gid] - 1)]
+
+    def aligned(self, seq: str) -> str:
+        s = list(seq[:ALN_WIDTH].ljust(ALN_WIDTH, "-"))
+        for _ in range(20):
+            s[self.rng.randrange(ALN_WIDTH)] = "-"
+        return "".join(s)
+
+    # ---------------------------------------------------------------
+    def write_all(self, P: str, genomes_pre_split: bool) -> None:
+        I = os.path.join(P, "intermediate")
+        self._formatted(I, genomes_pre_split)
+        self._gtdbtk(I)
+        self._checkm(I)
+        self._barrnap_and_16S(I)
+        self._clusters_alignment(I)
+        self._raxml(I)
+        self._eggnog(I)
+
+    def _formatted(self, I, pre_split):
+        fmt = os.path.join(I, "MAGs_formatted")
+        os.makedirs(fmt, exist_ok=True)
+        with open(os.path.join(fmt, "id_map.tsv"), "w") as f:
+            f.write("original_filename\tnew_id\n")
+            for i, g in enumerate(self.ids, 1):
+                f.write(f"bin_{i}.fa\t{g}\n")
+        for g in self.ids:
+            d = os.path.join(fmt, "genomes_to_search_barrnap", self.domain[g]) if pre_split else fmt
+            os.makedirs(d, exist_ok=True)
+            with gzip.open(os.path.join(d, f"{g}_genomic.fna.gz"), "wt", compresslevel=1) as out:
+                out.write(self.genome_fasta(g))
+
+    def _gtdbtk(self, I):
+        d = os.path.join(I, "GTDB-Tk")
+        os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, "gtdbtk.bac120.summary.tsv"), "w") as fb, \
+             open(os.path.join(d, "gtdbtk.ar53.summary.tsv"), "w") as fa:
+            for f in (fb, fa):
+                f.write("user_genome\tclassification\tfastani_reference\n")
+            for i, g in enumerate(self.ids, 1):
+                if self.domain[g] == "bacteria":
+                    ph = self.rng.choice(PHYLA_BAC)
+                    fb.write(f"bin_{i}\td__Bacteria;p__{ph};c__C{i % 50};o__O{i % 90};"
+                             f"f__F{i % 200};g__G{i % 700};s__G{i % 700} sp{i}\tN/A\n")
+                else:
+                    ph = self.rng.choice(PHYLA_ARC)
+                    fa.write(f"bin_{i}\td__Archaea;p__{ph};c__C{i % 10};o__O{i % 20};"
+                             f"f__F{i % 40};g__G{i % 80};s__G{i % 80} sp{i}\tN/A\n")
+
+    def _checkm(self, I):
+        d = os.path.join(I, "CheckM", "merged")
+        os.makedirs(d, exist_ok=True)
+        qc = os.path.join(I, "qc")
+        os.makedirs(qc, exist_ok=True)
+        rows = [(f"{g}_genomic", round(self.rng.uniform(50, 100), 2), round(self.rng.uniform(0, 20), 2))
+                for g in self.ids]
+        with open(os.path.join(d, "checkm_results.min.tsv"), "w") as f:
+            f.write("genome_id\tcheckm_completeness\tcheckm_contamination\n")
+            for r in rows:
+                f.write("%s\t%s\t%s\n" % r)
+        # stand-in for 05's output so 12/13 can be benchmarked on their own
+        with open(os.path.join(qc, "checkm_filtered.tsv"), "w") as f:
+            f.write("genome_id\tcheckm_completeness\tcheckm_contamination\tmarker_lineage\tdomain\n")
+            for (gid, cpl, cnt), g in zip(rows, self.ids):
+                f.write(f"{gid}\t{cpl}\t{cnt}\t\t{self.domain[g].capitalize()}\n")
+
+    def _barrnap_and_16S(self, I):
+        cc = os.path.join(I, "count_copies_per_genome")
+        for dom in ("bacteria", "archaea"):
+            os.makedirs(os.path.join(I, "barrnap", dom), exist_ok=True)
+            for sub in (dom, f"{dom}_16S_single", f"{dom}_16S_multiple", f"{dom}_16S_clustered"):
+                os.makedirs(os.path.join(cc, sub), exist_ok=True)
+        counts = {"bacteria": [], "archaea": []}
+        for g in self.ids:
+            dom = self.domain[g]
+            seqs = self.copies_16S(g)
+            counts[dom].append((g, len(seqs)))
+            with open(os.path.join(I, "barrnap", dom, f"{g}.gff"), "w") as f:
+                f.write("##gff-version 3\n")
+                for k, s in enumerate(seqs):
+                    start = 1000 + k * 3000
+                    f.write(f"{g}_contig1\tbarrnap:0.9\trRNA\t{start}\t{start + len(s) - 1}\t0\t+\t.\t"
+                            f"Name=16S_rRNA;product=16S ribosomal RNA\n")
+            if not seqs:
+                continue
+            fa = "".join(f">16S_rRNA::{g}_contig1:{k}(+)\n{s}\n" for k, s in enumerate(seqs))
+            with open(os.path.join(cc, dom, f"{g}_16S.fna"), "w") as f:
+                f.write(fa)
+            # stand-ins for 07_b (single/multiple) and 08 (vsearch centroids)
+            kind = "single" if len(seqs) == 1 else "multiple"
+            with open(os.path.join(cc, f"{dom}_16S_{kind}", f"{g}.fna"), "w") as f:
+                f.write(fa)
+            with open(os.path.join(cc, f"{dom}_16S_clustered", f"{g}.fna"), "w") as f:
+                f.write(fa if len(seqs) == 1 else
+                        "".join(f">16S_rRNA::{g}_contig1:{k}(+)\n{s}\n" for k, s in enumerate(seqs[:2])))
+        for dom, rows in counts.items():
+            with open(os.path.join(cc, f"{dom}_16S_copies.txt"), "w") as f:
+                for g, n in rows:
+                    f.write(f"{g}\t{n}\n")
+
+    def _clusters_alignment(self, I):
+        cc = os.path.join(I, "count_copies_per_genome")
+        aln = os.path.join(I, "ssu_align")
+        ref = os.path.join(I, "gtdb_r220_picrust_ref", "bac_ref")
+        rax = os.path.join(I, "raxml")
+        for d in (aln, ref, rax):
+            os.makedirs(d, exist_ok=True)
+        self.centroids = {}
+        for dom in ("bacteria", "archaea"):
+            groups = {}
+            for g in self.ids:
+                if self.domain[g] == dom and self.copies[g] > 0:
+                    groups.setdefault(self.gtype[g], []).append(g)
+            cents = []
+            with open(os.path.join(cc, f"{dom}_16S_clusters.uc"), "w") as uc:
+                for ci, (t, members) in enumerate(groups.items()):
+                    c, L = members[0], len(self.type_seq[t])
+                    cents.append((c, t))
+                    uc.write(f"S\t{ci}\t{L}\t*\t*\t*\t*\t*\t{c}\t*\n")
+                    for m in members[1:]:
+                        uc.write(f"H\t{ci}\t{L}\t100.0\t+\t0\t0\t=\t{m}\t{c}\n")
+                for ci, (t, members) in enumerate(groups.items()):
+                    uc.write(f"C\t{ci}\t{len(members)}\t*\t*\t*\t*\t*\t{members[0]}\t*\n")
+            with open(os.path.join(aln, f"{dom}_16S_centroids_ssu_align.fna"), "w") as f:
+                for c, t in cents:
+                    f.write(f">{c}\n{self.aligned(self.type_seq[t])}\n")
+            self.centroids[dom] = cents
+        bac = self.centroids["bacteria"]
+        with open(os.path.join(rax, "bacteria_raxml-check.raxml.reduced.phy"), "w") as f:
+            f.write(f"{len(bac)} {ALN_WIDTH}\n")
+            for c, t in bac:
+                f.write(f"{c} {self.aligned(self.type_seq[t])}\n")
+        with open(os.path.join(ref, "bac_ref.fna"), "w") as f:
+            for c, t in bac:
+                f.write(f">{c}\n{self.aligned(self.type_seq[t])}\n")
+
+    def _raxml(self, I):
+        n_tips = len(self.centroids["bacteria"])
+        with open(os.path.join(I, "raxml", "bacteria_raxml.raxml.log"), "w") as f:
+            f.write("RAxML-NG v. 1.2.0 released on 09.05.2023\n\n")
+            f.write("RAxML-NG was called at 01-Jan-2025 00:00:00 as follows:\n\n")
+            f.write("raxml-ng --evaluate --msa bacteria_raxml-check.raxml.reduced.phy "
+                    "--tree bacteria_16S_iqtree.treefile --model GTR+G --prefix bacteria_raxml\n\n")
+            f.write(f"Alignment comprises 1 partitions and {ALN_WIDTH - 37} patterns\n\n")
+            for k in range(max(1, n_tips // 100)):
+                f.write(f"[00:00:{k % 60:02d}] Model parameter optimization (eps = 0.1), round {k}\n")
+            f.write("Base frequencies (ML): 0.241626 0.217110 0.322555 0.218709\n")
+            f.write("Substitution rates (ML): 1.012 2.734 1.380 0.911 4.120 1.000\n\n")
+            f.write(f"Final LogLikelihood: -{n_tips * 37.5:.6f}\n\n")
+            f.write("Elapsed time: 123.456 seconds\n")
+
+    def _eggnog(self, I):
+        d = os.path.join(I, "eggnog_out")
+        os.makedirs(d, exist_ok=True)
+        header = "## emapper-2.1.12\n## command: emapper.py -m diamond\n" + emapper_header()
+        for g in self.ids:
+            lines = [header]
+            for k in range(self.genes):
+                r = self.rng.random()
+                if r < 0.35:
+                    ko = "-"
+                elif r < 0.9:
+                    ko = "ko:" + self.rng.choice(self.kos)
+                else:
+                    ko = "ko:" + self.rng.choice(self.kos) + ",ko:" + self.rng.choice(self.kos)
+                lines.append(emapper_row({
+                    "query": f"{g}_{k}", "seed_ortholog": f"1234.SAMN0{k}", "evalue": "1e-50",
+                    "score": "200.0", "eggNOG_OGs": "COG0001@1|root", "max_annot_lvl": "Bacteria",
+                    "COG_category": "E", "Description": "synthetic protein", "EC": "2.7.1.1",
+                    "KEGG_ko": ko, "KEGG_Pathway": "map00010", "KEGG_Module": "M00001",
+                    "BRITE": "ko00000", "PFAMs": "PF00001"}))
+            with open(os.path.join(d, f"{g}.emapper.annotations"), "w") as f:
+                f.writelines(lines)
+
+
+# ============================= RUNNER =========================================
+
+def make_sandbox(workdir: str, n: int) -> tuple:
+    home = os.path.join(workdir, f"n{n}")
+    if os.path.exists(home):
+        shutil.rmtree(home)
+    P = os.path.join(home, "Thesis", "code", "database_pipeline")
+    shutil.copytree(SCRIPT_DIR, os.path.join(P, "script"),
+                    ignore=shutil.ignore_patterns("*.sh", "__pycache__"))
+    return home, P
+
+
+def run_stage(key: str, home: str, P: str, timeout: float) -> dict:
+    script, extra = STAGES[key]
+    I = os.path.join(P, "intermediate")
+    argv = [sys.executable, os.path.join(P, "script", script)] + [a.format(I=I) for a in extra]
+    env = dict(os.environ, HOME=home, M2I_METRICS_DIR=os.path.join(home, "metrics"))
+    log_path = os.path.join(home, "logs", f"{key}.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+    t0 = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(argv, cwd=P, env=env, stdout=log, stderr=subprocess.STDOUT)
+        status = "ok"
+        deadline = t0 + timeout if timeout else None
+        while True:
+            pid, code, ru = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                break
+            if deadline and time.perf_counter() > deadline:
+                proc.kill()
+                pid, code, ru = os.wait4(proc.pid, 0)
+                status = "timeout"
+                break
+            time.sleep(0.01)
+    wall = time.perf_counter() - t0
+    rc = os.waitstatus_to_exitcode(code)
+    proc.returncode = rc  # already reaped by wait4
+    if status == "ok" and rc != 0:
+        status = f"exit_{rc}"
+    rss_mb = ru.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else ru.ru_maxrss / 1024
+    return {"status": status, "wall_s": wall, "cpu_s": ru.ru_utime + ru.ru_stime,
+            "peak_rss_mb": rss_mb, "log": log_path}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline's Python stages on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Numbers of genomes to benchmark (default: 1000 10000 100000).")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES),
+                        help="Stages to time (default: all).")
+    parser.add_argument("--workdir", default=os.path.join(os.getcwd(), "m2i_bench"),
+                        help="Scratch directory for the synthetic trees.")
+    parser.add_argument("--out", default="bench_results.tsv", help="Results TSV (appended).")
+    parser.add_argument("--genome-length", type=int, default=20000, help="Bases per synthetic genome.")
+    parser.add_argument("--contigs", type=int, default=5, help="Contigs per synthetic genome.")
+    parser.add_argument("--genes", type=int, default=100, help="eggNOG rows per genome.")
+    parser.add_argument("--kos", type=int, default=5000, help="Size of the KO universe.")
+    parser.add_argument("--timeout", type=float, default=0, help="Per-stage timeout in seconds (0 = none).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic trees after the run.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.workdir, exist_ok=True)
+    new_file = not os.path.exists(args.out)
+    with open(args.out, "a") as out:
+        if new_file:
+            out.write("n_genomes\tstage\tstatus\twall_s\tcpu_s\tpeak_rss_mb\tgenomes_per_s\n")
+        for n in args.sizes:
+            home, P = make_sandbox(args.workdir, n)
+            t0 = time.perf_counter()
+            Synth(n, args.seed, args.genome_length, args.contigs, args.genes, args.kos) \
+                .write_all(P, genomes_pre_split="03" not in args.stages)
+            print(f"[INFO] n={n}: synthetic inputs written in {time.perf_counter() - t0:.1f}s -> {P}")
+
+            for key in args.stages:
+                r = run_stage(key, home, P, args.timeout)
+                rate = n / r["wall_s"] if r["wall_s"] > 0 else float("inf")
+                out.write(f"{n}\t{key}\t{r['status']}\t{r['wall_s']:.3f}\t{r['cpu_s']:.3f}\t"
+                          f"{r['peak_rss_mb']:.1f}\t{rate:.1f}\n")
+                out.flush()
+                tag = "[OK]" if r["status"] == "ok" else "[WARN]"
+                print(f"{tag} n={n} stage={key:<5} {r['status']:<8} wall={r['wall_s']:.2f}s "
+                      f"rss={r['peak_rss_mb']:.0f}MB  ({rate:.0f} genomes/s)  log: {r['log']}")
+
+            if not args.keep:
+                shutil.rmtree(home, ignore_errors=True)
+    print(f"[DONE] Results appended to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
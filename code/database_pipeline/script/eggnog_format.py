@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Column layout of eggNOG-mapper 2.x *.emapper.annotations files.
+
+Shared by the offline stub in 23_batch_annotation.py and the synthetic
+annotations of benchmark_pipeline.py, so both write the layout that
+parse_eggnog_dir() in 24_build_kotable.py reads (header line starting with
+'#', columns looked up by name).
+"""
+
+EMAPPER_COLUMNS = ["query", "seed_ortholog", "evalue", "score", "eggNOG_OGs", "max_annot_lvl",
+                   "COG_category", "Description", "Preferred_name", "GOs", "EC", "KEGG_ko",
+                   "KEGG_Pathway", "KEGG_Module", "KEGG_Reaction", "KEGG_rclass", "BRITE",
+                   "KEGG_TC", "CAZy", "BiGG_Reaction", "PFAMs"]
+
+
+def emapper_header() -> str:
+    return "#" + "\t".join(EMAPPER_COLUMNS) + "\n"
+
+
+def emapper_row(fields: dict) -> str:
+    """One annotation line; columns not in `fields` are '-' as in emapper output."""
+    unknown = set(fields) - set(EMAPPER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Not emapper columns: {sorted(unknown)}")
+    return "\t".join(str(fields.get(c, "-")) for c in EMAPPER_COLUMNS) + "\n"
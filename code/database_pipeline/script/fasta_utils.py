@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Small, dependency-free FASTA helpers shared by the pipeline scripts.
+
+These avoid building Biopython SeqRecords when a step only needs IDs or raw
+sequences (e.g. alignment-width reference FASTAs in step 22).
+"""
+
+from gzip_io import gz_open
+
+BLOCK_SIZE = 8 * 1024 * 1024  # 8 MiB binary reads
+
+
+def _open_binary(path: str):
+    return gz_open(path, 'rb')
+
+
+def iter_fasta_ids(path: str, block_size: int = BLOCK_SIZE):
+    """
+    Yield the ID (header up to the first whitespace, like Bio.SeqIO's rec.id)
+    of every record in a FASTA file.
+
+    The file is read in large binary blocks and only '>' lines are looked at;
+    sequence lines are skipped with bytes.find, so no sequence data is decoded.
+    """
+    with _open_binary(path) as f:
+        buf = b'\n'  # sentinel so a '>' on the very first line is matched
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            buf += block
+            pos = 0
+            keep_from = None
+            while True:
+                i = buf.find(b'\n>', pos)
+                if i < 0:
+                    break
+                j = buf.find(b'\n', i + 2)
+                if j < 0:
+                    keep_from = i  # header continues in the next block
+                    break
+                yield _header_id(buf[i + 2:j])
+                pos = j
+            buf = buf[keep_from:] if keep_from is not None else buf[-1:]
+
+        # last header without a trailing newline
+        i = buf.find(b'\n>')
+        if i >= 0:
+            yield _header_id(buf[i + 2:])
+
+
+def _header_id(header: bytes) -> str:
+    parts = header.split(None, 1)
+    return parts[0].decode() if parts else ''
+
+
+def read_fasta_ids(path: str) -> set:
+    return set(iter_fasta_ids(path))
+
+
+def iter_fasta(path: str):
+    """Yield (id, sequence) pairs; a minimal text parser for small FASTA files."""
+    with gz_open(path, 'rt') as f:
+        rid, chunks = None, []
+        for line in f:
+            if line.startswith('>'):
+                if rid is not None:
+                    yield rid, ''.join(chunks)
+                parts = line[1:].split(None, 1)
+                rid, chunks = (parts[0] if parts else ''), []
+            else:
+                chunks.append(line.strip())
+        if rid is not None:
+            yield rid, ''.join(chunks)
+
+
+def format_fasta(rid: str, seq: str, width: int = 60) -> str:
+    """One FASTA record wrapped like Bio.SeqIO.write (60 columns)."""
+    lines = [f'>{rid}']
+    lines += [seq[i:i + width] for i in range(0, len(seq), width)] if width else [seq]
+    return '\n'.join(lines) + '\n'
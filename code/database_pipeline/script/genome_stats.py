@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Basic assembly statistics for the formatted MAGs, one streaming read per genome.
+
+For every MAGxxxx_genomic.fna.gz the file is decompressed in 8 MiB blocks;
+sequence bytes are upper-cased and stripped of line breaks with one
+bytes.translate per block and counted with bytes.count, so no Python loop
+ever touches single bases. Genomes are processed in a process pool.
+
+genome_stats.tsv (one row per genome):
+  genome, contigs, length, n50, largest_contig, gc (% of A/C/G/T), n_bases,
+  file_size, file_mtime_ns
+
+Rows whose file_size/file_mtime_ns still match the genome file are reused, so
+re-running after adding genomes only reads the new ones.
+
+Usage:
+  python genome_stats.py                       # all genomes under GENOME_DIR
+  python genome_stats.py --genome-dir DIR --out DIR/genome_stats.tsv --jobs 16
+
+From Python:
+  stats = load_stats(path)   # DataFrame indexed by genome (used by 12/13 to break ties)
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from gzip_io import gz_open
+from stage_metrics import Stage
+
+# ============================= CONFIG ========================================
+GENOME_DIR = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/MAGs_formatted")
+BLOCK_SIZE = 8 * 1024 * 1024
+SUFFIXES = ("_genomic.fna.gz", "_genomic.fna", ".fna.gz", ".fa.gz", ".fasta.gz", ".fna", ".fa", ".fasta")
+COLUMNS = ["genome", "contigs", "length", "n50", "largest_contig", "gc", "n_bases", "file_size", "file_mtime_ns"]
+# ============================================================================
+
+# upper-case table; line breaks and blanks are deleted in the same translate call
+_UPPER = bytes.maketrans(b"acgtn", b"ACGTN")
+_STRIP = b"\n\r \t"
+
+
+def genome_id(filename: str) -> str:
+    for suf in SUFFIXES:
+        if filename.endswith(suf):
+            return filename[:-len(suf)]
+    return filename
+
+
+def find_genomes(genome_dir: str) -> dict:
+    """genome -> path, searching genome_dir and its sub-directories (e.g. genomes_to_search_barrnap/*)."""
+    found = {}
+    for dirpath, _, files in sorted(os.walk(genome_dir)):
+        for fn in sorted(files):
+            if fn.endswith(SUFFIXES):
+                found.setdefault(genome_id(fn), os.path.join(dirpath, fn))
+    return found
+
+
+def n50(lengths: list) -> int:
+    total, acc = sum(lengths), 0
+    for n in sorted(lengths, reverse=True):
+        acc += n
+        if 2 * acc >= total:
+            return n
+    return 0
+
+
+def scan_fasta(path: str, block_size: int = BLOCK_SIZE) -> dict:
+    """Contig lengths and base counts from one pass over a (gzipped) FASTA."""
+    lengths = []
+    cur = None            # length of the contig being read (None before the first header)
+    counts = dict.fromkeys(b"ACGTN", 0)
+
+    def add(seg: bytes):
+        nonlocal cur
+        seq = seg.translate(_UPPER, _STRIP)
+        if not seq:
+            return
+        cur = (cur or 0) + len(seq)
+        for base in counts:
+            counts[base] += seq.count(bytes((base,)))
+
+    with gz_open(path, "rb") as f:
+        carry = b""
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            buf, carry, pos = carry + block, b"", 0
+            while True:
+                h = buf.find(b">", pos)
+                add(buf[pos:h] if h >= 0 else buf[pos:])
+                if h < 0:
+                    break
+                e = buf.find(b"\n", h)
+                if e < 0:
+                    carry = buf[h:]       # header continues in the next block
+                    break
+                if cur is not None:
+                    lengths.append(cur)
+                cur, pos = 0, e + 1
+        if carry:                 # last header without a newline: an empty record
+            if cur is not None:
+                lengths.append(cur)
+            cur = 0
+    if cur is not None:
+        lengths.append(cur)
+
+    acgt = sum(counts[b] for b in b"ACGT")
+    return {
+        "contigs": len(lengths),
+        "length": sum(lengths),
+        "n50": n50(lengths),
+        "largest_contig": max(lengths, default=0),
+        "gc": round(100.0 * (counts[ord("G")] + counts[ord("C")]) / acgt, 4) if acgt else 0.0,
+        "n_bases": counts[ord("N")],
+    }
+
+
+def _stats_one(item):
+    genome, path = item
+    st = os.stat(path)
+    return {"genome": genome, **scan_fasta(path), "file_size": st.st_size, "file_mtime_ns": st.st_mtime_ns}
+
+
+def read_stats(path: str) -> dict:
+    """genome -> row (strings) from an existing genome_stats.tsv."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        if header != COLUMNS:
+            return {}
+        return {parts[0]: dict(zip(header, parts)) for parts in (line.rstrip("\n").split("\t") for line in f) if parts[0]}
+
+
+def collect_stats(genomes: dict, out_path: str, jobs: int = 1, stage: Stage = None) -> tuple:
+    """Reuse cached rows for unchanged files, scan the rest; returns (rows, n_scanned)."""
+    cached = read_stats(out_path)
+    rows, todo = {}, []
+    for genome, path in genomes.items():
+        st = os.stat(path)
+        old = cached.get(genome)
+        if old and old["file_size"] == str(st.st_size) and old["file_mtime_ns"] == str(st.st_mtime_ns):
+            rows[genome] = old
+        else:
+            todo.append((genome, path))
+
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            results = list(ex.map(_stats_one, todo, chunksize=max(1, len(todo) // (4 * jobs))))
+    else:
+        results = [_stats_one(item) for item in todo]
+    for row in results:
+        rows[row["genome"]] = row
+    if stage is not None:
+        stage.track_input(*(p for _, p in todo))
+    return [rows[g] for g in sorted(rows)], len(todo)
+
+
+def write_stats(rows: list, out_path: str, stage: Stage = None) -> None:
+    tmp = out_path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write("\t".join(COLUMNS) + "\n")
+        for r in rows:
+            f.write("\t".join(str(r[c]) for c in COLUMNS) + "\n")
+    os.replace(tmp, out_path)
+    if stage is not None:
+        stage.track_output(out_path)
+
+
+def load_stats(path: str) -> pd.DataFrame:
+    """genome_stats.tsv as a DataFrame indexed by genome."""
+    return pd.read_csv(path, sep="\t", index_col="genome", dtype={"genome": str})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Length, N50, GC and contig counts for every genome.")
+    parser.add_argument("--genome-dir", default=GENOME_DIR, help="Directory with *_genomic.fna.gz (searched recursively).")
+    parser.add_argument("--out", help="Output TSV (default: <genome-dir>/genome_stats.tsv).")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 4, help="Genomes read in parallel.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.genome_dir):
+        print(f"[ERROR] Genome directory not found: {args.genome_dir}", file=sys.stderr)
+        raise SystemExit(1)
+    out_path = args.out or os.path.join(args.genome_dir, "genome_stats.tsv")
+
+    genomes = find_genomes(args.genome_dir)
+    if not genomes:
+        print(f"[ERROR] No genome FASTA files under {args.genome_dir}", file=sys.stderr)
+        raise SystemExit(1)
+
+    # created here, not at import: 12/13 import load_stats and must not write genome_stats metrics
+    stage = Stage("genome_stats")
+    with stage.step("scan_genomes"):
+        rows, scanned = collect_stats(genomes, out_path, max(1, args.jobs), stage)
+    with stage.step("write_stats"):
+        write_stats(rows, out_path, stage)
+    print(f"[INFO] {scanned} genomes scanned, {len(rows) - scanned} reused from {out_path}")
+    print(f"[OK] Stats for {len(rows)} genomes -> {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped 2-bit genome store for the formatted MAGs.
+
+Stages 01, 03, 05, 06, 07_a and 23 each gunzip whole MAGxxxx_genomic.fna.gz
+files, even when only a 1.5 kb 16S locus is needed. This module packs every
+genome once into a single file (4 bases per byte) plus a small contig index,
+so later steps can slice any region straight from a memory map.
+
+Layout of a store directory:
+  seq.2bit      packed bases, A=0 C=1 G=2 T=3, each contig starts on a byte
+  contigs.tsv   genome, contig, byte offset, length, FASTA header
+  nmask.tsv     genome, contig, start, length of every N run (any base that
+                is not A/C/G/T is stored as N; soft-masking case is dropped)
+
+Usage:
+  python genome_store.py build [--genome-dir DIR] [--store DIR]
+  python genome_store.py fetch MAG0001 MAG0001_contig3 1000 2500 [-]
+  python genome_store.py getfasta MAG0001 regions.bed > out.fna   # like bedtools getfasta -s -name
+  python genome_store.py export MAG0001 > MAG0001.fna
+
+From Python:
+  store = GenomeStore(STORE_DIR)
+  seq = store.fetch("MAG0001", "MAG0001_contig3", 1000, 2500, "-")
+  for header, seq in store.iter_genome("MAG0001"): ...
+"""
+
+import os
+import sys
+import gzip
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+from stage_metrics import Stage
+
+# ============================= CONFIG ========================================
+GENOME_DIR = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/MAGs_formatted")
+STORE_DIR = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/genome_store")
+SUFFIXES = ("_genomic.fna.gz", "_genomic.fna")
+# ============================================================================
+
+_ENCODE = np.zeros(256, dtype=np.uint8)          # everything else -> 0 (+ N mask)
+_VALID = np.zeros(256, dtype=bool)
+for _i, _b in enumerate(b"ACGT"):
+    _ENCODE[_b] = _ENCODE[_b + 32] = _i          # upper and lower case
+    _VALID[_b] = _VALID[_b + 32] = True
+_DECODE = np.frombuffer(b"ACGT", dtype=np.uint8)
+_COMPLEMENT = bytes.maketrans(b"ACGTN", b"TGCAN")
+
+
+def pack(seq: bytes):
+    """-> (packed uint8 array, [(start, length), ...] runs of non-ACGT)"""
+    raw = np.frombuffer(seq, dtype=np.uint8)
+    codes = _ENCODE[raw]
+    pad = (-len(codes)) % 4
+    if pad:
+        codes = np.concatenate([codes, np.zeros(pad, dtype=np.uint8)])
+    q = codes.reshape(-1, 4)
+    packed = (q[:, 0] << 6) | (q[:, 1] << 4) | (q[:, 2] << 2) | q[:, 3]
+
+    invalid = ~_VALID[raw]
+    runs = []
+    if invalid.any():
+        edges = np.diff(np.concatenate([[0], invalid.view(np.int8), [0]]))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        runs = list(zip(starts.tolist(), (ends - starts).tolist()))
+    return packed.astype(np.uint8), runs
+
+
+def unpack(packed: np.ndarray, first: int, n: int) -> np.ndarray:
+    """Decode n bases starting at base `first` of an already-sliced packed array."""
+    codes = np.empty((len(packed), 4), dtype=np.uint8)
+    codes[:, 0] = packed >> 6
+    codes[:, 1] = (packed >> 4) & 3
+    codes[:, 2] = (packed >> 2) & 3
+    codes[:, 3] = packed & 3
+    return _DECODE[codes.ravel()[first:first + n]]
+
+
+def iter_fasta_bytes(path: str):
+    """(header, sequence bytes) per contig of a (gzipped) FASTA."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        header, chunks = None, []
+        for line in f:
+            if line.startswith(b">"):
+                if header is not None:
+                    yield header, b"".join(chunks)
+                header, chunks = line[1:].rstrip().decode(), []
+            else:
+                chunks.append(line.rstrip())
+        if header is not None:
+            yield header, b"".join(chunks)
+
+
+def find_genomes(genome_dir: str) -> dict:
+    """genome ID -> path for every *_genomic.fna(.gz) under genome_dir (recursive)."""
+    found = {}
+    for dirpath, _, files in os.walk(genome_dir):
+        for fn in sorted(files):
+            for suf in SUFFIXES:
+                if fn.endswith(suf):
+                    found.setdefault(fn[:-len(suf)], os.path.join(dirpath, fn))
+    return dict(sorted(found.items()))
+
+
+def build_store(genome_dir: str, store_dir: str, stage: Stage = None) -> int:
+    genomes = find_genomes(genome_dir)
+    if not genomes:
+        raise SystemExit(f"[ERROR] No *_genomic.fna(.gz) files under {genome_dir}")
+    os.makedirs(store_dir, exist_ok=True)
+    offset = 0
+    with open(os.path.join(store_dir, "seq.2bit.tmp"), "wb") as fs, \
+         open(os.path.join(store_dir, "contigs.tsv.tmp"), "w") as fi, \
+         open(os.path.join(store_dir, "nmask.tsv.tmp"), "w") as fn:
+        fi.write("genome\tcontig\toffset\tlength\theader\n")
+        fn.write("genome\tcontig\tstart\tlength\n")
+        for gid, path in genomes.items():
+            for header, seq in iter_fasta_bytes(path):
+                contig = header.split(None, 1)[0]
+                packed, runs = pack(seq)
+                fs.write(packed.tobytes())
+                fi.write(f"{gid}\t{contig}\t{offset}\t{len(seq)}\t{header}\n")
+                for s, n in runs:
+                    fn.write(f"{gid}\t{contig}\t{s}\t{n}\n")
+                offset += len(packed)
+            if stage is not None:
+                stage.track_input(path)
+    for name in ("seq.2bit", "contigs.tsv", "nmask.tsv"):
+        os.replace(os.path.join(store_dir, name + ".tmp"), os.path.join(store_dir, name))
+    return len(genomes)
+
+
+class GenomeStore:
+    """Random access to a store directory written by build_store()."""
+
+    def __init__(self, store_dir: str = STORE_DIR):
+        self.store_dir = store_dir
+        self.contigs = {}                 # (genome, contig) -> (offset, length)
+        self.headers = defaultdict(list)  # genome -> [(contig, header), ...] in file order
+        self.nmask = defaultdict(list)    # (genome, contig) -> [(start, length), ...]
+        with open(os.path.join(store_dir, "contigs.tsv")) as f:
+            next(f)
+            for line in f:
+                gid, contig, off, length, header = line.rstrip("\n").split("\t", 4)
+                self.contigs[(gid, contig)] = (int(off), int(length))
+                self.headers[gid].append((contig, header))
+        with open(os.path.join(store_dir, "nmask.tsv")) as f:
+            next(f)
+            for line in f:
+                gid, contig, s, n = line.rstrip("\n").split("\t")
+                self.nmask[(gid, contig)].append((int(s), int(n)))
+        path = os.path.join(store_dir, "seq.2bit")
+        self.seq = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.zeros(0, np.uint8)
+
+    def genomes(self) -> list:
+        return list(self.headers)
+
+    def contig_length(self, genome: str, contig: str) -> int:
+        return self.contigs[(genome, contig)][1]
+
+    def fetch(self, genome: str, contig: str, start: int = 0, end: int = None, strand: str = "+") -> str:
+        """Sequence of [start, end) (0-based, BED-style); strand '-' returns the reverse complement."""
+        try:
+            off, length = self.contigs[(genome, contig)]
+        except KeyError:
+            raise KeyError(f"Unknown contig {genome}:{contig}") from None
+        end = length if end is None else min(end, length)
+        start = max(0, start)
+        if end <= start:
+            return ""
+        b0, b1 = off + start // 4, off + (end + 3) // 4
+        bases = unpack(np.asarray(self.seq[b0:b1]), start % 4, end - start).copy()
+        for s, n in self.nmask.get((genome, contig), ()):
+            lo, hi = max(s, start), min(s + n, end)
+            if lo < hi:
+                bases[lo - start:hi - start] = ord("N")
+        out = bases.tobytes()
+        if strand == "-":
+            out = out.translate(_COMPLEMENT)[::-1]
+        return out.decode()
+
+    def iter_genome(self, genome: str):
+        """(header, sequence) for every contig of a genome, in the original order."""
+        for contig, header in self.headers[genome]:
+            yield header, self.fetch(genome, contig)
+
+    def write_fasta(self, genome: str, out, width: int = 80) -> None:
+        for header, seq in self.iter_genome(genome):
+            out.write(f">{header}\n")
+            for i in range(0, len(seq), width):
+                out.write(seq[i:i + width] + "\n")
+
+    def getfasta(self, genome: str, bed_path: str, out) -> int:
+        """bedtools getfasta -s -name equivalent for BED lines (chrom start end name score strand)."""
+        n = 0
+        with open(bed_path) as f:
+            for line in f:
+                if not line.strip() or line.startswith(("#", "track", "browser")):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                contig, start, end = cols[0], int(cols[1]), int(cols[2])
+                name = cols[3] if len(cols) > 3 else ""
+                strand = cols[5] if len(cols) > 5 else "+"
+                seq = self.fetch(genome, contig, start, end, strand)
+                label = f"{contig}:{start}-{end}({strand})"
+                out.write(f">{name}::{label}\n{seq}\n" if name else f">{label}\n{seq}\n")
+                n += 1
+        return n
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or query the 2-bit packed genome store.")
+    parser.add_argument("--store", default=STORE_DIR, help="Store directory.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="Pack all *_genomic.fna(.gz) files under --genome-dir.")
+    b.add_argument("--genome-dir", default=GENOME_DIR)
+
+    f = sub.add_parser("fetch", help="Print one region.")
+    f.add_argument("genome")
+    f.add_argument("contig")
+    f.add_argument("start", type=int)
+    f.add_argument("end", type=int)
+    f.add_argument("strand", nargs="?", default="+", choices=["+", "-"])
+
+    g = sub.add_parser("getfasta", help="Extract BED regions of one genome (like bedtools getfasta -s -name).")
+    g.add_argument("genome")
+    g.add_argument("bed")
+
+    e = sub.add_parser("export", help="Write a whole genome as FASTA.")
+    e.add_argument("genome")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.cmd == "build":
+        stage = Stage("genome_store_build")
+        with stage.step("pack_genomes"):
+            n = build_store(args.genome_dir, args.store, stage)
+            stage.track_output(*(os.path.join(args.store, fn) for fn in ("seq.2bit", "contigs.tsv", "nmask.tsv")))
+        size = os.path.getsize(os.path.join(args.store, "seq.2bit"))
+        print(f"[OK] Packed {n} genomes into {args.store} ({size / 1e6:.1f} MB)")
+        return
+
+    store = GenomeStore(args.store)
+    if args.cmd == "fetch":
+        print(store.fetch(args.genome, args.contig, args.start, args.end, args.strand))
+    elif args.cmd == "getfasta":
+        store.getfasta(args.genome, args.bed, sys.stdout)
+    elif args.cmd == "export":
+        store.write_fasta(args.genome, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+In-process replacement for step 08 (`vsearch --cluster_fast --id 0.90` per
+multi-copy genome).
+
+08 starts one vsearch process per genome to cluster 2-15 16S copies. This
+module clusters such small inputs directly, following cluster_fast's greedy
+centroid rules:
+
+  1. sequences are sorted by decreasing length (then abundance from ";size=",
+     then input order);
+  2. each sequence is compared with the existing centroids, most shared
+     unique 8-mers first (centroids sharing fewer than MIN_WORD_MATCHES words
+     are skipped; at most MAX_REJECTS are aligned);
+  3. it joins the first centroid with identity >= --id, otherwise it becomes
+     a new centroid.
+
+Identity is vsearch's default --iddef 2: matching columns / alignment columns
+without terminal gaps, from a global alignment with vsearch's default scores
+(match 2, mismatch -4, gap open/extend 20/2 inside, 2/1 at the ends). The
+alignment is banded around the diagonals spanned by the length difference;
+identical and contained sequences skip the alignment (identity 1.0).
+
+Centroids are written in creation order with the original headers, wrapped at
+80 columns like vsearch --centroids, to <domain>_16S_clustered/<MAG>.fna;
+single-copy genomes are copied as in 08.
+
+--verify-against DIR compares the centroid IDs per genome with recorded
+vsearch outputs (e.g. an earlier *_16S_clustered directory). With both domains
+DIR must contain "{domain}", which is replaced by bacteria/archaea.
+
+Usage:
+  python greedy_cluster.py                           # both domains, paths as in 08
+  python greedy_cluster.py --domain bacteria --id 0.90 --jobs 16
+  python greedy_cluster.py --domain bacteria --out-suffix _16S_clustered_py \\
+      --verify-against intermediate/count_copies_per_genome/bacteria_16S_clustered
+  python greedy_cluster.py --out-suffix _16S_clustered_py \\
+      --verify-against 'intermediate/count_copies_per_genome/{domain}_16S_clustered'
+"""
+
+import os
+import re
+import sys
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fasta_utils import format_fasta
+from stage_metrics import Stage
+
+# ============================= CONFIG ========================================
+ROOT = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/count_copies_per_genome")
+DOMAINS = ["bacteria", "archaea"]
+IDENTITY = 0.90
+WORD_LENGTH = 8
+MIN_WORD_MATCHES = 12
+MAX_REJECTS = 32
+BAND = 16                 # extra diagonals on each side of the length difference
+FASTA_WIDTH = 80          # vsearch --fasta_width default
+# vsearch default scoring
+MATCH, MISMATCH = 2, -4
+GAP_OPEN, GAP_EXT = 20, 2
+END_GAP_OPEN, END_GAP_EXT = 2, 1
+# ============================================================================
+
+_SIZE = re.compile(r";size=(\d+)")
+NEG = -10 ** 9
+
+
+def read_records(path: str) -> list:
+    """(header, sequence) pairs, keeping the full header line as vsearch does."""
+    records, header, chunks = [], None, []
+    with open(path) as f:
+        for line in f:
+            if line.startswith(">"):
+                if header is not None:
+                    records.append((header, "".join(chunks)))
+                header, chunks = line[1:].rstrip("\n\r"), []
+            else:
+                chunks.append(line.strip())
+    if header is not None:
+        records.append((header, "".join(chunks)))
+    return records
+
+
+def _abundance(header: str) -> int:
+    m = _SIZE.search(header)
+    return int(m.group(1)) if m else 1
+
+
+def kmers(seq: str, k: int = WORD_LENGTH) -> set:
+    return {seq[i:i + k] for i in range(len(seq) - k + 1)}
+
+
+# ============================= ALIGNMENT =====================================
+
+def banded_identity(q: str, t: str, band: int = BAND) -> float:
+    """
+    vsearch --iddef 2 identity of a global alignment of q (rows) and t
+    (columns), restricted to diagonals j - i in [min(0, m-n) - band, max(0, m-n) + band].
+    Rows are filled with numpy; horizontal gaps use the prefix-maximum trick,
+    and gap cells remember where their gap was opened for an exact traceback.
+    """
+    a = np.frombuffer(q.upper().encode(), dtype=np.uint8)
+    b = np.frombuffer(t.upper().encode(), dtype=np.uint8)
+    n, m = len(a), len(b)
+    if n == 0 or m == 0:
+        return 0.0
+    lo, hi = min(0, m - n) - band, max(0, m - n) + band
+    cols = np.arange(m + 1)
+
+    # vertical gaps (in t) in the last column are terminal
+    v_open = np.full(m + 1, GAP_OPEN + GAP_EXT, dtype=np.int64)
+    v_ext = np.full(m + 1, GAP_EXT, dtype=np.int64)
+    v_open[m], v_ext[m] = END_GAP_OPEN + END_GAP_EXT, END_GAP_EXT
+
+    H = np.full(m + 1, NEG, dtype=np.int64)
+    first = min(m, hi)
+    H[:first + 1] = -(END_GAP_OPEN + END_GAP_EXT * cols[:first + 1])
+    H[0] = 0
+    F = np.full(m + 1, NEG, dtype=np.int64)
+    f_start = np.zeros(m + 1, dtype=np.int32)
+    rows = []             # per row: (j0, pointer 0 diag / 1 up / 2 left, up-gap start row, left-gap start column)
+
+    for i in range(1, n + 1):
+        j0, j1 = max(0, i + lo), min(m, i + hi)
+        opened, extended = H - v_open, F - v_ext
+        use_open = opened >= extended
+        F = np.where(use_open, opened, extended)
+        f_start = np.where(use_open, i - 1, f_start).astype(np.int32)
+
+        ks = np.arange(j0, j1 + 1)
+        h = F[j0:j1 + 1].copy()
+        ptr = np.ones(len(ks), dtype=np.uint8)
+        d0 = max(j0, 1)
+        if d0 <= j1:
+            diag = H[d0 - 1:j1] + np.where(b[d0 - 1:j1] == a[i - 1], MATCH, MISMATCH)
+            better = diag >= h[d0 - j0:]
+            h[d0 - j0:][better] = diag[better]
+            ptr[d0 - j0:][better] = 0
+        if j0 == 0:
+            h[0] = -(END_GAP_OPEN + END_GAP_EXT * i)
+
+        g_open, g_ext = (END_GAP_OPEN, END_GAP_EXT) if i == n else (GAP_OPEN, GAP_EXT)
+        vals = h + g_ext * ks
+        best = np.maximum.accumulate(vals)
+        arg = np.maximum.accumulate(np.where(vals == best, ks, j0))
+        E = np.full(len(ks), NEG, dtype=np.int64)
+        E[1:] = best[:-1] - g_open - g_ext * ks[1:]
+        h_start = np.zeros(len(ks), dtype=np.int32)
+        h_start[1:] = arg[:-1]
+        take = E > h
+        h[take] = E[take]
+        ptr[take] = 2
+
+        H = np.full(m + 1, NEG, dtype=np.int64)
+        H[j0:j1 + 1] = h
+        rows.append((j0, ptr, f_start[j0:j1 + 1].copy(), h_start))
+
+    # traceback as (op, length) runs; terminal gaps are dropped for --iddef 2
+    i, j, runs = n, m, []
+    while i > 0 and j > 0:
+        j0, ptr, up_start, left_start = rows[i - 1]
+        k = j - j0
+        if ptr[k] == 0:
+            runs.append(("=" if a[i - 1] == b[j - 1] else "X", 1))
+            i, j = i - 1, j - 1
+        elif ptr[k] == 1:
+            runs.append(("-", i - up_start[k]))
+            i = int(up_start[k])
+        else:
+            runs.append(("-", j - left_start[k]))
+            j = int(left_start[k])
+    if i or j:
+        runs.append(("-", i or j))
+    while runs and runs[0][0] == "-":
+        runs.pop(0)
+    while runs and runs[-1][0] == "-":
+        runs.pop()
+    columns = sum(n_ for _, n_ in runs)
+    return sum(n_ for op, n_ in runs if op == "=") / columns if columns else 0.0
+
+
+def identity(q: str, t: str, band: int = BAND) -> float:
+    qu, tu = q.upper(), t.upper()
+    if qu in tu or tu in qu:
+        return 1.0          # only terminal gaps
+    return banded_identity(qu, tu, band)
+
+
+# ============================= CLUSTERING ====================================
+
+def cluster_greedy(records: list, min_id: float = IDENTITY, k: int = WORD_LENGTH,
+                   min_words: int = MIN_WORD_MATCHES, max_rejects: int = MAX_REJECTS, band: int = BAND):
+    """records: [(header, seq)] -> (centroids in creation order, {header: centroid header})"""
+    order = sorted(range(len(records)),
+                   key=lambda i: (-len(records[i][1]), -_abundance(records[i][0]), i))
+    centroids, words, assign = [], [], {}
+    for i in order:
+        header, seq = records[i]
+        qw = kmers(seq.upper(), k)
+        shared = sorted(((len(qw & w), c) for c, w in enumerate(words)), key=lambda x: (-x[0], x[1]))
+        hit = None
+        for n_shared, c in shared[:max_rejects]:
+            if n_shared < min(min_words, len(qw)):
+                break
+            if identity(seq, centroids[c][1], band) >= min_id:
+                hit = c
+                break
+        if hit is None:
+            centroids.append((header, seq))
+            words.append(qw)
+            assign[header] = header
+        else:
+            assign[header] = centroids[hit][0]
+    return centroids, assign
+
+
+def write_centroids(centroids: list, path: str) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.writelines(format_fasta(h, s, FASTA_WIDTH) for h, s in centroids)
+    os.replace(tmp, path)
+
+
+def _cluster_file(job):
+    src, dst, min_id, band = job
+    centroids, _ = cluster_greedy(read_records(src), min_id, band=band)
+    write_centroids(centroids, dst)
+    return os.path.basename(src), len(centroids)
+
+
+def list_fasta(d: str) -> list:
+    try:
+        return sorted(os.path.join(d, f) for f in os.listdir(d) if f.endswith((".fna", ".fa")))
+    except FileNotFoundError:
+        return []
+
+
+def cluster_domain(root: str, dom: str, min_id: float = IDENTITY, jobs: int = 1,
+                   band: int = BAND, out_suffix: str = "_16S_clustered", stage: Stage = None) -> dict:
+    """Cluster <dom>_16S_multiple/*, copy <dom>_16S_single/*, into <dom><out_suffix>/ (as 08)."""
+    in_multi = os.path.join(root, f"{dom}_16S_multiple")
+    in_single = os.path.join(root, f"{dom}_16S_single")
+    out_dir = os.path.join(root, f"{dom}{out_suffix}")
+    os.makedirs(out_dir, exist_ok=True)
+    multi, single = list_fasta(in_multi), list_fasta(in_single)
+    print(f"[INFO] {dom}: {len(multi)} multi-copy and {len(single)} single-copy files")
+
+    work = [(f, os.path.join(out_dir, os.path.basename(f)), min_id, band) for f in multi]
+    if jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            results = list(ex.map(_cluster_file, work, chunksize=max(1, len(work) // (4 * jobs))))
+    else:
+        results = [_cluster_file(w) for w in work]
+
+    for f in single:   # cp -n
+        dst = os.path.join(out_dir, os.path.basename(f))
+        if not os.path.exists(dst):
+            shutil.copyfile(f, dst)
+    if stage is not None:
+        stage.track_input(*multi, *single)
+        stage.track_output(*(w[1] for w in work))
+    return {"out_dir": out_dir, "genomes": len(results), "centroids": sum(n for _, n in results)}
+
+
+def verify(out_dir: str, ref_dir: str) -> list:
+    """Genomes whose centroid IDs (in order) differ from a recorded vsearch output."""
+    diffs = []
+    for path in list_fasta(ref_dir):
+        fn = os.path.basename(path)
+        mine = os.path.join(out_dir, fn)
+        ref_ids = [h.split()[0] for h, _ in read_records(path)]
+        got_ids = [h.split()[0] for h, _ in read_records(mine)] if os.path.exists(mine) else None
+        if got_ids != ref_ids:
+            diffs.append((fn, ref_ids, got_ids))
+    return diffs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Greedy centroid clustering of multi-copy 16S genes (08 without vsearch).")
+    parser.add_argument("--root", default=ROOT, help="count_copies_per_genome directory.")
+    parser.add_argument("--domain", action="append", choices=DOMAINS,
+                        help="Domain(s) to process (repeatable; default: both).")
+    parser.add_argument("--id", type=float, default=IDENTITY, help="Clustering identity (default: 0.90).")
+    parser.add_argument("--band", type=int, default=BAND, help="Extra diagonals around the length difference.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 4, help="Genomes clustered in parallel.")
+    parser.add_argument("--out-suffix", default="_16S_clustered",
+                        help="Output directory is <root>/<domain><suffix> (default as in 08).")
+    parser.add_argument("--verify-against",
+                        help="Directory with recorded vsearch centroids to compare with; "
+                             "'{domain}' in it is replaced per domain (required with several domains).")
+    args = parser.parse_args()
+    args.domain = list(dict.fromkeys(args.domain or DOMAINS))
+    if args.verify_against and "{domain}" not in args.verify_against and len(args.domain) > 1:
+        parser.error("--verify-against needs '{domain}' in the path when more than one domain is clustered")
+    return args
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.root):
+        print(f"[ERROR] Root directory not found: {args.root}", file=sys.stderr)
+        raise SystemExit(1)
+
+    # created here, not at import: 07_c imports cluster_greedy and must not write greedy_cluster metrics
+    stage = Stage("greedy_cluster")
+    n_diff = 0
+    for dom in args.domain:
+        with stage.step(f"{dom}_cluster"):
+            res = cluster_domain(args.root, dom, args.id, max(1, args.jobs), args.band, args.out_suffix, stage)
+        print(f"[OK] {dom}: {res['genomes']} genomes -> {res['centroids']} centroids in {res['out_dir']}")
+        if args.verify_against:
+            ref_dir = args.verify_against.replace("{domain}", dom)
+            if not os.path.isdir(ref_dir):
+                print(f"[ERROR] Reference directory not found: {ref_dir}", file=sys.stderr)
+                raise SystemExit(1)
+            diffs = verify(res["out_dir"], ref_dir)
+            n_diff += len(diffs)
+            for fn, ref_ids, got_ids in diffs[:10]:
+                print(f"[WARN] {fn}: vsearch {ref_ids} vs {got_ids}")
+            print(f"[INFO] {dom}: {len(diffs)} genomes differ from {ref_dir}")
+    if n_diff:
+        raise SystemExit(1)
+    print("[DONE] 16S clustering.")
+
+
+if __name__ == "__main__":
+    main()
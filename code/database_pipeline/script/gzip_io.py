@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Shared gzip reading/writing for the pipeline stages.
+
+  gz_open(path, mode)         like open()/gzip.open(): .gz paths (or gzipped=True) are (de)compressed,
+                              anything else is a plain file; "rb"/"rt"/"wb"/"wt"/"ab"/"at"
+  compress_file(src, dst)     gzip a file (01_b)
+  decompress_file(src, dst)   gunzip a file
+
+Reading uses 4 MiB buffers and the fastest installed backend:
+  zlib-ng  (pip install zlib-ng)      compression and decompression
+  isal     (pip install isal)         decompression
+  zlib     (standard library)         fallback
+M2I_GZIP_BACKEND=zlib forces the standard library.
+
+Writing never compresses in the calling thread: the data is cut into 1 MiB
+blocks, each block is compressed into its own gzip member by a thread pool
+(zlib releases the GIL) and the members are written in order. A file of
+several members is standard gzip (RFC 1952; gzip -d, pigz, zcat, Python's
+gzip and pandas read it as one stream) and the bytes do not depend on the
+number of threads. With one thread compression still overlaps with the
+producer.
+
+Defaults can be set per run without editing scripts:
+  M2I_GZIP_LEVEL    compression level 1-9 (default 6, as gzip)
+  M2I_GZIP_THREADS  compression threads (default min(4, CPUs))
+"""
+
+import io
+import os
+import gzip
+import zlib
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ============================= CONFIG ========================================
+LEVEL = int(os.environ.get("M2I_GZIP_LEVEL", 6))
+THREADS = int(os.environ.get("M2I_GZIP_THREADS", min(4, os.cpu_count() or 1)))
+BUFFER_SIZE = 4 * 1024 * 1024   # file buffer for reads and writes
+BLOCK_SIZE = 1024 * 1024        # uncompressed bytes per gzip member
+# ============================================================================
+
+_gzip_open, _compressobj, BACKEND = gzip.open, zlib.compressobj, "zlib"
+if os.environ.get("M2I_GZIP_BACKEND", "auto") != "zlib":
+    try:
+        from zlib_ng import gzip_ng, zlib_ng
+        _gzip_open, _compressobj, BACKEND = gzip_ng.open, zlib_ng.compressobj, "zlib-ng"
+    except ImportError:
+        try:
+            from isal import igzip   # isal levels are 0-3, so it is only used for reading
+            _gzip_open, BACKEND = igzip.open, "isal"
+        except ImportError:
+            pass
+
+
+def compress_member(data: bytes, level: int = LEVEL) -> bytes:
+    """One complete gzip member (header with mtime 0, deflate stream, CRC32 + size trailer)."""
+    c = _compressobj(level, zlib.DEFLATED, 31)
+    return c.compress(data) + c.flush()
+
+
+class GzipWriter(io.RawIOBase):
+    """Binary gzip writer compressing BLOCK_SIZE blocks in a thread pool (multi-member output)."""
+
+    def __init__(self, path: str, mode: str = "wb", level: int = None, threads: int = None,
+                 block_size: int = BLOCK_SIZE):
+        super().__init__()
+        self.level = LEVEL if level is None else level
+        self.block_size = block_size
+        threads = max(1, THREADS if threads is None else threads)
+        self._fh = open(path, mode[0] + "b", buffering=BUFFER_SIZE)
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+        self._pending = deque()
+        self._max_pending = 2 * threads    # bounds memory to a few blocks per thread
+        self._buf = bytearray()
+        self._members = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        n = memoryview(b).nbytes
+        self._buf += b
+        if len(self._buf) >= self.block_size:
+            view = memoryview(self._buf)
+            full = len(self._buf) - len(self._buf) % self.block_size
+            for start in range(0, full, self.block_size):
+                self._submit(bytes(view[start:start + self.block_size]))
+            view.release()
+            del self._buf[:full]
+        return n
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self._pool.submit(compress_member, block, self.level))
+        self._members += 1
+        while len(self._pending) > self._max_pending:
+            self._fh.write(self._pending.popleft().result())
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._buf or not self._members:   # an empty input still gives a valid (empty) gzip file
+                self._submit(bytes(self._buf))
+                self._buf.clear()
+            while self._pending:
+                self._fh.write(self._pending.popleft().result())
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._fh.close()
+            super().close()
+
+
+def gz_open(path: str, mode: str = "rb", level: int = None, threads: int = None, gzipped: bool = None,
+            encoding: str = "utf-8", errors: str = None, newline: str = None):
+    """
+    open() for plain and gzip files with large buffers; text modes decode with `encoding`.
+    gzipped: None = decided by the .gz suffix, True/False to force it.
+    """
+    text = "t" in mode
+    bmode = mode.replace("t", "").replace("b", "") + "b"
+    if gzipped is None:
+        gzipped = str(path).endswith(".gz")
+    if not gzipped:
+        if text:
+            return open(path, bmode.replace("b", ""), buffering=BUFFER_SIZE,
+                        encoding=encoding, errors=errors, newline=newline)
+        return open(path, bmode, buffering=BUFFER_SIZE)
+    if bmode[0] == "r":
+        f = io.BufferedReader(_gzip_open(path, "rb"), BUFFER_SIZE)
+    elif bmode[0] in "wax":
+        f = GzipWriter(path, bmode, level=level, threads=threads)
+    else:
+        raise ValueError(f"Unsupported mode: {mode}")
+    return io.TextIOWrapper(f, encoding=encoding, errors=errors, newline=newline) if text else f
+
+
+def compress_file(src: str, dst: str, level: int = None, threads: int = None) -> None:
+    """gzip src into dst, whatever dst is named (e.g. a .tmp file renamed afterwards)."""
+    with open(src, "rb", buffering=0) as fi, GzipWriter(dst, "wb", level=level, threads=threads) as fo:
+        shutil.copyfileobj(fi, fo, BLOCK_SIZE)
+
+
+def decompress_file(src: str, dst: str) -> None:
+    with _gzip_open(src, "rb") as fi, open(dst, "wb", buffering=BUFFER_SIZE) as fo:
+        shutil.copyfileobj(fi, fo, BLOCK_SIZE)
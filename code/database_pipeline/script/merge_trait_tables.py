@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Merge several PICRUSt2-style trait tables (ko.txt.gz from 24, one per batch
+or domain) into one, without loading them into memory.
+
+  1. Only the headers are read first; the union of all trait columns (sorted,
+     as 24 writes them) gives the output header, and every input gets an
+     index array mapping its columns to output positions.
+  2. Rows are streamed from all inputs at once with a k-way merge on the
+     genome ID (24 writes genomes sorted, so nothing is re-sorted here; an
+     unsorted input is reported as an error).
+  3. Each row is scattered into a (chunk x traits) buffer through its index
+     array and the buffer is written when full.
+
+Memory is one line per input plus one buffer of --chunk-rows rows, however
+many tables are merged.
+
+A genome found in more than one input (or twice in one input) is resolved by
+--on-duplicate:
+  error  stop with an error (default)
+  first  keep the row from the earliest input on the command line
+  last   keep the row from the latest input (e.g. a re-annotated batch)
+  sum    add the counts
+  max    element-wise maximum
+
+Usage:
+  python merge_trait_tables.py --out merged/ko.txt.gz batch1/ko.txt.gz batch2/ko.txt.gz
+  python merge_trait_tables.py --on-duplicate last --out default_files/bacteria/ko.txt.gz \\
+      default_files/bacteria/ko.txt.gz new_batch/ko.txt.gz
+"""
+
+import os
+import sys
+import heapq
+import argparse
+import itertools
+
+import numpy as np
+
+from gzip_io import gz_open
+from stage_metrics import Stage
+
+STAGE = Stage("merge_trait_tables")
+
+POLICIES = ("error", "first", "last", "sum", "max")
+CHUNK_ROWS = 256
+
+
+def _open(path: str):
+    return gz_open(path, "rt")
+
+
+def read_header(path: str) -> list:
+    with _open(path) as f:
+        return f.readline().rstrip("\n").split("\t")
+
+
+def union_columns(headers: list):
+    """-> (sorted union of trait columns, one int64 index array per header)"""
+    columns = sorted(set(itertools.chain.from_iterable(h[1:] for h in headers)))
+    pos = {c: i for i, c in enumerate(columns)}
+    return columns, [np.array([pos[c] for c in h[1:]], dtype=np.int64) for h in headers]
+
+
+def iter_rows(path: str, source: int, n_cols: int):
+    """(genome, source, values) per data line; genomes must be in sorted order."""
+    prev = None
+    with _open(path) as f:
+        f.readline()
+        for lineno, line in enumerate(f, start=2):
+            genome, _, rest = line.rstrip("\n").partition("\t")
+            if not genome:
+                continue
+            if prev is not None and genome < prev:
+                raise SystemExit(f"[ERROR] {path}:{lineno}: genome '{genome}' after '{prev}'; "
+                                 "inputs must be sorted by genome ID (as 24 writes them)")
+            prev = genome
+            values = rest.split("\t") if rest else []
+            if len(values) != n_cols:
+                raise SystemExit(f"[ERROR] {path}:{lineno}: {len(values)} values for {n_cols} columns")
+            yield genome, source, values
+
+
+def _format_rows(genomes: list, block: np.ndarray) -> str:
+    if np.array_equal(block, np.floor(block)):
+        rows = (map(str, r) for r in block.astype(np.int64).tolist())
+    else:
+        rows = (("%.10g" % v for v in r) for r in block.tolist())
+    return "".join(g + "\t" + "\t".join(r) + "\n" for g, r in zip(genomes, rows))
+
+
+@STAGE.timed("merge")
+def merge_tables(paths: list, out_path: str, on_duplicate: str = "error", chunk_rows: int = CHUNK_ROWS) -> dict:
+    """k-way merge of wide trait tables; returns counts for the report."""
+    if on_duplicate not in POLICIES:
+        raise ValueError(f"Unknown duplicate policy: {on_duplicate}")
+    headers = [read_header(p) for p in paths]
+    columns, index = union_columns(headers)
+    STAGE.track_input(*paths)
+
+    streams = [iter_rows(p, k, len(h) - 1) for k, (p, h) in enumerate(zip(paths, headers))]
+    merged = heapq.merge(*streams, key=lambda r: (r[0], r[1]))
+
+    buf = np.zeros((chunk_rows, len(columns)), dtype=np.float64)
+    genomes = []
+    n_genomes = n_dup = 0
+
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(out_dir, exist_ok=True)
+    # inputs stay readable until the end, so --out may be one of them; the suffix picks gzip or plain text
+    tmp = out_path + (".tmp.gz" if out_path.endswith(".gz") else ".tmp")
+    try:
+        with gz_open(tmp, "wt") as out:
+            out.write("\t".join([headers[0][0]] + columns) + "\n")
+            for genome, group in itertools.groupby(merged, key=lambda r: r[0]):
+                rows = list(group)
+                if len(rows) > 1:
+                    n_dup += 1
+                    if on_duplicate == "error":
+                        sources = ", ".join(paths[r[1]] for r in rows)
+                        raise SystemExit(f"[ERROR] Genome '{genome}' is in several inputs ({sources}); "
+                                         "choose --on-duplicate first/last/sum/max")
+                    if on_duplicate == "first":
+                        rows = rows[:1]
+                    elif on_duplicate == "last":
+                        rows = rows[-1:]
+
+                row = buf[len(genomes)]
+                for _, source, values in rows:
+                    vals = np.array(values, dtype=np.float64)
+                    cols = index[source]
+                    if on_duplicate == "max":
+                        row[cols] = np.maximum(row[cols], vals)
+                    else:
+                        row[cols] += vals
+                genomes.append(genome)
+                n_genomes += 1
+
+                if len(genomes) == chunk_rows:
+                    out.write(_format_rows(genomes, buf))
+                    buf[:] = 0.0
+                    genomes = []
+            if genomes:
+                out.write(_format_rows(genomes, buf[:len(genomes)]))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, out_path)
+    STAGE.track_output(out_path)
+    return {"inputs": len(paths), "genomes": n_genomes, "columns": len(columns), "duplicates": n_dup}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Out-of-core merge of ko.txt.gz-style trait tables.")
+    parser.add_argument("inputs", nargs="+", help="Trait tables to merge (genome rows sorted, as written by 24).")
+    parser.add_argument("--out", required=True, help="Merged table (.gz = gzip).")
+    parser.add_argument("--on-duplicate", choices=POLICIES, default="error",
+                        help="What to do with a genome found in several inputs (default: error).")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help=f"Rows buffered before each write (default: {CHUNK_ROWS}).")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    for p in args.inputs:
+        if not os.path.exists(p):
+            print(f"[ERROR] File not found: {p}", file=sys.stderr)
+            raise SystemExit(1)
+
+    res = merge_tables(args.inputs, args.out, args.on_duplicate, max(1, args.chunk_rows))
+    if res["duplicates"]:
+        print(f"[WARN] {res['duplicates']} genomes were in more than one input (resolved with '{args.on_duplicate}')")
+    print(f"[OK] {res['inputs']} tables -> {res['genomes']} genomes x {res['columns']} columns in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
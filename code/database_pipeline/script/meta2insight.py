@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+One entry point for the Python stages of the database pipeline.
+
+  python meta2insight.py <command> [arguments of that stage]
+
+Each command runs the numbered stage script in this directory with runpy, as if
+it had been started directly (same sys.argv, same working directory, same
+metrics file). Nothing but the standard library is imported up front: listing
+the commands or printing help never loads pandas/Biopython, and only the
+selected stage pays for its own imports.
+
+Commands:
+  domain-split    03_domain_classification.py
+  qc-filter       05_quality_filtering.py          (--sweep, --completeness, ...)
+  count-16S       07_b_count_copies_per_genome.py
+  pick-16S        09_single_16S_per_genome.py
+  best-genome     12/13_choose_best_genome_*.py    (arc | bac | both)
+  phylip2fasta    18_convert_pylip_to_fasta.py
+  raxml-info      20_raxml_info_files.py           (LOGS..., --jobs, --summary)
+  filter-copies   22_filter_16S_copies_bac.py      (--domain, --ref)
+  ko-table        24_build_kotable.py              (--traits, ...)
+  rename-ko       99_name_matching.py              (ko_in id_map ko_out)
+
+Usage:
+  python meta2insight.py                       # list commands
+  python meta2insight.py qc-filter --sweep
+  python meta2insight.py best-genome both
+  python meta2insight.py raxml-info intermediate/raxml --jobs 8
+  python meta2insight.py ko-table --help       # help of the stage itself
+"""
+
+import os
+import sys
+import runpy
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# command -> (script or {variant: script}, stage takes arguments, summary)
+COMMANDS = {
+    "domain-split": ("03_domain_classification.py", False,
+                     "Split formatted MAGs into bacteria/archaea from the GTDB-Tk summaries."),
+    "qc-filter": ("05_quality_filtering.py", True,
+                  "Filter genomes by CheckM completeness/contamination (or --sweep thresholds)."),
+    "count-16S": ("07_b_count_copies_per_genome.py", False,
+                  "Count barrnap 16S copies per genome and write the copy-number tables."),
+    "pick-16S": ("09_single_16S_per_genome.py", False,
+                 "Keep one 16S sequence per genome."),
+    "best-genome": ({"arc": "12_choose_best_genome_arc.py", "bac": "13_choose_best_genome_bac.py"}, False,
+                    "Choose one representative genome per 16S cluster (arc | bac | both)."),
+    "phylip2fasta": ("18_convert_pylip_to_fasta.py", False,
+                     "Convert the RAxML-reduced PHYLIP alignments to FASTA."),
+    "raxml-info": ("20_raxml_info_files.py", True,
+                   "Write RAxML_info-style files from raxml-ng --evaluate logs."),
+    "filter-copies": ("22_filter_16S_copies_bac.py", True,
+                      "Filter 16S copy tables to the reference genomes and cap at 10."),
+    "ko-table": ("24_build_kotable.py", True,
+                 "Build ko.txt.gz (or another trait table) from eggNOG annotations."),
+    "rename-ko": ("99_name_matching.py", True,
+                  "Rewrite genome IDs in ko.txt.gz with id_map.tsv."),
+}
+
+
+def print_commands(out=sys.stdout):
+    print("usage: meta2insight.py <command> [arguments]\n\ncommands:", file=out)
+    for name, (_, _, summary) in COMMANDS.items():
+        print(f"  {name:<15} {summary}", file=out)
+    print("\n'meta2insight.py <command> --help' shows the options of stages that take arguments.", file=out)
+
+
+def unknown_command(cmd: str):
+    import difflib
+    print(f"[ERROR] Unknown command: {cmd}", file=sys.stderr)
+    close = difflib.get_close_matches(cmd, COMMANDS, n=3)
+    if close:
+        print(f"[INFO] Did you mean: {', '.join(close)}?", file=sys.stderr)
+    print_commands(sys.stderr)
+    raise SystemExit(2)
+
+
+def resolve(cmd: str, args: list) -> tuple:
+    """(scripts to run, arguments passed to them) for one command line."""
+    script, takes_args, _ = COMMANDS[cmd]
+    if isinstance(script, dict):
+        if not args or args[0] not in (*script, "both"):
+            print(f"[ERROR] {cmd} needs one of: {' | '.join((*script, 'both'))}", file=sys.stderr)
+            raise SystemExit(2)
+        scripts = list(script.values()) if args[0] == "both" else [script[args[0]]]
+        args = args[1:]
+    else:
+        scripts = [script]
+    if args and not takes_args:
+        # these stages read hard-coded paths and would ignore (or misread) any argument, even --help
+        print(f"[ERROR] {cmd} takes no arguments; edit the CONFIG block of {', '.join(scripts)}", file=sys.stderr)
+        raise SystemExit(2)
+    return scripts, args
+
+
+def run_script(script: str, args: list) -> None:
+    path = os.path.join(SCRIPT_DIR, script)
+    if not os.path.exists(path):
+        print(f"[ERROR] Stage script not found: {path}", file=sys.stderr)
+        raise SystemExit(1)
+    argv = sys.argv
+    sys.argv = [path, *args]
+    try:
+        runpy.run_path(path, run_name="__main__")
+    finally:
+        sys.argv = argv
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help", "help", "list"):
+        print_commands()
+        return
+    cmd, args = argv[0], argv[1:]
+    if cmd not in COMMANDS:
+        unknown_command(cmd)
+    scripts, args = resolve(cmd, args)
+
+    # the stages import their shared modules (stage_metrics, fasta_utils, ...) from this directory
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    for script in scripts:
+        print(f"[INFO] {cmd}: {script} {' '.join(args)}".rstrip())
+        run_script(script, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Local unstratified metagenome prediction (PICRUSt2's last step) as sparse
+matrix products, for re-scoring samples against a rebuilt database without
+rerunning place_seqs / hsp / metagenome_pipeline.
+
+    pred (function x sample) = traits^T (function x ASV) @ (abundance / 16S copies) (ASV x sample)
+
+Two ways to supply per-ASV marker copies and traits:
+
+  1. PICRUSt2 hsp outputs (per ASV):
+       --marker marker_predicted_and_nsti.tsv.gz   (sequence, 16S_rRNA_Count[, metadata_NSTI])
+       --traits KO_predicted.tsv.gz                (sequence, K00001, ...)
+
+  2. ASV -> genome assignments against this database (per genome):
+       --asv-map asv_to_genome.tsv                 (ASV<TAB>genome)
+       --marker  bacteria_16S_copies.txt           (from 22, in gtdb_r220_picrust_ref/bac_ref/: assembly, 16S_rRNA_Count)
+       --traits  ko.txt.gz                         (from 24: assembly, ko:K00001, ...)
+
+--seqtab is either a raw ASV count table (first column = ASV IDs) or an
+already normalised seqtab_norm.tsv (first header "normalized"), which is used
+as is. Like metagenome_pipeline.py, normalised abundances are rounded to 2
+decimals and ASVs with metadata_NSTI > --max-nsti are dropped.
+
+All matrices are scipy.sparse float32; the output is a PICRUSt2-style
+pred_metagenome_unstrat.tsv (function, then one column per sample).
+
+Usage:
+  python predict_metagenome.py --seqtab seqtab_norm.tsv --marker marker_predicted_and_nsti.tsv.gz \
+      --traits KO_predicted.tsv.gz --out pred_metagenome_unstrat.tsv
+  python predict_metagenome.py --seqtab asv_counts.tsv --asv-map asv_to_genome.tsv \
+      --marker intermediate/gtdb_r220_picrust_ref/bac_ref/bacteria_16S_copies.txt --traits intermediate/ko.txt.gz
+"""
+
+import os
+import sys
+import gzip
+import argparse
+
+import numpy as np
+import scipy.sparse as sp
+
+from stage_metrics import Stage
+
+STAGE = Stage("predict_metagenome")
+
+MAX_NSTI = 2.0
+
+
+def _open(path: str):
+    return gzip.open(path, "rt") if path.endswith(".gz") else open(path)
+
+
+def read_table(path: str):
+    """Wide TSV -> (row IDs, column names, CSR float32 matrix); zeros are not stored."""
+    rows, data, indices, indptr = [], [], [], [0]
+    with _open(path) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if not parts[0]:
+                continue
+            rows.append(parts[0])
+            vals = np.array(parts[1:], dtype=np.float32)
+            nz = np.flatnonzero(vals)
+            indices.append(nz)
+            data.append(vals[nz])
+            indptr.append(indptr[-1] + len(nz))
+    mat = sp.csr_matrix(
+        (np.concatenate(data) if data else np.zeros(0, np.float32),
+         np.concatenate(indices) if indices else np.zeros(0, np.int64),
+         np.array(indptr)),
+        shape=(len(rows), len(header) - 1), dtype=np.float32)
+    return rows, header, mat
+
+
+def read_marker(path: str):
+    """-> (ids, copies float32, nsti float32 or None)"""
+    ids, copies, nsti = [], [], []
+    with _open(path) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        nsti_col = header.index("metadata_NSTI") if "metadata_NSTI" in header else None
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 2:
+                continue
+            ids.append(parts[0])
+            copies.append(float(parts[1]))
+            if nsti_col is not None:
+                nsti.append(float(parts[nsti_col]))
+    return ids, np.array(copies, dtype=np.float32), (np.array(nsti, dtype=np.float32) if nsti_col is not None else None)
+
+
+def read_asv_map(path: str) -> dict:
+    mp = {}
+    with _open(path) as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 2 and parts[0] and not parts[0].startswith("#"):
+                mp[parts[0]] = parts[1]
+    return mp
+
+
+def selector(wanted: list, available: list) -> sp.csr_matrix:
+    """0/1 matrix (len(wanted) x len(available)) picking available rows by ID."""
+    pos = {k: i for i, k in enumerate(available)}
+    cols = np.array([pos[k] for k in wanted], dtype=np.int64)
+    return sp.csr_matrix((np.ones(len(cols), np.float32), (np.arange(len(cols)), cols)),
+                         shape=(len(wanted), len(available)))
+
+
+def predict(seqtab: str, marker: str, traits: str, asv_map: str = None,
+            max_nsti: float = MAX_NSTI, round_norm: int = 2):
+    """-> (function names, sample names, function x sample CSR float32, dropped ASVs)"""
+    asvs, header, abun = read_table(seqtab)
+    normalised = header[0] == "normalized"
+    samples = header[1:]
+    m_ids, copies, nsti = read_marker(marker)
+    t_ids, t_header, trait = read_table(traits)
+    functions = [c[3:] if c.startswith("ko:") else c for c in t_header[1:]]
+
+    if asv_map:
+        # per-genome copies/traits -> per-ASV via the assignment
+        mp = read_asv_map(asv_map)
+        known = set(m_ids) & set(t_ids)
+        keep = [a for a in asvs if mp.get(a) in known]
+        genomes = [mp[a] for a in keep]
+        m_sel = selector(genomes, m_ids)
+        t_sel = selector(genomes, t_ids)
+        nsti = None
+    else:
+        known = set(m_ids) & set(t_ids)
+        if nsti is not None:
+            far = {i for i, d in zip(m_ids, nsti.tolist()) if d > max_nsti}
+            known -= far
+        keep = [a for a in asvs if a in known]
+        m_sel = selector(keep, m_ids)
+        t_sel = selector(keep, t_ids)
+    dropped = len(asvs) - len(keep)
+
+    a_sel = selector(keep, asvs)
+    abun = a_sel @ abun                          # ASV x sample
+    asv_copies = m_sel @ copies                  # ASV
+    asv_traits = t_sel @ trait                   # ASV x function
+
+    if not normalised:
+        if np.any(asv_copies <= 0):
+            raise SystemExit("[ERROR] Marker copy numbers must be > 0")
+        abun = sp.diags((1.0 / asv_copies).astype(np.float32)) @ abun
+        if round_norm >= 0:
+            abun = abun.tocsr()
+            abun.data = np.round(abun.data, round_norm)
+            abun.eliminate_zeros()
+
+    pred = (asv_traits.T.tocsr() @ abun.tocsc()).tocsr().astype(np.float32)
+    return functions, samples, pred, dropped
+
+
+def write_unstrat(functions: list, samples: list, pred: sp.csr_matrix, path: str) -> int:
+    """PICRUSt2 pred_metagenome_unstrat.tsv; functions with no abundance are left out."""
+    n = 0
+    nnz = np.diff(pred.indptr)
+    with open(path, "w") as out:
+        out.write("function\t" + "\t".join(samples) + "\n")
+        for i in sorted(range(len(functions)), key=functions.__getitem__):
+            if nnz[i] == 0:
+                continue
+            vals = pred.getrow(i).toarray().ravel()
+            out.write(functions[i] + "\t" + "\t".join(f"{v:.6g}" for v in vals.tolist()) + "\n")
+            n += 1
+    return n
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Unstratified metagenome prediction with sparse matrices.")
+    parser.add_argument("--seqtab", required=True, help="ASV x sample table (raw counts or seqtab_norm.tsv).")
+    parser.add_argument("--marker", required=True,
+                        help="Marker copies per ASV (marker_predicted_and_nsti.tsv) or per genome (22's copy table).")
+    parser.add_argument("--traits", required=True,
+                        help="Traits per ASV (KO_predicted.tsv) or per genome (24's ko.txt.gz).")
+    parser.add_argument("--asv-map", help="ASV<TAB>genome assignments; switches to per-genome marker/traits.")
+    parser.add_argument("--max-nsti", type=float, default=MAX_NSTI, help="Drop ASVs above this NSTI (default: 2).")
+    parser.add_argument("--round-norm", type=int, default=2,
+                        help="Decimals for normalised abundances (PICRUSt2: 2; -1 = no rounding).")
+    parser.add_argument("--out", default="pred_metagenome_unstrat.tsv")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    for p in (args.seqtab, args.marker, args.traits, args.asv_map):
+        if p and not os.path.exists(p):
+            print(f"[ERROR] File not found: {p}", file=sys.stderr)
+            raise SystemExit(1)
+
+    with STAGE.step("predict"):
+        functions, samples, pred, dropped = predict(args.seqtab, args.marker, args.traits,
+                                                    args.asv_map, args.max_nsti, args.round_norm)
+        STAGE.track_input(*(p for p in (args.seqtab, args.marker, args.traits, args.asv_map) if p))
+    if dropped:
+        print(f"[WARN] {dropped} ASVs had no marker/trait prediction (or NSTI > {args.max_nsti}) and were dropped")
+
+    with STAGE.step("write_output"):
+        n = write_unstrat(functions, samples, pred, args.out)
+        STAGE.track_output(args.out)
+    print(f"[OK] {n} functions x {len(samples)} samples -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Lightweight timing, memory and I/O instrumentation for the pipeline scripts.
+
+Each Python stage creates one Stage and wraps its sub-steps:
+
+    from stage_metrics import Stage
+    STAGE = Stage("22_filter_16S_copies")
+
+    with STAGE.step("scan_reference"):
+        ids = read_fasta_ids(fasta)
+        STAGE.track_input(fasta)
+
+    @STAGE.timed("write_table")
+    def write_table(...): ...
+
+Flat scripts without a main() can use STAGE.begin("name") / STAGE.end().
+
+For every step we record wall time, CPU time, peak RSS (resource.getrusage,
+self + children), the number and size of files registered with
+track_input/track_output and, on Linux, the bytes actually read/written by the
+process (/proc/self/io). When the script exits the stage writes
+<METRICS_DIR>/<stage>.metrics.json, so runs can be compared between database
+builds. METRICS_DIR defaults to intermediate/metrics and can be overridden
+with the M2I_METRICS_DIR environment variable.
+
+The stage-level "status" is "error" if a step failed or an exception reached
+the top level, "exit" if a step ended with SystemExit or was still open at
+exit, and "ok" otherwise. Runs that recorded nothing (--help, argument errors)
+write no file, so they do not replace the metrics of the last real run.
+
+Stage.log() writes timestamped messages to stdout and, if a log path is given,
+to a log file that is opened once and buffered (instead of reopening it per
+message).
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+import functools
+import multiprocessing
+from contextlib import contextmanager
+from datetime import datetime
+
+BASE = os.path.dirname(os.path.abspath(__file__))          # .../code/database_pipeline/script
+ROOT = os.path.abspath(os.path.join(BASE, ".."))           # .../code/database_pipeline
+METRICS_DIR = os.environ.get("M2I_METRICS_DIR", os.path.join(ROOT, "intermediate", "metrics"))
+
+# ru_maxrss is KiB on Linux, bytes on macOS
+_RSS_TO_MB = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its waited-for children (MB)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, kids) * _RSS_TO_MB, 1)
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + kids.ru_utime + kids.ru_stime
+
+
+def proc_io() -> dict:
+    """rchar/wchar from /proc/self/io (Linux only; empty dict elsewhere)."""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return {"rchar": int(fields["rchar"]), "wchar": int(fields["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class _Step:
+    def __init__(self, name: str):
+        self.name = name
+        self.files_read = 0
+        self.bytes_read = 0
+        self.files_written = 0
+        self.bytes_written = 0
+        self._t0 = time.perf_counter()
+        self._c0 = cpu_seconds()
+        self._io0 = proc_io()
+        self.record = None
+
+    def close(self, status: str) -> dict:
+        io1 = proc_io()
+        self.record = {
+            "step": self.name,
+            "status": status,
+            "wall_s": round(time.perf_counter() - self._t0, 4),
+            "cpu_s": round(cpu_seconds() - self._c0, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "files_read": self.files_read,
+            "bytes_read": self.bytes_read,
+            "files_written": self.files_written,
+            "bytes_written": self.bytes_written,
+        }
+        if self._io0 and io1:
+            self.record["io_read_bytes"] = io1["rchar"] - self._io0["rchar"]
+            self.record["io_write_bytes"] = io1["wchar"] - self._io0["wchar"]
+        return self.record
+
+
+class Stage:
+    """Metrics collector for one pipeline script (see module docstring)."""
+
+    def __init__(self, name: str, metrics_dir: str = None, log_path: str = None):
+        self.name = name
+        self.metrics_dir = metrics_dir or METRICS_DIR
+        self.steps = []
+        self._active = []
+        self._total = _Step(name)
+        self._started = datetime.now().isoformat(timespec="seconds")
+        self._finished = False
+        self._failure = None
+        self._log_fh = None
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            self._log_fh = open(log_path, "a", buffering=64 * 1024)
+        # worker processes (spawn start method re-imports the script) must not
+        # overwrite the parent's metrics file
+        if multiprocessing.current_process().name == "MainProcess":
+            atexit.register(self.finish)
+            self._install_excepthook()
+
+    def _install_excepthook(self) -> None:
+        """Remember uncaught exceptions (atexit runs after the traceback is printed)."""
+        previous = sys.excepthook
+
+        def hook(exc_type, exc, tb):
+            self._failure = "error"
+            previous(exc_type, exc, tb)
+        sys.excepthook = hook
+
+    # ---------- logging ----------
+    def log(self, msg: str) -> None:
+        line = f"{datetime.now().strftime('[%H:%M:%S]')} {msg}"
+        print(line)
+        if self._log_fh is not None:
+            self._log_fh.write(line + "\n")
+
+    # ---------- steps ----------
+    @contextmanager
+    def step(self, name: str):
+        st = self.begin(name)
+        status = "ok"
+        try:
+            yield st
+        except BaseException as e:
+            status = "exit" if isinstance(e, SystemExit) else "error"
+            raise
+        finally:
+            self.end(st, status)
+
+    def begin(self, name: str) -> _Step:
+        """Open a step without a with-block (for flat, top-level scripts)."""
+        st = _Step(name)
+        self._active.append(st)
+        return st
+
+    def end(self, st: _Step = None, status: str = "ok") -> dict:
+        """Close `st` (default: the most recently opened step)."""
+        st = st or self._active[-1]
+        self._active.remove(st)
+        self.steps.append(st.close(status))
+        return st.record
+
+    def timed(self, name: str = None):
+        """Decorator form of step(); defaults to the function name."""
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.step(name or fn.__name__):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    # ---------- file accounting ----------
+    def track_input(self, *paths) -> None:
+        for p in paths:
+            n = _size(p)
+            for st in [self._total] + self._active:
+                st.files_read += 1
+                st.bytes_read += n
+
+    def track_output(self, *paths) -> None:
+        for p in paths:
+            n = _size(p)
+            for st in [self._total] + self._active:
+                st.files_written += 1
+                st.bytes_written += n
+
+    # ---------- output ----------
+    def finish(self) -> str:
+        """Write <metrics_dir>/<stage>.metrics.json (once; also runs at exit)."""
+        if self._finished:
+            return None
+        self._finished = True
+        for st in list(reversed(self._active)):  # steps left open by an early exit
+            self.end(st, "exit")
+        if self._log_fh is not None:
+            self._log_fh.close()
+        step_status = {st["status"] for st in self.steps}
+        status = self._failure or next((s for s in ("error", "exit") if s in step_status), "ok")
+        total = self._total.close(status)
+        if not self.steps and not (total["files_read"] or total["files_written"]) and status == "ok":
+            return None   # nothing ran (--help, argparse error, import only): keep the last real record
+        total.pop("step")
+        out = {"stage": self.name, "started": self._started, "argv": sys.argv[1:],
+               **total, "steps": self.steps}
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            path = os.path.join(self.metrics_dir, f"{self.name}.metrics.json")
+            with open(path, "w") as f:
+                json.dump(out, f, indent=2)
+        except OSError as e:
+            print(f"[WARN] Could not write metrics for {self.name}: {e}", file=sys.stderr)
+            return None
+        return path
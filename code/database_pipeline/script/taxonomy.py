@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+One parsed taxonomy table for the pipeline and the notebooks.
+
+03 infers the domain with a per-row map() over the GTDB-Tk `classification`
+strings, 05 --sweep splits the same strings again, and the notebooks re-run
+str.extract(r"g__...") per rank over tax_complete_qiime.txt. This module
+reads either source once, splits every lineage into seven categorical rank
+columns with vectorized string operations, and caches the result.
+
+Sources:
+  gtdbtk  gtdbtk.bac120.summary.tsv / gtdbtk.ar53.summary.tsv (user_genome, classification)
+  qiime   two columns without header (ID, "k__...; p__...; ..."), e.g. tax_complete_qiime.txt
+
+Table columns: id, lineage, domain, phylum, class, order, family, genus,
+species. Ranks are matched by prefix (d__/k__ both go to "domain"); elements
+without a prefix fall back to their position. Empty names ("g__") are NaN.
+
+Cache: <dir of first source>/<name>.taxonomy.npz with codes + categories per
+rank, rebuilt when any source's size or mtime changes (as alignment_store does).
+
+Usage:
+  python taxonomy.py export --gtdbtk gtdbtk.bac120.summary.tsv gtdbtk.ar53.summary.tsv --out taxonomy.tsv
+  python taxonomy.py export --qiime tax_complete_qiime.txt --out taxonomy.tsv
+
+From Python:
+  tax = load_taxonomy(summaries)                  # GTDB-Tk
+  tax["domain_label"] = domain_of(tax)            # Bacteria / Archaea / Unknown
+  genus = name_map(tax, "genus")                  # id -> genus
+  collapse(contrib, tax, "genus", key="taxon", value="taxon_function_abun", by=["function"])
+"""
+
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+RANKS = ["domain", "phylum", "class", "order", "family", "genus", "species"]
+PREFIX_RANK = {"d": "domain", "k": "domain", "p": "phylum", "c": "class", "o": "order",
+               "f": "family", "g": "genus", "s": "species"}
+CACHE_VERSION = 1
+
+
+def _split_unique(lineage: pd.Series) -> pd.DataFrame:
+    parts = lineage.str.split(";", expand=True)
+    out = pd.DataFrame(index=lineage.index, columns=RANKS, dtype=object)
+    for pos in parts.columns:
+        elem = parts[pos].str.strip()
+        has_prefix = elem.str[1:3] == "__"
+        names = elem.where(~has_prefix, elem.str[3:].str.strip())
+        names = names.where(names.notna() & (names != ""))
+        rank = elem.str[0].str.lower().map(PREFIX_RANK).where(has_prefix)
+        if pos < len(RANKS):
+            rank = rank.where(has_prefix, RANKS[pos])
+        for r in RANKS:
+            sel = (rank == r) & names.notna() & out[r].isna()
+            if sel.any():
+                out.loc[sel, r] = names[sel]
+    return out
+
+
+def split_lineage(lineage: pd.Series) -> pd.DataFrame:
+    """';'-separated lineages -> one categorical column per rank (same index)."""
+    # lineages repeat a lot (many ASVs/genomes per genus): parse each distinct string once
+    codes, uniques = pd.factorize(lineage.fillna("").astype(str))
+    parsed = _split_unique(pd.Series(uniques, dtype=object))
+    out = pd.DataFrame(index=lineage.index)
+    for rank in RANKS:
+        cat = pd.Categorical(parsed[rank])
+        out[rank] = pd.Categorical.from_codes(cat.codes[codes] if len(codes) else codes, cat.categories)
+    return out
+
+
+def read_gtdbtk(paths) -> pd.DataFrame:
+    """GTDB-Tk summaries (missing files are skipped); first row per genome wins."""
+    frames = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path, sep="\t", dtype=str)
+        if not {"user_genome", "classification"}.issubset(df.columns):
+            raise ValueError(f"{path} missing required columns: user_genome/classification")
+        frames.append(df[["user_genome", "classification"]])
+    if not frames:
+        return pd.DataFrame(columns=["id", "lineage"])
+    df = pd.concat(frames, ignore_index=True).drop_duplicates("user_genome")
+    return pd.DataFrame({"id": df["user_genome"].values, "lineage": df["classification"].values})
+
+
+def read_qiime(path: str) -> pd.DataFrame:
+    """QIIME-style taxonomy (ID<TAB>lineage[<TAB>confidence]); a 'Feature ID' header is skipped."""
+    df = pd.read_csv(path, sep="\t", header=None, usecols=[0, 1], names=["id", "lineage"], dtype=str)
+    df["id"] = df["id"].str.strip()
+    df = df[~df["id"].isin(["Feature ID", "#OTUID", "taxon"])]
+    return df.drop_duplicates("id").reset_index(drop=True)
+
+
+def parse_taxonomy(df: pd.DataFrame) -> pd.DataFrame:
+    tax = df.reset_index(drop=True)
+    return pd.concat([tax[["id", "lineage"]], split_lineage(tax["lineage"])], axis=1)
+
+
+# ----------------------------- cache -----------------------------------------
+
+def _stamp(paths) -> np.ndarray:
+    stats = [os.stat(p) if os.path.exists(p) else None for p in paths]
+    return np.array([[s.st_size, s.st_mtime_ns] if s else [-1, -1] for s in stats], dtype=np.int64)
+
+
+def save_cache(tax: pd.DataFrame, cache_path: str, sources) -> None:
+    arrays = {"version": CACHE_VERSION, "sources": np.array([os.path.abspath(p) for p in sources]),
+              "stamp": _stamp(sources), "id": tax["id"].astype(str).to_numpy(dtype=str),
+              "lineage": tax["lineage"].fillna("").astype(str).to_numpy(dtype=str)}
+    for rank in RANKS:
+        col = tax[rank].astype("category")
+        arrays[f"{rank}_codes"] = col.cat.codes.to_numpy(dtype=np.int32)
+        arrays[f"{rank}_categories"] = col.cat.categories.astype(str).to_numpy(dtype=str)
+    tmp = cache_path + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, cache_path)
+
+
+def load_cache(cache_path: str, sources):
+    """Cached table, or None when it is missing or any source changed."""
+    if not os.path.exists(cache_path):
+        return None
+    with np.load(cache_path) as z:
+        if (int(z["version"]) != CACHE_VERSION
+                or z["sources"].tolist() != [os.path.abspath(p) for p in sources]
+                or not np.array_equal(z["stamp"], _stamp(sources))):
+            return None
+        tax = pd.DataFrame({"id": z["id"].astype(object), "lineage": z["lineage"].astype(object)})
+        for rank in RANKS:
+            tax[rank] = pd.Categorical.from_codes(z[f"{rank}_codes"], z[f"{rank}_categories"].astype(object))
+    return tax
+
+
+def load_taxonomy(paths, fmt: str = "gtdbtk", cache=True) -> pd.DataFrame:
+    """
+    paths: one path or a list (GTDB-Tk: bac120 + ar53 summaries).
+    cache: True = <dir of first path>/<name>.taxonomy.npz, a path, or False.
+    """
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    if fmt not in ("gtdbtk", "qiime"):
+        raise ValueError(f"Unknown taxonomy format: {fmt}")
+    if cache is True:
+        first = paths[0]
+        name = "gtdbtk" if fmt == "gtdbtk" else os.path.splitext(os.path.basename(first))[0]
+        cache = os.path.join(os.path.dirname(os.path.abspath(first)), f"{name}.taxonomy.npz")
+    if cache:
+        tax = load_cache(cache, paths)
+        if tax is not None:
+            return tax
+
+    raw = read_gtdbtk(paths) if fmt == "gtdbtk" else pd.concat([read_qiime(p) for p in paths], ignore_index=True)
+    tax = parse_taxonomy(raw)
+    if cache and not tax.empty:
+        try:
+            save_cache(tax, cache, paths)
+        except OSError:
+            pass  # read-only source directory: just return the parsed table
+    return tax
+
+
+# ----------------------------- queries ---------------------------------------
+
+def domain_of(tax: pd.DataFrame) -> pd.Series:
+    """Bacteria / Archaea / Unknown per row (d__Bacteria, k__Archaea, ...)."""
+    dom = tax["domain"].astype(object)
+    return dom.where(dom.isin(["Bacteria", "Archaea"]), "Unknown")
+
+
+def name_map(tax: pd.DataFrame, rank: str) -> pd.Series:
+    """id -> name at `rank` (IDs without a name at that rank are left out)."""
+    return pd.Series(tax[rank].astype(object).values, index=tax["id"].values).dropna()
+
+
+def collapse(df: pd.DataFrame, tax: pd.DataFrame, rank: str, key: str = "taxon",
+             value: str = "taxon_function_abun", by=()) -> pd.DataFrame:
+    """Sum `value` per (by..., rank name), e.g. contributions per function and genus."""
+    names = df[key].map(name_map(tax, rank))
+    cols = list(by) + [rank]
+    return df.assign(**{rank: names}).groupby(cols, observed=True)[value].sum().reset_index()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parse GTDB-Tk / QIIME taxonomy into rank columns.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    e = sub.add_parser("export", help="Write id, lineage and the seven rank columns as TSV.")
+    src = e.add_mutually_exclusive_group(required=True)
+    src.add_argument("--gtdbtk", nargs="+", help="GTDB-Tk summary files.")
+    src.add_argument("--qiime", nargs="+", help="QIIME-style taxonomy files.")
+    e.add_argument("--no-cache", action="store_true")
+    e.add_argument("--out", required=True)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fmt, paths = ("gtdbtk", args.gtdbtk) if args.gtdbtk else ("qiime", args.qiime)
+    tax = load_taxonomy(paths, fmt, cache=not args.no_cache)
+    tax.to_csv(args.out, sep="\t", index=False)
+    counts = ", ".join(f"{tax[r].nunique()} {r}" for r in RANKS[1:])
+    print(f"[OK] {len(tax)} IDs ({counts}) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
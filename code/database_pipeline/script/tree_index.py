@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Array-based Newick tree index and NSTI (nearest sequenced taxon index) for the
+custom reference tree.
+
+NSTI normally only shows up after a full PICRUSt2 run (weighted_nsti.tsv).
+This module reads the RAxML best tree (or PICRUSt2's placed tree, out.tre)
+once into flat arrays and answers coverage questions directly:
+
+  - parent / branch length / root distance per node (nodes in preorder)
+  - Euler tour + sparse table of depths -> O(1) LCA and tip-to-tip distance
+  - nearest reference tip for every node in two linear passes
+    (subtree pass bottom-up, outside pass top-down), so each NSTI lookup is O(1)
+  - leave-one-out NSTI: for every reference tip, the distance to the nearest
+    *other* reference tip (how well each MAG would be covered if it were
+    missing from the database)
+
+Tips are "references" unless --reference is given, in which case only the
+listed IDs (one per line, or the names in a PHYLIP/FASTA alignment) are
+references and every other tip is scored as a query.
+
+Outputs a TSV: sequence, nsti, nearest_reference (+ a summary on stdout;
+PICRUSt2 drops ASVs with NSTI > 2 by default).
+
+Usage:
+  python tree_index.py                                     # leave-one-out NSTI on the BAC RAxML tree
+  python tree_index.py --tree out.tre --reference bacteria_raxml-check.raxml.reduced.phy --out placed_nsti.tsv
+"""
+
+import os
+import re
+import argparse
+
+import numpy as np
+
+from fasta_utils import read_fasta_ids
+from stage_metrics import Stage
+
+# ============================= CONFIG ========================================
+BAC_TREE = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/raxml/bacteria_raxml.raxml.bestTree")
+BAC_OUT = os.path.expanduser("~/Thesis/code/database_pipeline/intermediate/raxml/bacteria_loo_nsti.tsv")
+MAX_NSTI = 2.0  # PICRUSt2 --max_nsti default
+# ============================================================================
+
+_TOKENS = re.compile(r"\s*('(?:[^']|'')*'|\[[^\]]*\]|[(),:;]|[^(),:;\[\]'\s]+)")
+
+
+class TreeIndex:
+    """Newick tree as flat arrays; node 0 is the root, parents come before children."""
+
+    def __init__(self, newick: str):
+        parent, length, names = [-1], [0.0], [""]
+        stack, node, expect_length = [], 0, False
+        for tok in _TOKENS.findall(newick):
+            if tok == "(":
+                stack.append(node)
+                parent.append(node); length.append(0.0); names.append("")
+                node = len(parent) - 1
+            elif tok == ",":
+                parent.append(stack[-1]); length.append(0.0); names.append("")
+                node = len(parent) - 1
+            elif tok == ")":
+                node = stack.pop()
+            elif tok == ":":
+                expect_length = True
+            elif tok == ";":
+                break
+            elif tok.startswith("["):
+                continue  # comment
+            elif expect_length:
+                length[node] = float(tok)
+                expect_length = False
+            else:
+                names[node] = tok[1:-1].replace("''", "'") if tok.startswith("'") else tok
+        if stack:
+            raise ValueError("Unbalanced parentheses in Newick string")
+
+        self.parent = np.array(parent, dtype=np.int64)
+        self.length = np.array(length, dtype=np.float64)
+        self.names = names
+        n = len(parent)
+        n_children = np.bincount(self.parent[1:], minlength=n)
+        self.is_tip = n_children == 0
+        self.tips = np.flatnonzero(self.is_tip)
+        tip_names = [names[i] for i in self.tips]
+        self.tip_index = dict(zip(tip_names, self.tips.tolist()))
+        if len(self.tip_index) != len(tip_names):
+            raise ValueError("Duplicate tip names in tree")
+
+        # children in CSR form (stable, so children keep their Newick order)
+        order = np.argsort(self.parent[1:], kind="stable") + 1
+        self.child_ptr = np.concatenate([[0], np.cumsum(n_children)])
+        self.children = order
+
+        # root distance and depth: parents precede children, so one forward pass
+        self.root_dist = np.zeros(n)
+        self.depth = np.zeros(n, dtype=np.int64)
+        for v in range(1, n):
+            p = parent[v]
+            self.root_dist[v] = self.root_dist[p] + length[v]
+            self.depth[v] = self.depth[p] + 1
+
+        self._build_lca()
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path) as f:
+            return cls(f.read())
+
+    def __len__(self):
+        return len(self.parent)
+
+    def kids(self, v: int) -> np.ndarray:
+        return self.children[self.child_ptr[v]:self.child_ptr[v + 1]]
+
+    # ----------------------------- LCA ---------------------------------------
+
+    def _build_lca(self) -> None:
+        n = len(self)
+        euler = np.empty(2 * n - 1, dtype=np.int64)
+        first = np.empty(n, dtype=np.int64)
+        # (node, next child) stack; a node is written on entry and after each child
+        k, stack = 0, [(0, 0)]
+        while stack:
+            v, ci = stack.pop()
+            if ci == 0:
+                first[v] = k
+            euler[k] = v
+            k += 1
+            kids = self.kids(v)
+            if ci < len(kids):
+                stack.append((v, ci + 1))
+                stack.append((int(kids[ci]), 0))
+        self.euler = euler
+        self.first = first
+
+        tour_depth = self.depth[self.euler]
+        table = [np.arange(len(self.euler))]
+        j = 1
+        while (1 << j) <= len(self.euler):
+            prev = table[-1]
+            half = 1 << (j - 1)
+            a, b = prev[:-half], prev[half:]
+            table.append(np.where(tour_depth[a] <= tour_depth[b], a, b))
+            j += 1
+        self._sparse = table
+        self._tour_depth = tour_depth
+
+    def lca(self, u, v):
+        """Lowest common ancestor of node(s) u and v (scalars or arrays)."""
+        l, r = self.first[u], self.first[v]
+        l, r = np.minimum(l, r), np.maximum(l, r)
+        k = np.floor(np.log2(r - l + 1)).astype(np.int64)
+        k = np.atleast_1d(k)
+        l, r = np.atleast_1d(l), np.atleast_1d(r)
+        out = np.empty(len(k), dtype=np.int64)
+        for level in np.unique(k):
+            m = k == level
+            row = self._sparse[level]
+            a, b = row[l[m]], row[r[m] - (1 << level) + 1]
+            out[m] = np.where(self._tour_depth[a] <= self._tour_depth[b], self.euler[a], self.euler[b])
+        return out if np.ndim(u) or np.ndim(v) else int(out[0])
+
+    def distance(self, u, v):
+        """Patristic distance between node(s) u and v."""
+        w = self.lca(u, v)
+        return self.root_dist[u] + self.root_dist[v] - 2 * self.root_dist[w]
+
+    def tip_distance(self, a: str, b: str) -> float:
+        return float(self.distance(self.tip_index[a], self.tip_index[b]))
+
+    # ----------------------------- NSTI --------------------------------------
+
+    def nearest_reference(self, reference: np.ndarray):
+        """
+        reference: boolean mask over nodes (only tips should be set).
+        Returns (inside, inside_src, outside, outside_src):
+          inside[v]  distance from v to the nearest reference tip in v's subtree
+          outside[v] distance from v to the nearest reference tip outside it
+        A reference tip's leave-one-out NSTI is outside[tip]; a query tip's NSTI
+        is outside[tip] as well, since its own subtree holds no reference.
+        """
+        n = len(self)
+        parent, length = self.parent, self.length
+        inside = np.where(reference, 0.0, np.inf)
+        inside_src = np.where(reference, np.arange(n), -1)
+        for v in range(n - 1, 0, -1):
+            d = inside[v] + length[v]
+            p = parent[v]
+            if d < inside[p]:
+                inside[p], inside_src[p] = d, inside_src[v]
+
+        outside = np.full(n, np.inf)
+        outside_src = np.full(n, -1, dtype=np.int64)
+        for p in range(n):
+            kids = self.kids(p)
+            if not len(kids):
+                continue
+            via = inside[kids] + length[kids]
+            # best and second-best child, so each child can exclude itself
+            order = np.argsort(via, kind="stable")
+            b1 = order[0]
+            b2 = order[1] if len(order) > 1 else None
+            for i, c in enumerate(kids):
+                alt = b2 if i == b1 else b1
+                best, src = outside[p], outside_src[p]
+                if alt is not None and via[alt] < best:
+                    best, src = via[alt], inside_src[kids[alt]]
+                outside[c], outside_src[c] = best + length[c], src
+        return inside, inside_src, outside, outside_src
+
+    def nsti(self, reference_names=None, queries=None) -> list:
+        """
+        [(tip name, nsti, nearest reference name), ...].
+        reference_names=None: every tip is a reference, scored leave-one-out.
+        Otherwise tips not in reference_names are scored (or only `queries`).
+        """
+        ref = np.zeros(len(self), dtype=bool)
+        if reference_names is None:
+            ref[self.tips] = True
+            scored = self.tips
+        else:
+            idx = [self.tip_index[r] for r in reference_names if r in self.tip_index]
+            ref[idx] = True
+            scored = self.tips[~ref[self.tips]]
+        if queries is not None:
+            scored = np.array([self.tip_index[q] for q in queries], dtype=np.int64)
+        _, _, outside, outside_src = self.nearest_reference(ref)
+        return [(self.names[t], float(outside[t]), self.names[outside_src[t]] if outside_src[t] >= 0 else "")
+                for t in scored.tolist()]
+
+
+def read_reference_ids(path: str) -> set:
+    """IDs from a relaxed PHYLIP, a FASTA, or a plain one-ID-per-line file."""
+    if path.endswith((".phy", ".phylip")):
+        with open(path) as f:
+            f.readline()
+            return {line.split(None, 1)[0] for line in f if line.strip()}
+    if path.endswith((".fna", ".fasta", ".fa", ".fna.gz", ".fasta.gz")):
+        return read_fasta_ids(path)
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def write_nsti(rows: list, path: str) -> None:
+    with open(path, "w") as out:
+        out.write("sequence\tnsti\tnearest_reference\n")
+        for name, d, src in rows:
+            out.write(f"{name}\t{d:.6f}\t{src}\n")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="NSTI / leave-one-out NSTI from a Newick reference tree.")
+    parser.add_argument("--tree", default=BAC_TREE, help="Newick tree (RAxML bestTree or PICRUSt2 out.tre).")
+    parser.add_argument("--reference", help="Reference IDs (PHYLIP, FASTA or one per line); "
+                                            "other tips are scored as queries. Default: leave-one-out over all tips.")
+    parser.add_argument("--out", default=BAC_OUT, help="Output TSV.")
+    parser.add_argument("--max-nsti", type=float, default=MAX_NSTI, help="Threshold reported in the summary.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    stage = Stage("tree_index_nsti")
+    with stage.step("index_tree"):
+        tree = TreeIndex.from_file(args.tree)
+        stage.track_input(args.tree)
+    print(f"[INFO] {args.tree}: {len(tree.tips)} tips, {len(tree)} nodes")
+
+    refs = None
+    if args.reference:
+        refs = read_reference_ids(args.reference)
+        missing = len(refs - set(tree.tip_index))
+        if missing:
+            print(f"[WARN] {missing} reference IDs are not tips of the tree")
+    with stage.step("nsti"):
+        rows = tree.nsti(refs)
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        write_nsti(rows, args.out)
+        stage.track_output(args.out)
+
+    vals = np.array([d for _, d, _ in rows])
+    mode = "leave-one-out" if refs is None else "query"
+    if len(vals):
+        print(f"[OK] {mode} NSTI for {len(vals)} tips: mean {vals.mean():.4f}, median {np.median(vals):.4f}, "
+              f"max {vals.max():.4f}, > {args.max_nsti}: {int((vals > args.max_nsti).sum())}")
+    print(f"[OK] Wrote: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
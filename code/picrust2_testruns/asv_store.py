@@ -0,0 +1,199 @@
+"""
+Columnar on-disk store for ASV x sample tables (seqtab_norm.tsv) for the notebooks.
+
+The notebooks read seqtab_norm.tsv twice (nrows=0 for the sample columns, then
+usecols=... dtype=str) and parse the wide text table again for every
+comparison. convert() parses it once, in row chunks, into a sparse CSC matrix
+(one column per sample) saved as plain .npy files next to the table:
+
+    <stem>.asvstore/
+        data.npy      float32 non-zero abundances, column by column
+        indices.npy   ASV row of each value
+        indptr.npy    start of each sample's values in data/indices
+        asvs.npy      ASV IDs (fixed-width unicode)
+        samples.npy   sample names
+        meta.npz      ID column name + size/mtime of the source TSV
+
+Everything is memory-mapped on load. A sample's values are a slice of
+data/indices (no copy); a contiguous run of samples is a CSC view; relative
+abundance is one vectorized division of data by the repeated column sums.
+open_store() rebuilds the store when the TSV changed (size or mtime).
+
+Example:
+    from asv_store import open_store
+    st = open_store(f"{OUT}/EC_metagenome_out/seqtab_norm.tsv")
+    pr = st.select(PR1 + PR4)
+    rel = pr.relative(percent=True).to_frame()        # ASV x sample DataFrame
+    asv_idx, values = st.column("PR1_1")               # views into the store
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def _csc_view(data, indices, indptr, shape):
+    """CSC matrix on existing arrays; the constructor would copy slices of a larger buffer (prune)."""
+    m = sp.csc_matrix(shape, dtype=data.dtype)
+    m.data, m.indices, m.indptr = data, indices, indptr
+    return m
+
+
+class ASVStore:
+    def __init__(self, asvs, samples, matrix, id_column: str = "taxon"):
+        """matrix: ASV x sample scipy.sparse CSC (kept as is, so memory maps stay mapped)."""
+        self.asvs = np.asarray(asvs)
+        self.samples = np.asarray(samples)
+        self.matrix = matrix if sp.isspmatrix_csc(matrix) else sp.csc_matrix(matrix, dtype=np.float32)
+        self.id_column = id_column
+        self._sample_pos = None
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @property
+    def nnz(self) -> int:
+        return self.matrix.nnz
+
+    # ----------------------------- building ----------------------------------
+
+    @classmethod
+    def from_tsv(cls, path: str, chunksize: int = 5000, sep: str = "\t"):
+        """Parse the wide table in row chunks; only non-zeros are kept."""
+        header = pd.read_csv(path, sep=sep, nrows=0).columns
+        id_column, samples = str(header[0]), [str(c) for c in header[1:]]
+        asvs, rows, cols, vals = [], [], [], []
+        n = 0
+        for chunk in pd.read_csv(path, sep=sep, dtype={id_column: str}, chunksize=chunksize):
+            x = chunk.iloc[:, 1:].apply(pd.to_numeric, errors="coerce").fillna(0.0).to_numpy(dtype=np.float32)
+            r, c = np.nonzero(x)
+            rows.append(r + n)
+            cols.append(c)
+            vals.append(x[r, c])
+            asvs.extend(chunk[id_column].astype(str).str.strip())
+            n += len(chunk)
+        row = np.concatenate(rows) if rows else np.zeros(0, np.int64)
+        col = np.concatenate(cols) if cols else np.zeros(0, np.int64)
+        val = np.concatenate(vals) if vals else np.zeros(0, np.float32)
+
+        # COO (row-major from the chunks) -> CSC: stable sort by sample keeps ASV order per column
+        order = np.argsort(col, kind="stable")
+        idx_dtype = np.int32 if max(len(val), n) < 2 ** 31 else np.int64
+        indptr = np.zeros(len(samples) + 1, dtype=idx_dtype)
+        np.cumsum(np.bincount(col, minlength=len(samples)), out=indptr[1:])
+        matrix = sp.csc_matrix((val[order], row[order].astype(idx_dtype), indptr),
+                               shape=(n, len(samples)), dtype=np.float32)
+        return cls(np.array(asvs), np.array(samples), matrix, id_column)
+
+    def save(self, store_dir: str, source: str = None) -> None:
+        os.makedirs(store_dir, exist_ok=True)
+        st = os.stat(source) if source else None
+        m = self.matrix
+        np.save(os.path.join(store_dir, "data.npy"), np.ascontiguousarray(m.data, dtype=np.float32))
+        np.save(os.path.join(store_dir, "indices.npy"), np.ascontiguousarray(m.indices))
+        np.save(os.path.join(store_dir, "indptr.npy"), np.ascontiguousarray(m.indptr))
+        np.save(os.path.join(store_dir, "asvs.npy"), self.asvs.astype(str))
+        np.save(os.path.join(store_dir, "samples.npy"), self.samples.astype(str))
+        # meta last: a store without it is incomplete and gets rebuilt
+        np.savez(os.path.join(store_dir, "meta.npz"), id_column=self.id_column, n_asvs=m.shape[0],
+                 source_size=st.st_size if st else -1, source_mtime_ns=st.st_mtime_ns if st else -1)
+
+    @classmethod
+    def load(cls, store_dir: str, mmap: bool = True):
+        mode = "r" if mmap else None
+        arr = {name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode=mode)
+               for name in ("data", "indices", "indptr", "asvs", "samples")}
+        with np.load(os.path.join(store_dir, "meta.npz")) as z:
+            id_column, n_asvs = str(z["id_column"]), int(z["n_asvs"])
+        matrix = sp.csc_matrix((arr["data"], arr["indices"], arr["indptr"]),
+                               shape=(n_asvs, len(arr["samples"])), copy=False)
+        return cls(arr["asvs"], arr["samples"], matrix, id_column)
+
+    # ----------------------------- selection ---------------------------------
+
+    def sample_index(self, samples) -> np.ndarray:
+        if self._sample_pos is None:
+            self._sample_pos = {s: i for i, s in enumerate(self.samples.tolist())}
+        try:
+            return np.fromiter((self._sample_pos[s] for s in samples), dtype=np.intp)
+        except KeyError as e:
+            raise KeyError(f"Sample not in table: {e.args[0]}") from None
+
+    def column(self, sample: str):
+        """(ASV row indices, values) of one sample, as views into the store."""
+        j = self.sample_index([sample])[0]
+        lo, hi = self.matrix.indptr[j], self.matrix.indptr[j + 1]
+        return self.matrix.indices[lo:hi], self.matrix.data[lo:hi]
+
+    def select(self, samples):
+        """Store restricted to `samples` (names or indices, in that order)."""
+        samples = list(samples)
+        idx = self.sample_index(samples) if samples and isinstance(samples[0], str) else np.asarray(samples, np.intp)
+        m = self.matrix
+        if len(idx) and np.array_equal(idx, np.arange(idx[0], idx[0] + len(idx))):
+            # contiguous run: slice data/indices, only indptr is rebased
+            lo, hi = m.indptr[idx[0]], m.indptr[idx[-1] + 1]
+            indptr = np.asarray(m.indptr[idx[0]:idx[-1] + 2]) - lo
+            sub = _csc_view(m.data[lo:hi], m.indices[lo:hi], indptr.astype(m.indices.dtype), (m.shape[0], len(idx)))
+        else:
+            sub = m[:, idx]      # copies only the selected columns' non-zeros
+        return ASVStore(self.asvs, self.samples[idx], sub, self.id_column)
+
+    # ----------------------------- values ------------------------------------
+
+    def totals(self) -> np.ndarray:
+        """Column (sample) sums, from one cumulative sum over data."""
+        cs = np.concatenate([[0.0], np.cumsum(self.matrix.data, dtype=np.float64)])
+        ptr = np.asarray(self.matrix.indptr)
+        return cs[ptr[1:]] - cs[ptr[:-1]]
+
+    def relative(self, percent: bool = False):
+        """Each sample divided by its total (empty samples stay 0)."""
+        tot = self.totals()
+        scale = np.divide(100.0 if percent else 1.0, tot, out=np.zeros_like(tot), where=tot > 0)
+        m = self.matrix
+        data = np.asarray(m.data) * np.repeat(scale, np.diff(np.asarray(m.indptr))).astype(np.float32)
+        rel = _csc_view(data, m.indices, m.indptr, m.shape)
+        return ASVStore(self.asvs, self.samples, rel, self.id_column)
+
+    def to_frame(self, drop_empty: bool = True) -> pd.DataFrame:
+        """Dense ASV x sample DataFrame (index named like the TSV's ID column); all-zero ASVs dropped."""
+        m = self.matrix
+        rows = np.unique(np.asarray(m.indices)) if drop_empty else np.arange(m.shape[0])
+        dense = m.tocsr()[rows].toarray() if drop_empty else m.toarray()
+        return pd.DataFrame(dense, index=pd.Index(self.asvs[rows].astype(str), name=self.id_column),
+                            columns=self.samples.astype(str))
+
+
+def store_dir_for(tsv_path: str) -> str:
+    base = tsv_path[:-3] if tsv_path.endswith(".gz") else tsv_path
+    return os.path.splitext(base)[0] + ".asvstore"
+
+
+def convert(tsv_path: str, store_dir: str = None, chunksize: int = 5000) -> ASVStore:
+    tsv_path = os.path.expanduser(tsv_path)
+    store = ASVStore.from_tsv(tsv_path, chunksize=chunksize)
+    store.save(store_dir or store_dir_for(tsv_path), source=tsv_path)
+    return store
+
+
+def open_store(tsv_path: str, cache: bool = True, mmap: bool = True) -> ASVStore:
+    """Memory-mapped store for a seqtab TSV, (re)built when the TSV changed."""
+    tsv_path = os.path.expanduser(tsv_path)
+    store_dir = store_dir_for(tsv_path)
+    meta = os.path.join(store_dir, "meta.npz")
+    if cache and os.path.exists(meta):
+        st = os.stat(tsv_path)
+        with np.load(meta) as z:
+            fresh = int(z["source_size"]) == st.st_size and int(z["source_mtime_ns"]) == st.st_mtime_ns
+        if fresh:
+            return ASVStore.load(store_dir, mmap=mmap)
+    if not cache:
+        return ASVStore.from_tsv(tsv_path)
+    if os.path.exists(meta):
+        os.remove(meta)
+    convert(tsv_path, store_dir)
+    return ASVStore.load(store_dir, mmap=mmap)
@@ -0,0 +1,166 @@
+"""
+On-demand stratified contributions for the PICRUSt2 notebooks.
+
+Instead of loading pred_metagenome_contrib.tsv (samples x ASVs x functions
+rows), keep the two inputs it is made from as sparse matrices
+
+    seqtab_norm.tsv    ASV x sample abundance (already divided by 16S copies)
+    *_predicted.tsv.gz ASV x function trait counts (KO_predicted, EC_predicted, ...)
+
+and compute the contribution rows only for the functions/samples asked for.
+Rows have PICRUSt2's contributional columns (sample, function, taxon,
+taxon_abun, taxon_rel_abun, genome_function_count, taxon_function_abun,
+taxon_rel_function_abun, norm_taxon_function_contrib), so existing notebook
+cells (groupby on taxon_function_abun etc.) work unchanged. Recent queries are
+kept in an LRU cache (returned frames are shared; .copy() before editing them).
+
+Note: path_abun_contrib.tsv is built from per-ASV pathway abundances (MinPath
+per genome), not from a trait product; pass a per-ASV pathway table as
+`traits` to query pathways the same way.
+
+Example:
+    from contrib_query import ContributionEngine
+    eng = ContributionEngine.from_files(f"{OUT}/KO_metagenome_out/seqtab_norm.tsv",
+                                        f"{OUT}/KO_predicted.tsv.gz")
+    df = eng.contrib(["K00399", "K00401"], samples=PR1 + PR4)
+    eng.unstrat(["K00399"])
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+CONTRIB_COLUMNS = ["sample", "function", "taxon", "taxon_abun", "taxon_rel_abun",
+                   "genome_function_count", "taxon_function_abun",
+                   "taxon_rel_function_abun", "norm_taxon_function_contrib"]
+
+
+def _read_sparse(path: str, chunksize: int = 5000):
+    """Wide TSV -> (row IDs, column names, CSR float32); parsed in row chunks, only non-zeros kept."""
+    columns = pd.read_csv(path, sep="\t", nrows=0).columns
+    rows, blocks = [], []
+    for chunk in pd.read_csv(path, sep="\t", dtype={columns[0]: str}, chunksize=chunksize):
+        rows.extend(chunk.iloc[:, 0].astype(str))
+        blocks.append(sp.csr_matrix(chunk.iloc[:, 1:].to_numpy(dtype=np.float32)))
+    mat = sp.vstack(blocks, format="csr") if blocks else sp.csr_matrix((0, len(columns) - 1), dtype=np.float32)
+    return rows, columns[1:].astype(str).tolist(), mat
+
+
+class ContributionEngine:
+    def __init__(self, asvs, samples, abun, functions, traits, trait_asvs=None, cache_size: int = 32):
+        """
+        abun:   ASV x sample (sparse or dense), rows in `asvs` order
+        traits: ASV x function, rows in `trait_asvs` order (defaults to `asvs`)
+        ASVs without trait predictions are dropped, as in PICRUSt2.
+        """
+        trait_asvs = list(asvs) if trait_asvs is None else list(trait_asvs)
+        pos = {a: i for i, a in enumerate(trait_asvs)}
+        keep = [i for i, a in enumerate(asvs) if a in pos]
+        self.asvs = np.array([asvs[i] for i in keep])
+        self.samples = list(samples)
+        self.functions = list(functions)
+        self.abun = sp.csr_matrix(abun, dtype=np.float32)[keep].tocsc()
+        self.traits = sp.csr_matrix(traits, dtype=np.float32)[[pos[a] for a in self.asvs]].tocsc()
+        self.sample_totals = np.asarray(self.abun.sum(axis=0)).ravel()
+        self._sample_pos = {s: i for i, s in enumerate(self.samples)}
+        self._function_pos = {f: i for i, f in enumerate(self.functions)}
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = self.misses = 0
+
+    @classmethod
+    def from_files(cls, seqtab_norm: str, traits: str, cache_size: int = 32):
+        asvs, samples, abun = _read_sparse(seqtab_norm)
+        trait_asvs, functions, tmat = _read_sparse(traits)
+        # drop metadata columns such as metadata_NSTI if present
+        keep = [i for i, f in enumerate(functions) if not f.startswith("metadata_")]
+        return cls(asvs, samples, abun, [functions[i] for i in keep], tmat[:, keep],
+                   trait_asvs, cache_size)
+
+    # ----------------------------- cache -------------------------------------
+
+    def _cached(self, key, compute):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key]
+        self.misses += 1
+        val = compute()
+        self._cache[key] = val
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return val
+
+    def cache_info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "maxsize": self.cache_size}
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
+    def _select(self, functions, samples):
+        f_idx = np.arange(len(self.functions)) if functions is None else \
+            np.array([self._function_pos[f] for f in functions], dtype=np.int64)
+        s_idx = np.arange(len(self.samples)) if samples is None else \
+            np.array([self._sample_pos[s] for s in samples], dtype=np.int64)
+        return f_idx, s_idx
+
+    # ----------------------------- queries -----------------------------------
+
+    def unstrat(self, functions=None, samples=None) -> pd.DataFrame:
+        """function x sample abundances (pred_metagenome_unstrat.tsv) for the selection."""
+        key = ("unstrat", None if functions is None else tuple(functions),
+               None if samples is None else tuple(samples))
+
+        def compute():
+            f_idx, s_idx = self._select(functions, samples)
+            pred = (self.traits[:, f_idx].T @ self.abun[:, s_idx]).toarray()
+            return pd.DataFrame(pred, index=pd.Index([self.functions[i] for i in f_idx], name="function"),
+                                columns=[self.samples[i] for i in s_idx])
+        return self._cached(key, compute)
+
+    def contrib(self, functions, samples=None) -> pd.DataFrame:
+        """Long-format contribution rows (PICRUSt2 columns) for the given functions/samples."""
+        if isinstance(functions, str):
+            functions = [functions]
+        key = ("contrib", tuple(functions), None if samples is None else tuple(samples))
+        return self._cached(key, lambda: self._contrib(functions, samples))
+
+    def _contrib(self, functions, samples) -> pd.DataFrame:
+        f_idx, s_idx = self._select(functions, samples)
+        abun = self.abun[:, s_idx].tocsr()
+        totals = self.sample_totals[s_idx]
+        func_totals = (self.traits[:, f_idx].T @ abun).toarray()   # |F| x |S|
+
+        parts = []
+        for j, fi in enumerate(f_idx):
+            col = self.traits[:, fi]
+            rows = col.indices
+            if not len(rows):
+                continue
+            counts = col.data
+            sub = abun[rows].tocoo()                  # ASVs carrying the function x samples
+            if not sub.nnz:
+                continue
+            taxon_abun = sub.data
+            count = counts[sub.row]
+            rel = np.divide(taxon_abun * 100, totals[sub.col], out=np.zeros_like(taxon_abun),
+                            where=totals[sub.col] > 0)
+            tfa = taxon_abun * count
+            ftot = func_totals[j, sub.col]
+            parts.append(pd.DataFrame({
+                "sample": np.array(self.samples, dtype=object)[s_idx[sub.col]],
+                "function": self.functions[fi],
+                "taxon": self.asvs[rows[sub.row]],
+                "taxon_abun": taxon_abun,
+                "taxon_rel_abun": rel,
+                "genome_function_count": count,
+                "taxon_function_abun": tfa,
+                "taxon_rel_function_abun": rel * count,
+                "norm_taxon_function_contrib": np.divide(tfa, ftot, out=np.zeros_like(tfa), where=ftot > 0),
+            }))
+        if not parts:
+            return pd.DataFrame(columns=CONTRIB_COLUMNS)
+        return pd.concat(parts, ignore_index=True).sort_values(["sample", "function", "taxon"],
+                                                               ignore_index=True)
@@ -0,0 +1,107 @@
+"""
+Top-k contributor index for every function of a stratified PICRUSt2 table,
+built in one chunked pass.
+
+The notebooks answer "top 15 contributing genera for pathway X in PR1" by
+loading the whole path_abun_contrib.tsv / pred_metagenome_contrib.tsv,
+filtering to one function and one group, grouping and taking head(15), once
+per pathway and group. build_topk_index streams the file in chunks, sums
+taxon_function_abun per (function, group, rank, taxon name) as it goes (state
+grows with the number of distinct genera, not with the file), and finally
+keeps the k largest per (function, group, rank). The result is a small table
+that can be saved and queried for any function without re-reading the file.
+
+Taxon names come from a taxon -> taxonomy table (df_tax in
+temp_differences.ipynb: columns "taxon" and "taxonomy" with k__/p__/.../s__
+prefixes); rank "taxon" uses the ASV itself. Taxa without a name at a rank are
+left out, as groupby does in the notebooks.
+
+Example:
+    from contrib_topk import build_topk_index, top_contributors
+    groups = {s: "PR1" for s in PR1} | {s: "PR4" for s in PR4}
+    idx = build_topk_index(f"{OUT}/pathways_out/path_abun_contrib.tsv", groups=groups,
+                           taxonomy=df_tax, ranks=["genus", "family"], k=15)
+    idx.to_csv("path_top15.tsv", sep="\\t", index=False)
+    top_contributors(idx, "METH-ACETATE-PWY", group="PR1")
+"""
+
+import pandas as pd
+
+RANK_PREFIXES = {
+    "kingdom": "k__", "phylum": "p__", "class": "c__", "order": "o__",
+    "family": "f__", "genus": "g__", "species": "s__",
+}
+
+
+def rank_names(taxonomy: pd.DataFrame, rank: str) -> pd.Series:
+    """taxon -> name at `rank`, parsed like the notebooks ("g__ Name;" -> "Name")."""
+    tax = taxonomy.assign(taxon=taxonomy["taxon"].astype(str).str.strip(),
+                          taxonomy=taxonomy["taxonomy"].astype(str).str.strip())
+    names = tax["taxonomy"].str.extract(fr"{RANK_PREFIXES[rank]}\s*([^;]+)", expand=False).str.strip()
+    names = names.where(names != "")
+    return pd.Series(names.values, index=tax["taxon"]).dropna()
+
+
+def build_topk_index(path: str, groups: dict = None, taxonomy: pd.DataFrame = None, ranks=("genus",),
+                     k: int = 15, value: str = "taxon_function_abun", chunksize: int = 1_000_000,
+                     sep: str = "\t") -> pd.DataFrame:
+    """
+    One pass over a stratified contribution table.
+    groups: sample -> group label (samples not in it are skipped); None = one group "all".
+    Returns columns: function, group, rank, position (1..k), name, contribution,
+    share (contribution / total of the function in the group).
+    """
+    ranks = list(ranks)
+    maps = {}
+    for rank in ranks:
+        if rank == "taxon":
+            continue
+        if taxonomy is None:
+            raise ValueError(f"rank '{rank}' needs a taxonomy table")
+        maps[rank] = rank_names(taxonomy, rank)
+
+    sums = {rank: None for rank in ranks}
+    totals = None
+    reader = pd.read_csv(path, sep=sep, usecols=["sample", "function", "taxon", value],
+                         dtype={"sample": str, "function": str, "taxon": str}, chunksize=chunksize)
+    for chunk in reader:
+        chunk[value] = pd.to_numeric(chunk[value], errors="coerce").fillna(0.0)
+        chunk["group"] = "all" if groups is None else chunk["sample"].map(groups)
+        chunk = chunk.dropna(subset=["group"])
+        if chunk.empty:
+            continue
+
+        part = chunk.groupby(["function", "group"], sort=False)[value].sum()
+        totals = part if totals is None else totals.add(part, fill_value=0.0)
+        for rank in ranks:
+            name = chunk["taxon"] if rank == "taxon" else chunk["taxon"].map(maps[rank])
+            part = chunk.assign(name=name).groupby(["function", "group", "name"], sort=False)[value].sum()
+            sums[rank] = part if sums[rank] is None else sums[rank].add(part, fill_value=0.0)
+
+    frames = []
+    for rank in ranks:
+        if sums[rank] is None:
+            continue
+        df = sums[rank].rename("contribution").reset_index()
+        df = df.sort_values(["function", "group", "contribution", "name"],
+                            ascending=[True, True, False, True], kind="stable")
+        df = df.groupby(["function", "group"], sort=False).head(k)
+        df["position"] = df.groupby(["function", "group"], sort=False).cumcount() + 1
+        df["rank"] = rank
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=["function", "group", "rank", "position", "name", "contribution", "share"])
+
+    index = pd.concat(frames, ignore_index=True)
+    tot = totals.rename("total").reset_index()
+    index = index.merge(tot, on=["function", "group"], how="left")
+    index["share"] = index["contribution"] / index["total"].where(index["total"] > 0)
+    return index[["function", "group", "rank", "position", "name", "contribution", "share"]]
+
+
+def top_contributors(index: pd.DataFrame, function: str, group: str = None, rank: str = "genus") -> pd.DataFrame:
+    """Rows of the index for one function (and group), in contribution order."""
+    sel = (index["function"] == function) & (index["rank"] == rank)
+    if group is not None:
+        sel &= index["group"] == group
+    return index[sel].sort_values(["group", "position"]).reset_index(drop=True)
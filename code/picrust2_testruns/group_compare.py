@@ -0,0 +1,144 @@
+"""
+Compare every function of an unstratified PICRUSt2 table between two sample
+groups in one vectorized pass (instead of one pathway at a time as in
+temp_differences.ipynb).
+
+For a function x sample table (pred_metagenome_unstrat.tsv, path_abun_unstrat.tsv)
+and two lists of samples (e.g. PR1 and PR4 barcodes) it returns, per function:
+
+    mean_a, mean_b, log2_fc      log2((mean_a + pseudocount) / (mean_b + pseudocount))
+    stat, p                      Welch t-test or Mann-Whitney U (scipy, axis=1)
+    q                            Benjamini-Hochberg FDR
+    perm_p                       optional permutation p-value (two-sided)
+
+Permutations are run in batches: each batch is a (samples x batch) 0/1 matrix
+of shuffled group-A memberships, so group sums for all functions and all
+permutations in the batch come from one matrix product. Memory is bounded by
+`max_batch_mb` (functions x batch floats), not by the number of permutations.
+
+Example:
+    from group_compare import compare_groups
+    res = compare_groups(data_path_abun_unstrat, PR1, PR4, test="welch", permutations=9999)
+    res[res.q < 0.05].sort_values("log2_fc")
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def bh_fdr(p: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg adjusted p-values (NaNs are kept as NaN)."""
+    p = np.asarray(p, dtype=float)
+    q = np.full_like(p, np.nan)
+    ok = ~np.isnan(p)
+    n = ok.sum()
+    if not n:
+        return q
+    order = np.argsort(p[ok])
+    ranked = p[ok][order] * n / np.arange(1, n + 1)
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+    out = np.empty(n)
+    out[order] = np.minimum(ranked, 1.0)
+    q[ok] = out
+    return q
+
+
+def _welch_t(sum_a, sq_a, na, sum_b, sq_b, nb):
+    """Welch t from group sums and sums of squares (works on F x batch arrays)."""
+    ma, mb = sum_a / na, sum_b / nb
+    va = (sq_a - na * ma ** 2) / (na - 1)
+    vb = (sq_b - nb * mb ** 2) / (nb - 1)
+    se = np.sqrt(np.maximum(va, 0) / na + np.maximum(vb, 0) / nb)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (ma - mb) / se
+
+
+def permutation_pvalues(x: np.ndarray, na: int, observed: np.ndarray, test: str = "welch",
+                        permutations: int = 999, seed: int = 0, max_batch_mb: float = 256) -> np.ndarray:
+    """
+    x: F x n matrix with group A in the first `na` columns (raw values for
+    Welch, within-function ranks for Mann-Whitney). Two-sided p-values with
+    the usual (count + 1) / (permutations + 1).
+    """
+    f, n = x.shape
+    nb = n - na
+    rng = np.random.default_rng(seed)
+    batch = int(max(1, min(permutations, max_batch_mb * 2 ** 20 / (8 * 3 * max(f, 1)))))
+    x2 = x ** 2
+    total, total_sq = x.sum(axis=1, keepdims=True), x2.sum(axis=1, keepdims=True)
+    if test == "welch":
+        obs = np.abs(observed)[:, None]
+    else:  # rank sum of group A, centred on its null mean
+        centre = na * (n + 1) / 2.0
+        obs = np.abs(observed - centre)[:, None]
+
+    count = np.zeros(f, dtype=np.int64)
+    done = 0
+    while done < permutations:
+        b = min(batch, permutations - done)
+        idx = rng.permuted(np.tile(np.arange(n), (b, 1)), axis=1)[:, :na]   # b x na
+        member = np.zeros((n, b))
+        member[idx, np.arange(b)[:, None]] = 1.0
+        sum_a = x @ member                                                    # F x b
+        if test == "welch":
+            sq_a = x2 @ member
+            stat = np.abs(_welch_t(sum_a, sq_a, na, total - sum_a, total_sq - sq_a, nb))
+        else:
+            stat = np.abs(sum_a - centre)
+        count += (stat >= obs - 1e-12).sum(axis=1)
+        done += b
+    return (count + 1) / (permutations + 1)
+
+
+def compare_groups(table: pd.DataFrame, group_a, group_b, test: str = "welch",
+                   pseudocount: float = 1.0, permutations: int = 0, seed: int = 0,
+                   max_batch_mb: float = 256) -> pd.DataFrame:
+    """
+    table: function x sample (missing values count as 0).
+    group_a / group_b: sample names; samples not in the table are ignored.
+    test: "welch" or "mannwhitney".
+    """
+    if test not in ("welch", "mannwhitney"):
+        raise ValueError(f"Unknown test: {test}")
+    a = [s for s in group_a if s in table.columns]
+    b = [s for s in group_b if s in table.columns]
+    if len(a) < 2 or len(b) < 2:
+        raise ValueError(f"Need at least 2 samples per group (got {len(a)} and {len(b)})")
+
+    x = table[a + b].apply(pd.to_numeric, errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    xa, xb = x[:, :len(a)], x[:, len(a):]
+    mean_a, mean_b = xa.mean(axis=1), xb.mean(axis=1)
+
+    # constant functions (e.g. all zero) give NaN statistics; scipy warns about each
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if test == "welch":
+            res = stats.ttest_ind(xa, xb, axis=1, equal_var=False)
+            stat, p = res.statistic, res.pvalue
+        else:
+            res = stats.mannwhitneyu(xa, xb, axis=1, alternative="two-sided", method="asymptotic")
+            stat, p = res.statistic, res.pvalue
+
+    out = pd.DataFrame({
+        "mean_a": mean_a,
+        "mean_b": mean_b,
+        "log2_fc": np.log2((mean_a + pseudocount) / (mean_b + pseudocount)),
+        "stat": stat,
+        "p": p,
+    }, index=table.index)
+    out["q"] = bh_fdr(out["p"].to_numpy())
+
+    if permutations:
+        if test == "welch":
+            perm_x, observed = x, np.asarray(stat)
+        else:
+            perm_x = stats.rankdata(x, axis=1)
+            observed = perm_x[:, :len(a)].sum(axis=1)
+        out["perm_p"] = permutation_pvalues(perm_x, len(a), observed, test, permutations, seed, max_batch_mb)
+        # constant functions have no defined statistic
+        out.loc[np.isnan(np.asarray(stat, dtype=float)), "perm_p"] = np.nan
+        out["perm_q"] = bh_fdr(out["perm_p"].to_numpy())
+    return out